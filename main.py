@@ -4,38 +4,75 @@ from simmc.schedule.default import EventLoopScheduler
 from simmc.listeners.evt_listener import MinecraftLogListener
 from simmc.schemas.event import WhisperEvent, KickEvent, ViewSyncEvent, DisconnectEvent, GameCrashedEvent, LandInviteEvent
 from simmc.utils.logger import logger
+from simmc.utils.aho_corasick import KeywordMatcher
 from simmc.operation.fluent.base import fluent_init_control, jump, fluent_wait
 from simmc.operation.fluent.command import chat
 from simmc.operation.fluent.land import land
 from simmc.operation.player_control import PlayerControl
-from simmc.constants import MYSELF
+from simmc.operation.chat_batch import ChatBatcher
+from simmc.operation.outbound import OutboundLimiter
+from simmc.operation.input_backend import make_backend
+from simmc.constants import MYSELF, INPUT_BACKEND
 from simmc.services.channel_ensure import ChannelEnsureService
 from simmc.services.triggers import JsonTriggerService
 from simmc.services.idle_service import IdleService
+from simmc.services.land_balance import LandBalanceCache
+from simmc.utils.metrics import MetricsServer
+from simmc.schedule.control import ControlServer
+from simmc.schedule.snapshot import Checkpointer
+from simmc.schedule.coordination import Coordinator
 
 event_scheduler = EventLoopScheduler()
-ctrl = PlayerControl()
+# 排着的聊天/转账/领地指令合并成一次输入会话；INPUT_BACKEND=agent 时走 Py4J 直接发送，不用窗口在前台
+# 每一行发出前过出站限流，速率随服务器的防刷屏提示自动调整（config.json -> OutboundLimiter）
+outbound = OutboundLimiter()
+ctrl = PlayerControl(ChatBatcher(), make_backend(INPUT_BACKEND), outbound)
 
 fluent_init_control(ctrl)
     
 event_scheduler.add_start_prepare(ctrl.start)
 event_scheduler.add_exit_callback(ctrl.stop)
 
-# 1. 添加监听器
-event_scheduler.add_listener(MinecraftLogListener())
+# 本机 Prometheus 指标端点（config.json -> MetricsServer 可关闭/改端口）
+metrics_server = MetricsServer()
+event_scheduler.add_start_prepare(metrics_server.start)
+event_scheduler.add_exit_callback(metrics_server.stop)
+
+# 本机控制接口（默认关闭，config.json -> ControlServer.enabled 打开）
+control_server = ControlServer(event_scheduler)
+event_scheduler.add_start_prepare(control_server.start)
+event_scheduler.add_exit_callback(control_server.stop)
+
+# 热重启快照：启动时恢复服务状态，定期 + 退出时保存
+checkpointer = Checkpointer(event_scheduler)
+
+# 1. 添加监听器（顺带把日志行喂给回执表，.confirm() 的指令靠它拿到服务器结果）
+log_listener = MinecraftLogListener()
+log_listener.acks = ctrl.acks
+event_scheduler.add_listener(log_listener)
+
+# 同机多实例协同（默认关闭，config.json -> Coordinator.enabled 打开）
+coordinator = Coordinator()
+event_scheduler.add_start_prepare(coordinator.start)
+event_scheduler.add_exit_callback(coordinator.stop)
 
 # 2. 添加服务
 ce_svc = ChannelEnsureService(MYSELF, 5)
 idle_svc = IdleService()
 event_scheduler.add_service(ce_svc) # 挂载服务到总控，用于接收事件
 event_scheduler.add_service(idle_svc)
-event_scheduler.add_service(JsonTriggerService())
+event_scheduler.add_service(outbound)      # 接收“发言限流”事件
+land_balances = LandBalanceCache()         # 存取钱事件维护领地余额，await land_balances.balance(名字)
+event_scheduler.add_service(land_balances)
+event_scheduler.add_service(JsonTriggerService(coordinator))
 
 # 3. 注册事件回调
+_SUSPECT_WORDS = KeywordMatcher.of(("跳一跳", "在"), "suspect")
+
 @event_scheduler.on_event("悄悄话")
 async def on_whisper(ev: WhisperEvent) -> None:
     logger.info(f"悄悄话：{ev.sender} 悄悄对你说：{ev.content}")
-    if "跳一跳" in ev.content or "在" in ev.content:
+    if _SUSPECT_WORDS.find(ev.content):
         logger.warning(f"检测到管理员 {ev.sender}, 疑似审查言论, 执行规避...")
         await (fluent_wait(2) >> jump(3).interval(1))
         # current_channel = await ce_svc.get_channel()
@@ -50,7 +87,7 @@ def on_tick(ev: KickEvent) -> None:
 async def on_view_changed(ev: ViewSyncEvent) -> None: 
     """ 如果视角被管理员同步，处理 """
     logger.warning(f"管理员: {ev.admin_name} 同步视角，发送假消息规避ing")
-    await chat("干嘛干嘛，要干嘛...").sendto(ev.admin_name)
+    await chat("干嘛干嘛，要干嘛...").sendto(ev.admin_name).priority("urgent")
 
 @event_scheduler.on_event("断开")
 def on_disconnect(ev: DisconnectEvent) -> None:
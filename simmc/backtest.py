@@ -0,0 +1,239 @@
+"""
+触发器回测：用录好的 latest.log（或 .log.gz 归档）离线跑一遍 patten.json 解析 + JsonTriggerService，
+动作只记录不执行，统计每条规则触发了几次、什么时候、生成了哪些命令。
+
+    python -m simmc.backtest logs/2024-05-01-1.log.gz latest.log --triggers new_triggers.json --json report.json
+"""
+
+# simmc/backtest.py
+import re
+import gzip
+import json
+import time
+import asyncio
+import argparse
+import contextvars
+import dataclasses
+from pathlib import Path
+from functools import partial
+from dataclasses import dataclass, field
+from collections import Counter
+from typing import Any, Iterator, Optional
+from .listeners.evt_listener import MinecraftLogListener
+from .operation.player_control import Handler, PlayerControl
+from .operation.fluent.base import fluent_bind_control
+from .operation.type_chat import type_in_chat
+from .services.triggers import CompiledTrigger, JsonTriggerService
+from .constants import _TRIGGERS
+from .utils.clock import VirtualClock, use_clock
+from .utils.logger import logger
+
+_TIME_RE = re.compile(r"^\[(\d{2}):(\d{2}):(\d{2})\]")
+_RULE: contextvars.ContextVar[Optional[CompiledTrigger]] = contextvars.ContextVar("backtest_rule", default=None)
+
+@dataclass(slots=True)
+class RuleReport:
+    """ 单条规则的回测结果 """
+    index: int
+    on: str
+    cmd: str
+    comment: str
+    fires: int = 0
+    commands: dict[str, int] = field(default_factory=dict)
+    """ 生成的命令 -> 次数 """
+    timeline: list[tuple[str, list[str]]] = field(default_factory=list)
+    """ (日志时间, 生成的命令)，最多保留 timeline_limit 条 """
+    errors: dict[str, int] = field(default_factory=dict)
+    """ 构建/执行时抛出的异常 -> 次数（实盘里这些会进日志报错） """
+
+@dataclass(slots=True)
+class BacktestReport:
+    """ 回测总结果 """
+    files: list[str]
+    lines: int
+    events: int
+    actions: int
+    elapsed_sec: float
+    lines_per_sec: float
+    events_per_sec: float
+    events_by_name: dict[str, int]
+    rules: list[RuleReport]
+
+def describe_handler(handler: Handler) -> list[str]:
+    """ 把玩家控制处理器还原成可读命令：聊天/指令取原文，其余显示函数调用 """
+    if isinstance(handler, partial):
+        if handler.func is type_in_chat:
+            text = handler.args[0]
+            return list(text) if isinstance(text, list) else [text]
+        name = getattr(handler.func, "__name__", repr(handler.func))
+        argv = [*map(repr, handler.args), *(f"{k}={v!r}" for k, v in handler.keywords.items())]
+        return [f"{name}({', '.join(argv)})"]
+    return [getattr(handler, "__qualname__", repr(handler))]
+
+class _DryRunControl(PlayerControl):
+    """ 不碰键鼠：记录处理器并立刻完成 """
+
+    def __init__(self, report: "_Recorder") -> None:
+        super().__init__()
+        self._report = report
+
+    async def request(self, handler: Handler, **kw: Any) -> asyncio.Future[None]:
+        self._report.record(_RULE.get(), describe_handler(handler))
+        fut: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        fut.set_result(None)
+        return fut
+
+class _BacktestTriggerService(JsonTriggerService):
+    """ 记住当前在执行哪条规则，dry-run 控制器据此归账；规则出错只记账不中断回测 """
+
+    def __init__(self, recorder: "_Recorder", rules: list[dict[str, Any]]) -> None:
+        super().__init__(triggers=rules)
+        self._recorder = recorder
+
+    async def _fire(self, trig: CompiledTrigger, *args: Any, **kwargs: Any) -> None:
+        token = _RULE.set(trig)
+        try:
+            await super()._fire(trig, *args, **kwargs)
+        except Exception as exc:
+            self._recorder.error(trig, exc)
+        finally:
+            _RULE.reset(token)
+
+class _Recorder:
+    def __init__(self, rules: list[dict[str, Any]], timeline_limit: int) -> None:
+        self.rules = [
+            RuleReport(i, r.get("on", ""), r.get("do", {}).get("cmd", ""), r.get("comment", ""))
+            for i, r in enumerate(rules)
+        ]
+        self.timeline_limit = timeline_limit
+        self.actions = 0
+        self.log_time = ""
+
+    def record(self, trig: Optional[CompiledTrigger], commands: list[str]) -> None:
+        self.actions += 1
+        if trig is None:
+            return
+        rep = self.rules[trig.index]
+        rep.fires += 1
+        for cmd in commands:
+            rep.commands[cmd] = rep.commands.get(cmd, 0) + 1
+        if len(rep.timeline) < self.timeline_limit:
+            rep.timeline.append((self.log_time, commands))
+
+    def error(self, trig: CompiledTrigger, exc: Exception) -> None:
+        rep = self.rules[trig.index]
+        key = f"{type(exc).__name__}: {exc}"
+        rep.errors[key] = rep.errors.get(key, 0) + 1
+
+def _iter_lines(paths: list[Path], enc: str) -> Iterator[str]:
+    for path in paths:
+        opener = gzip.open if path.suffix == ".gz" else open
+        with opener(path, "rb") as f:
+            for raw in f:
+                yield raw.decode(encoding=enc, errors="replace").rstrip()
+
+def _expand(paths: list[Path]) -> list[Path]:
+    """ 目录展开成其中的 *.log / *.log.gz，按文件名排序（MC 归档名即日期） """
+    out: list[Path] = []
+    for p in paths:
+        if p.is_dir():
+            out.extend(sorted([*p.glob("*.log.gz"), *p.glob("*.log")]))
+        else:
+            out.append(p)
+    return out
+
+async def run_backtest(
+    paths: list[Path],
+    rules: Optional[list[dict[str, Any]]] = None,
+    timeline_limit: int = 50,
+) -> BacktestReport:
+    """ 回测入口：rules 不传时使用 config.json 的 TRIGGERS """
+    rules = _TRIGGERS if rules is None else rules
+    files = _expand(paths)
+    recorder = _Recorder(rules, timeline_limit)
+    fluent_bind_control(_DryRunControl(recorder))
+    listener = MinecraftLogListener()
+    service = _BacktestTriggerService(recorder, rules)
+
+    # 限流 / 窗口按日志时间推进，而不是按回测的真实耗时
+    virtual = VirtualClock()
+    day, last_sec = 0, -1
+    lines = events = 0
+    events_by_name: Counter[str] = Counter()
+
+    logger.disable("simmc")
+    start = time.perf_counter()
+    try:
+        with use_clock(virtual):
+            for line in _iter_lines(files, listener.enc):
+                lines += 1
+                m = _TIME_RE.match(line)
+                if m:
+                    sec = int(m[1]) * 3600 + int(m[2]) * 60 + int(m[3])
+                    if sec < last_sec - 43200:       # 跨天
+                        day += 1
+                    last_sec = sec
+                    virtual.set(day * 86400.0 + sec)
+                    recorder.log_time = f"D{day} {m[1]}:{m[2]}:{m[3]}" if day else f"{m[1]}:{m[2]}:{m[3]}"
+                for req in listener._parse(line):
+                    events += 1
+                    events_by_name[req.event_name] += 1
+                    await service.handle(req.event)
+    finally:
+        logger.enable("simmc")
+    elapsed = time.perf_counter() - start
+
+    return BacktestReport(
+        files=[str(p) for p in files],
+        lines=lines,
+        events=events,
+        actions=recorder.actions,
+        elapsed_sec=elapsed,
+        lines_per_sec=lines / elapsed if elapsed else 0.0,
+        events_per_sec=events / elapsed if elapsed else 0.0,
+        events_by_name=dict(events_by_name),
+        rules=recorder.rules,
+    )
+
+def format_report(report: BacktestReport, show: int = 10) -> str:
+    """ 人读的文本报告 """
+    out = [
+        f"文件: {len(report.files)} 个, 行数: {report.lines}, 事件: {report.events}, 动作: {report.actions}",
+        f"耗时: {report.elapsed_sec:.2f}s, 吞吐: {report.lines_per_sec:,.0f} 行/s, {report.events_per_sec:,.0f} 事件/s",
+        "事件分布: " + ", ".join(f"{k}={v}" for k, v in sorted(report.events_by_name.items(), key=lambda kv: -kv[1])),
+        "",
+    ]
+    for rule in report.rules:
+        title = f"#{rule.index} [{rule.on} -> {rule.cmd}] {rule.comment}".rstrip()
+        out.append(f"{title}: 触发 {rule.fires} 次")
+        for err, n in rule.errors.items():
+            out.append(f"    !! {n:>6} × {err}")
+        for cmd, n in sorted(rule.commands.items(), key=lambda kv: -kv[1])[:show]:
+            out.append(f"    {n:>6} × {cmd}")
+        for at, cmds in rule.timeline[:show]:
+            out.append(f"    {at}  {' ; '.join(cmds)}")
+        if len(rule.timeline) > show:
+            out.append(f"    ... 共记录 {len(rule.timeline)} 条时间线")
+    return "\n".join(out)
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m simmc.backtest", description="用录好的日志回测触发器（只记录，不执行）")
+    parser.add_argument("logs", nargs="+", type=Path, help="latest.log / *.log.gz / 日志目录")
+    parser.add_argument("--triggers", type=Path, help="待验证的触发器 JSON（列表，或含 TRIGGERS 的配置），默认用 config.json")
+    parser.add_argument("--timeline", type=int, default=50, help="每条规则最多记录多少条时间线")
+    parser.add_argument("--show", type=int, default=10, help="文本报告里每条规则展示多少条")
+    parser.add_argument("--json", type=Path, help="完整报告另存为 JSON")
+    args = parser.parse_args(argv)
+
+    rules = None
+    if args.triggers is not None:
+        loaded = json.loads(args.triggers.read_text(encoding="utf-8"))
+        rules = loaded["TRIGGERS"] if isinstance(loaded, dict) else loaded
+
+    report = asyncio.run(run_backtest(args.logs, rules, args.timeline))
+    print(format_report(report, args.show))
+    if args.json is not None:
+        args.json.write_text(json.dumps(dataclasses.asdict(report), ensure_ascii=False, indent=2), encoding="utf-8")
+
+if __name__ == "__main__":
+    main()
@@ -186,6 +186,27 @@ _DEFAULT_PATTEN_TEMP: list[EventRegexRules] = \
         "groups": []
       }
     ]
+  },
+  {
+    "name": "发言限流",
+    "rules": [
+      {
+        "regex": "^\\[CHAT\\]\\s*(?:\\[[^\\]]*\\]\\s*)?(?:(?!\\s说)[^:：<>]){0,40}?(?:请|需要?)等待\\s*(?P<wait>\\d+(?:\\.\\d+)?)\\s*秒",
+        "groups": [
+          "wait"
+        ]
+      },
+      {
+        "regex": "^\\[CHAT\\]\\s*(?:\\[[^\\]]*\\]\\s*)?(?:You must wait|Please wait) (?P<wait>\\d+(?:\\.\\d+)?) seconds?",
+        "groups": [
+          "wait"
+        ]
+      },
+      {
+        "regex": "^\\[CHAT\\]\\s*(?:\\[[^\\]]*\\]\\s*)?(?:请勿刷屏|请不要刷屏|(?:发言|说话|消息|指令|命令|操作)(?:发送)?(?:过快|太快|过于频繁)|You are (?:sending|typing) (?:messages|commands|chat) too fast|Please (?:slow down|do not spam)|Don't spam)",
+        "groups": []
+      }
+    ]
   }
 ]
 
@@ -193,7 +214,8 @@ _DEFAULT_PATTEN_TEMP: list[EventRegexRules] = \
 _DEFAULT_CONF = {
     "MINECRAFT": {
         "GAME_TITLE": "Minecraft* 1.21.8 - 多人游戏（第三方服务器）",
-        "USER_ID": "Kamishirasawa_CN"
+        "USER_ID": "Kamishirasawa_CN",
+        "INPUT_BACKEND": "keyboard"
     },
     "QUEUE_OCR_SETTINGS": {
         "TESSERACT_CMD": "./tesseract/tesseract.exe",
@@ -230,9 +252,11 @@ _pat: list[EventRegexRules] = json.loads(_PATT_FILE.read_text(encoding="utf-8"))
 # ---------- 结构化映射 ----------
 MYSELF: str               = _cfg["MINECRAFT"]["USER_ID"]
 GAME_TITLE: str           = _cfg["MINECRAFT"]["GAME_TITLE"]
+INPUT_BACKEND: str        = _cfg["MINECRAFT"].get("INPUT_BACKEND", "keyboard")   # keyboard / agent
 TESSERACT_CMD: Path        = Path(_cfg["QUEUE_OCR_SETTINGS"]["TESSERACT_CMD"])
 ROI: tuple                  = tuple(_cfg["QUEUE_OCR_SETTINGS"]["ROI"])
 
 CMD_CHANNEL_TABLE: dict[str, str]    = _cfg["SERVER"]["CHAT_CHANNELS"]
 PATTERNS             = _pat          # 正则表
-_TRIGGERS: list[dict] = _cfg.get("TRIGGERS", [])
\ No newline at end of file
+_TRIGGERS: list[dict] = _cfg.get("TRIGGERS", [])
+SESSIONS: list[dict]  = _cfg.get("SESSIONS", [])     # 多账号会话，见 schedule/session.py
\ No newline at end of file
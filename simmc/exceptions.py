@@ -6,4 +6,13 @@ class ConfigFileError(SimmCFrameworkException):
     """ 配置文件出错 """
 
 class ServerCommandError(SimmCFrameworkException):
-    """ 指令不正确 """
\ No newline at end of file
+    """ 指令不正确 """
+
+class CommandRejectedError(ServerCommandError):
+    """ 服务器回复了失败（回执命中失败规则），result 是对应的 AckResult """
+    def __init__(self, message: str, result: object = None) -> None:
+        super().__init__(message)
+        self.result = result
+
+class InputBackendError(SimmCFrameworkException):
+    """ 输入后端调用失败 """
@@ -4,13 +4,233 @@
 import asyncio
 import aiofiles
 import re
-from typing import AsyncGenerator
+import inspect
+from functools import cache
+from typing import TYPE_CHECKING, Any, AsyncGenerator, Callable, Optional
 from pathlib import Path
 from ..schemas.event_registry import get_event
-from ..schemas.event import EventRequest
+from ..schemas.event import EventBase, EventRequest
 from ..utils.logger import logger
 from ..utils.conf_injector import Inject
+from ..utils.metrics import REGISTRY, Counter
 from ..constants import PATTERNS
+if TYPE_CHECKING:
+    from ..operation.ack import AckTracker
+
+_LINES = REGISTRY.counter("simmc_log_lines_total", "监听器读取的日志行数")
+
+_CHAT_EVENTS = frozenset({"消息", "悄悄话"})
+""" 玩家说的话：内容由玩家决定，不拿去对指令回执 """
+
+type EventCtor = Callable[[re.Match[str]], EventBase]
+type Rule = tuple[re.Pattern[str], EventCtor, tuple[str, ...]]
+
+_QUANTIFIERS = frozenset("*?{")
+""" 让前一个字符 / 分组可以不出现的量词（+ 至少一次，不影响） """
+
+def _skip(regex: str, i: int) -> int:
+    """ regex[i] 开始的一个转义或字符类之后的下标；其它字符原样 +1 """
+    if regex[i] == "\\":
+        return i + 2
+    if regex[i] != "[":
+        return i + 1
+    j = i + 1
+    if j < len(regex) and regex[j] == "^":
+        j += 1
+    if j < len(regex) and regex[j] == "]":
+        j += 1
+    while j < len(regex) and regex[j] != "]":
+        j += 2 if regex[j] == "\\" else 1
+    return j + 1
+
+_ESCAPE_ARG = {"x": 2, "u": 4, "U": 8}
+
+def _escape_end(regex: str, i: int) -> int:
+    """ regex[i] 是反斜杠：返回整段转义之后的下标，\\x41 \\u4e00 \\N{...} \\012 \\12 连参数一起算 """
+    nxt = regex[i + 1]
+    j = i + 2
+    if nxt in _ESCAPE_ARG:
+        return min(j + _ESCAPE_ARG[nxt], len(regex))
+    if nxt == "N" and regex.startswith("{", j):
+        close = regex.find("}", j)
+        return len(regex) if close < 0 else close + 1
+    if nxt.isdigit():                       # 八进制 / 反向引用，最多三位
+        while j < len(regex) and j < i + 4 and regex[j].isdigit():
+            j += 1
+    return j
+
+def _has_inline_flags(regex: str) -> bool:
+    """ (?x) (?i) (?s:...) 之类：会改变字面量含义（比如 x 忽略空白），这种正则不做预筛 """
+    i = 0
+    while i < len(regex):
+        if regex[i] in "\\[":
+            i = _skip(regex, i)
+            continue
+        if regex.startswith("(?", i) and i + 2 < len(regex) and regex[i + 2] in "aiLmsux-":
+            return True
+        i += 1
+    return False
+
+def _split_top(regex: str) -> tuple[list[str], list[tuple[int, int]]]:
+    """ 按顶层 | 切分，同时给出顶层分组的 (起, 止) 下标 """
+    branches: list[str] = []
+    groups: list[tuple[int, int]] = []
+    depth, start, opened, i = 0, 0, 0, 0
+    while i < len(regex):
+        ch = regex[i]
+        if ch in "\\[":
+            i = _skip(regex, i)
+            continue
+        if ch == "(":
+            if depth == 0:
+                opened = i
+            depth += 1
+        elif ch == ")" and depth > 0:
+            depth -= 1
+            if depth == 0:
+                groups.append((opened, i))
+        elif ch == "|" and depth == 0:
+            branches.append(regex[start:i])
+            start = i + 1
+        i += 1
+    branches.append(regex[start:])
+    return branches, groups
+
+def _group_body(body: str) -> Optional[str]:
+    """ 分组内容去掉 ?: / ?P<name> 前缀；先行断言、内联标志等返回 None（不参与） """
+    if not body.startswith("?"):
+        return body
+    if body.startswith("?:"):
+        return body[2:]
+    if body.startswith("?P<") and ">" in body:
+        return body[body.index(">") + 1:]
+    return None
+
+def _required_literals(regex: str) -> list[tuple[str, ...]]:
+    """
+    正则里必须出现的字面量，每项是“任选其一”的候选串。只扫正则串本身、不解析语法树：
+    转义的标点当字面量，\\d \\s、字符类和其它元字符断开；后面跟 * ? {} 的字符或分组可以不出现，跳过。
+    不带量词的分组递归进去，分支全都有字面量时各取一个作为候选。
+    """
+    branches, groups = _split_top(regex)
+    if len(branches) > 1:
+        alts: list[str] = []
+        for branch in branches:
+            sub = _required_literals(branch)
+            if not sub:
+                return []
+            alts.extend(max(sub, key=lambda r: min(map(len, r))))
+        return [tuple(alts)]
+
+    reqs: list[tuple[str, ...]] = []
+    run: list[str] = []
+    group_end = dict(groups)
+    i, n = 0, len(regex)
+
+    def flush() -> None:
+        if run:
+            reqs.append(("".join(run),))
+            run.clear()
+
+    while i < n:
+        ch = regex[i]
+        if ch == "\\" and i + 1 < n:
+            nxt = regex[i + 1]
+            if nxt.isalnum():               # \d \w \s \b \1 \x41 …：不当字面量，参数一起跳过
+                flush()
+                i = _escape_end(regex, i)
+            else:
+                run.append(nxt)
+                i += 2
+        elif ch == "[":
+            flush()
+            i = _skip(regex, i)
+        elif ch == "(":
+            flush()
+            end = group_end.get(i, n - 1)
+            body = _group_body(regex[i + 1:end])
+            if body is not None and (end + 1 >= n or regex[end + 1] not in _QUANTIFIERS):
+                reqs.extend(_required_literals(body))
+            i = end + 1
+        elif ch in _QUANTIFIERS:
+            if run:
+                run.pop()
+            flush()
+            i += 1
+            if ch == "{":                   # 跳过 {m,n}
+                close = regex.find("}", i)
+                i = n if close < 0 else close + 1
+        elif ch in ".^$+)":
+            flush()
+            i += 1
+        else:
+            run.append(ch)
+            i += 1
+    flush()
+    return reqs
+
+def _prefilter(regex: str, hints: Optional[list[str]] = None) -> tuple[str, ...]:
+    """
+    一组“至少出现其一”的小写字面量，行里一个都没有就不必跑正则。
+    像 `.*?(...).*?邀请` 这种前导通配的规则逐行 search 非常慢，先用 in 筛掉绝大多数行。
+    规则配置里写了 "literals" 就直接用它；否则从正则串里取最长的必现字面量（组）。
+    没有合适字面量时返回空元组（不过滤）。
+    """
+    if hints:
+        return tuple(lit.lower() for lit in hints)
+    if _has_inline_flags(regex):
+        return ()
+    # 只用大小写折叠后不变的字面量（ASCII / 中文等），保证和 IGNORECASE 语义一致
+    reqs = [r for r in _required_literals(regex) if all(lit.isascii() or lit.lower() == lit.upper() for lit in r)]
+    if not reqs:
+        return ()
+    best = max(reqs, key=lambda r: min(map(len, r)))
+    if min(map(len, best)) < 2:
+        return ()
+    return tuple(lit.lower() for lit in best)
+
+def _make_ctor(event_cls: type[EventBase], pattern: re.Pattern[str]) -> EventCtor:
+    """
+    为一条规则预先生成事件构造器：
+    命名分组恰好是构造器前几个参数时按位置取组（不建 groupdict），否则退回关键字参数。
+    """
+    params = [
+        name for name, p in inspect.signature(event_cls).parameters.items()
+        if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD)
+    ]
+    groups = pattern.groupindex
+    if not groups:
+        return lambda m: event_cls()
+    if set(groups) == set(params[:len(groups)]):
+        idx = tuple(groups[name] for name in params[:len(groups)])
+        if len(idx) == 1:
+            i = idx[0]
+            return lambda m: event_cls(m.group(i))
+        return lambda m: event_cls(*m.group(*idx))
+    return lambda m: event_cls(**m.groupdict())
+
+@cache
+def _compiled_patterns() -> dict[str, list[Rule]]:
+    """预编译正则规则、事件构造器和字面量预筛，进程内所有监听器（多账号会话）共用一份"""
+    rule_cache: dict[str, list[Rule]] = {}
+    for event_rules in PATTERNS:
+        key = event_rules["name"]
+        event_cls = get_event(key)
+        if event_cls is None:
+            logger.warning(f"事件名 '{key}' 未注册，跳过")
+            continue
+        rules: list[Rule] = []
+        for rule in event_rules["rules"]:
+            pat = re.compile(rule["regex"], re.IGNORECASE)
+            needed = frozenset(rule["groups"])
+            # 命名分组在编译期就确定了，缺字段的规则永远不会产出合法事件
+            if needed and set(pat.groupindex) != needed:
+                logger.warning(f"事件: {key} 的规则缺字段 {sorted(needed - set(pat.groupindex))}，跳过")
+                continue
+            rules.append((pat, _make_ctor(event_cls, pat), _prefilter(rule["regex"], rule.get("literals"))))
+        rule_cache[key] = rules
+        logger.success(f"事件<{key}> 预编译完成，规则数: {len(rules)}")
+    return rule_cache
 
 @Inject(at={"mode", "enc", "host", "port", "log_path"})
 class MinecraftLogListener:
@@ -29,8 +249,9 @@ class MinecraftLogListener:
 
     def __init__(self) -> None:
         self._offset = 0
-        self._rule_cache: dict[str, list[re.Pattern]] = {}
-        self._needed_cache: dict[str, list[frozenset[str]]] = {}
+        self._rule_cache: dict[str, list[Rule]] = {}
+        self.acks: Optional["AckTracker"] = None
+        """ 玩家控制器的回执表；设置后每一行日志也拿去给等回执的指令对号 """
         self._compile()
 
     async def listen(self) -> AsyncGenerator[EventRequest]:
@@ -104,37 +325,29 @@ class MinecraftLogListener:
             yield ev
 
     def _compile(self) -> None:
-        """共享：预编译正则规则"""
-        self._rule_cache = {}
-        self._needed_cache = {}
-        for event_rules in PATTERNS:
-            key = event_rules["name"]
-            patterns, neededs = [], []
-            for rule in event_rules["rules"]:
-                patterns.append(re.compile(rule["regex"], re.IGNORECASE))
-                neededs.append(frozenset(rule["groups"]))
-            self._rule_cache[key] = patterns
-            self._needed_cache[key] = neededs
-            logger.success(f"事件<{key}> 预编译完成，规则数: {len(patterns)}")
+        """共享：取进程级预编译正则表"""
+        self._rule_cache = _compiled_patterns()
+        self._matched: dict[str, Counter] = {
+            key: REGISTRY.counter("simmc_log_events_total", "日志规则命中并生成的事件数", {"event": key})
+            for key in self._rule_cache
+        }
 
     def _parse(self, line: str) -> list[EventRequest]:
         """共享：解析单行日志"""
+        _LINES.value += 1
         events: list[EventRequest] = []
-        for key, patterns in self._rule_cache.items():
-            for pat in patterns:
+        lowered = line.lower()
+        for key, rules in self._rule_cache.items():
+            for pat, ctor, hints in rules:
+                if hints and (hints[0] not in lowered if len(hints) == 1 else not any(h in lowered for h in hints)):
+                    continue
                 m = pat.search(line)
                 if not m:
                     continue
-                data = m.groupdict()
-                needed = self._needed_cache[key][patterns.index(pat)]
-                if needed and set(data) != needed:
-                    logger.warning(f"事件: {key} 缺字段，跳过")
-                    continue
-
-                EventCls = get_event(key)
-                if EventCls is None:
-                    logger.warning(f"事件名 '{key}' 未注册，跳过")
-                    continue
-                events.append(EventRequest(key, EventCls(**data)))
-                logger.trace(f"({key}) -> {EventCls.__name__} ({data})")
+                ev = ctor(m)
+                events.append(EventRequest(key, ev))
+                self._matched[key].value += 1
+                logger.trace(f"({key}) -> {type(ev).__name__} ({m.groupdict()})")
+        if self.acks is not None and not any(req.event_name in _CHAT_EVENTS for req in events):
+            self.acks.feed(line)
         return events
\ No newline at end of file
@@ -0,0 +1,190 @@
+""" 指令回执：把发出去的指令和服务器回复的日志行对上，按服务器的实际结果完成或报错 """
+# simmc/operation/ack.py
+from __future__ import annotations
+import re
+import asyncio
+import itertools
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import cache
+from typing import Any, Awaitable, Callable, Optional
+from ..exceptions import CommandRejectedError
+from ..utils import clock
+from ..utils.logger import logger
+from ..utils.metrics import REGISTRY
+
+_ACK_SEC = REGISTRY.histogram("simmc_ack_seconds", "指令从登记到收到服务器回执的时间")
+_ACKS = {
+    result: REGISTRY.counter("simmc_acks_total", "指令回执结果", {"result": result})
+    for result in ("ok", "rejected", "timeout")
+}
+
+class AckTimeout(asyncio.TimeoutError):
+    """ 指令已发出，但在期限内没等到服务器的回执（不代表失败，只是不知道结果） """
+
+SYSTEM_MESSAGE = r"^\[CHAT\]\s*(?:\[[^\]]*\]\s*)?"
+"""
+服务器系统消息的开头：[CHAT] 加最多一个插件标签，后面紧跟正文。
+玩家聊天在频道标签后还有“名字:”，回执规则都以它开头，就不会被聊天内容里的同样字眼对上。
+"""
+
+@dataclass(frozen=True, slots=True)
+class AckSpec:
+    """
+    一类指令的回执规则。success / failure 是日志行上 search 的正则（不区分大小写）。
+    key 里列出的命名分组用来把回执对上具体哪一条指令（例如转账对象）；
+    规则里没有这些分组时（例如笼统的“余额不足”），回执给该类最早登记的那一条。
+    """
+    kind: str
+    success: tuple[str, ...]
+    failure: tuple[str, ...] = ()
+    key: tuple[str, ...] = ()
+
+@dataclass(frozen=True, slots=True)
+class AckResult:
+    """ 服务器回执 """
+    ok: bool
+    line: str
+    """ 命中的日志行 """
+    groups: dict[str, Any]
+    latency: float
+    """ 从登记到收到回执（秒） """
+
+@cache
+def _compiled(spec: AckSpec) -> tuple[tuple[bool, re.Pattern[str], bool], ...]:
+    """ (是否成功, 正则, 是否带全部 key 分组)；失败规则排在前面，同一行两边都命中时按失败算 """
+    out = []
+    for ok, patterns in ((False, spec.failure), (True, spec.success)):
+        for regex in patterns:
+            pat = re.compile(regex, re.IGNORECASE)
+            out.append((ok, pat, bool(spec.key) and set(spec.key) <= set(pat.groupindex)))
+    return tuple(out)
+
+def _norm(values: tuple[Any, ...]) -> tuple[str, ...]:
+    return tuple(str(v).strip().lower() for v in values)
+
+def _drop(index: dict[Any, dict[int, PendingAck]], key: Any, seq: int) -> None:
+    bucket = index.get(key)
+    if bucket is not None:
+        bucket.pop(seq, None)
+        if not bucket:
+            del index[key]
+
+class PendingAck:
+    """ 一条等回执的指令 """
+    __slots__ = ("seq", "spec", "key", "future", "at")
+
+    def __init__(self, seq: int, spec: AckSpec, key: tuple[str, ...], future: asyncio.Future[AckResult]) -> None:
+        self.seq = seq
+        self.spec = spec
+        self.key = key
+        self.future = future
+        self.at = clock.now()
+
+    async def wait(self, sec: Optional[float]) -> AckResult:
+        """ 等回执；成功返回结果，服务器拒绝抛 CommandRejectedError，超时抛 AckTimeout """
+        try:
+            result = await asyncio.wait_for(self.future, sec)      # 超时或被取消时 future 一并取消、出表
+        except asyncio.TimeoutError:
+            _ACKS["timeout"].value += 1
+            raise AckTimeout(f"{self.spec.kind} 指令 {sec}s 内没有收到服务器回执") from None
+        if not result.ok:
+            raise CommandRejectedError(f"服务器拒绝了 {self.spec.kind} 指令：{result.line}", result)
+        return result
+
+    def cancel(self) -> None:
+        """ 不再等（指令没发出去、调用方放弃） """
+        self.future.cancel()
+
+class AckTracker:
+    """
+    等回执的指令表。按 (类别, key) 和类别两级索引，监听器每来一行只试当前有人在等的那几类规则，
+    命中后按分组值直接查到对应的指令；没人等回执时 feed 立即返回。
+    一行日志最多完成一条指令。
+    """
+
+    def __init__(self) -> None:
+        self._seq = itertools.count()
+        self._specs: dict[str, AckSpec] = {}
+        self._by_kind: dict[str, dict[int, PendingAck]] = {}
+        self._by_key: dict[tuple[str, tuple[str, ...]], dict[int, PendingAck]] = {}
+        self.matched: int = 0
+        """ 已对上回执的指令数 """
+
+    def expect(self, spec: AckSpec, key: tuple[Any, ...] = ()) -> PendingAck:
+        """ 登记一条将要发出的指令；必须在发送之前调用，否则可能错过回执 """
+        if len(key) != len(spec.key):
+            raise ValueError(f"{spec.kind} 回执需要 key {spec.key}，给的是 {key}")
+        fut: asyncio.Future[AckResult] = asyncio.get_running_loop().create_future()
+        ack = PendingAck(next(self._seq), spec, _norm(key), fut)
+        self._specs[spec.kind] = spec
+        self._by_kind.setdefault(spec.kind, {})[ack.seq] = ack
+        if spec.key:
+            self._by_key.setdefault((spec.kind, ack.key), {})[ack.seq] = ack
+        fut.add_done_callback(lambda _: self._forget(ack))
+        return ack
+
+    def _forget(self, ack: PendingAck) -> None:
+        kind = ack.spec.kind
+        _drop(self._by_kind, kind, ack.seq)
+        if ack.spec.key:
+            _drop(self._by_key, (kind, ack.key), ack.seq)
+
+    def pending(self) -> int:
+        return sum(map(len, self._by_kind.values()))
+
+    def feed(self, line: str) -> Optional[PendingAck]:
+        """ 喂一行日志；对上了就完成那条指令并返回它 """
+        if not self._by_kind:
+            return None
+        best: Optional[tuple[PendingAck, bool, re.Match[str]]] = None
+        for kind in self._by_kind:
+            spec = self._specs[kind]
+            for ok, pat, keyed in _compiled(spec):
+                m = pat.search(line)
+                if m is None:
+                    continue
+                if keyed:
+                    bucket = self._by_key.get((kind, _norm(tuple(m.group(g) for g in spec.key))), {})
+                else:
+                    bucket = self._by_kind[kind]
+                # 同一 key 先登记的先完成；已取消、回调还没跑的跳过
+                ack = next((a for a in bucket.values() if not a.future.done()), None)
+                if ack is not None and (best is None or ack.seq < best[0].seq):
+                    best = (ack, ok, m)
+                break                                       # 每类只看第一条命中的规则
+        if best is None:
+            return None
+        ack, ok, m = best
+        latency = clock.now() - ack.at
+        _ACK_SEC.observe(latency)
+        _ACKS["ok" if ok else "rejected"].value += 1
+        self.matched += 1
+        self._forget(ack)               # 立即出表，同一批里的下一行不会再对上它
+        logger.debug(f"{ack.spec.kind} 指令回执（{'成功' if ok else '失败'}，{latency:.3f}s）：{line}")
+        ack.future.set_result(AckResult(ok, line, m.groupdict(), latency))
+        return ack
+
+_current_tracker: ContextVar[Optional[AckTracker]] = ContextVar("ack_tracker", default=None)
+
+def use_tracker(tracker: AckTracker) -> None:
+    """ 在当前上下文里绑定回执表 """
+    _current_tracker.set(tracker)
+
+async def run_confirmed(
+    handler: Callable[[], Awaitable[None]],
+    spec: AckSpec,
+    key: tuple[Any, ...],
+    sec: Optional[float],
+) -> None:
+    """ 执行计划里的一步：登记回执 -> 发指令 -> 等服务器确认，再让下一步开始 """
+    tracker = _current_tracker.get()
+    if tracker is None:
+        raise RuntimeError("当前上下文没有回执表，run_confirmed 只能在 PlayerControl 的 worker 里执行")
+    ack = tracker.expect(spec, key)
+    try:
+        await handler()
+    except BaseException:
+        ack.cancel()
+        raise
+    await ack.wait(sec)
@@ -1,16 +1,14 @@
+from .input_backend import current_backend
+from .timeline import jump_timeline, pause, play
+from ..utils.window_focus import get_window_tracker
 
-import time
-import pyautogui
-from ..utils.functools import sync_to_async
-from ..utils.find_window import get_foreground_title
+async def jump_action(times: int = 3, interval: float = 1.0) -> None:
+    """ 原地跳：按键时刻交给事件循环排程，只有按下/松开那一瞬间进输入线程 """
+    backend = current_backend()
+    if backend.needs_focus and not await get_window_tracker().check_focus():
+        return
+    await play(jump_timeline(times, interval), backend)
 
-@sync_to_async
-def jump_action(times: int = 3, interval: float = 1.0) -> None:
-    title = get_foreground_title()
-    if title and "Minecraft" in title:
-        for i in range(1, times + 1):
-            pyautogui.keyDown("space")
-            time.sleep(0.2) 
-            pyautogui.keyUp("space")
-            if i < times + 1:                
-                time.sleep(interval) 
\ No newline at end of file
+async def wait_action(sec: float) -> None:
+    """ 流阻塞：真实后端在事件循环里等，虚拟后端只推进虚拟时钟 """
+    await pause(sec)
@@ -0,0 +1,156 @@
+""" 聊天批处理：把队列里排着的聊天/转账/领地指令合并成一次输入会话 """
+# simmc/operation/chat_batch.py
+from __future__ import annotations
+from functools import partial
+from dataclasses import dataclass
+from typing import Any, Optional, Sequence
+from .type_chat import type_in_chat
+from .input_backend import KeyboardBackend, current_backend
+from .outbound import current_channel, send_limited
+from .timeline import pause
+from .player_control import Handler
+from ..utils import clock
+from ..utils.conf_injector import Inject
+from ..utils.logger import logger
+from ..utils.metrics import REGISTRY
+
+_BATCH_SIZE = REGISTRY.histogram("simmc_chat_batch_size", "每次输入会话合并的请求数", buckets=(1, 2, 4, 8, 16, 32, 64))
+_LINES = REGISTRY.counter("simmc_chat_lines_total", "输入会话实际发出的行数（含频道切换）")
+_SWITCHES = REGISTRY.counter("simmc_chat_channel_switches_total", "输入会话里的频道切换次数")
+_SPLITS = REGISTRY.counter("simmc_chat_splits_total", "超长被拆开的消息数")
+
+@dataclass(slots=True)
+class ChatLine:
+    """ 一条待发送的输入 """
+    owner: int
+    """ 属于批次里的第几个请求 """
+    text: str
+    channel: Optional[str] = None
+    """ 公屏消息要求的频道；None 表示不关心（指令、私聊、没指定频道的公屏） """
+    gap: float = 0.0
+    """ 发完后至少隔多久再发下一条（请求里的 interval） """
+    switch: bool = False
+    """ 这一行是切到 channel 的频道指令 """
+
+def split_message(text: str, limit: int) -> list[str]:
+    """
+    把超过服务器长度上限的消息拆成几条。
+    /m 私聊拆开后每段都带上 "/m 玩家 " 前缀；其它指令拆了就坏了，原样返回。
+    优先在空白、标点处断开，找不到再硬切。
+    """
+    if len(text) <= limit:
+        return [text]
+    prefix = ""
+    body = text
+    if text.startswith("/"):
+        parts = text.split(" ", 2)
+        if parts[0] != "/m" or len(parts) < 3:
+            logger.warning(f"指令超过长度上限 {limit}，无法拆分，原样发送：{text[:32]}...")
+            return [text]
+        prefix, body = f"/m {parts[1]} ", parts[2]
+    room = limit - len(prefix)
+    if room <= 0:
+        return [text]
+    chunks: list[str] = []
+    while len(body) > room:
+        # 标点留在前一段末尾，只能落在 room 以内；空格会被 rstrip 掉，正好落在 room 上也行
+        cut = max(body.rfind(sep, 0, room + 1 if sep == " " else room) for sep in " ，。！？,.!?;；")
+        cut = cut + 1 if cut > room // 2 else room
+        chunks.append(prefix + body[:cut].rstrip())
+        body = body[cut:].lstrip()
+    if body:
+        chunks.append(prefix + body)
+    _SPLITS.value += 1
+    return chunks
+
+@Inject(at={"enabled", "max_len", "max_batch", "open_delay", "paste_delay"})
+class ChatBatcher:
+    """
+    PlayerControl 的批处理器：worker 取到聊天类请求时，把后面紧跟着的、已就绪的聊天类请求一起取出，
+    拆分超长消息、按频道分组（少切频道），在一次输入会话里连续发完。
+    长期速率交给出站限流（OutboundLimiter），这里只保证每条消息自带的 interval。
+    """
+    # 下面配置会自动注入
+    enabled: bool = True
+    max_len: int = 256
+    """ 服务器单条消息长度上限 """
+    max_batch: int = 32
+    """ 一次会话最多合并的请求数 """
+    open_delay: float = 0.05
+    """ 回车后等聊天栏弹出（仅键盘后端） """
+    paste_delay: float = 0.03
+    """ 粘贴后等输入框刷新（仅键盘后端） """
+
+    def __init__(self) -> None:
+        self._not_before = 0.0
+        """ 上一条消息的 interval 到期时刻，跨批次保留 """
+        self._keyboard: Optional[KeyboardBackend] = None
+
+    @property
+    def channel(self) -> Optional[str]:
+        """ 服务器这边当前的频道（发送层记录，单独执行的请求切了频道也知道），未知为 None """
+        return current_channel()
+
+    def accepts(self, handler: Handler) -> bool:
+        """ 只接管 type_in_chat 生成的处理器（聊天、转账、领地指令都是） """
+        return self.enabled and isinstance(handler, partial) and handler.func is type_in_chat
+
+    def _lines_of(self, owner: int, handler: partial) -> list[ChatLine]:
+        call: dict[str, Any] = dict(zip(("text", "interval", "channel"), handler.args))
+        call.update(handler.keywords)
+        text = call["text"]
+        texts = text if isinstance(text, list) else [text]
+        channel = call.get("channel")
+        lines = [
+            ChatLine(owner, piece, None if piece.startswith("/") else channel)
+            for t in texts for piece in split_message(t, self.max_len)
+        ]
+        if lines:
+            lines[-1].gap = float(call.get("interval", 1.0))
+        return lines
+
+    def plan(self, handlers: Sequence[Handler]) -> list[ChatLine]:
+        """
+        排出本次会话的发送顺序：先发不用切频道的（指令、当前频道），
+        其余按频道首次出现的顺序成组发送，组前插一条 /<频道>。同一组内保持原顺序。
+        """
+        groups: dict[Optional[str], list[ChatLine]] = {None: []}
+        for i, handler in enumerate(handlers):
+            for line in self._lines_of(i, handler):     # type: ignore[arg-type]
+                key = None if line.channel == self.channel else line.channel
+                groups.setdefault(key, []).append(line)
+        out = groups.pop(None)
+        for channel, lines in groups.items():
+            out.append(ChatLine(lines[0].owner, f"/{channel}", channel, switch=True))
+            out.extend(lines)
+        return out
+
+    async def run(self, handlers: Sequence[Handler]) -> list[Optional[BaseException]]:
+        """ 执行一批请求，返回每个请求的结果（None 表示成功），顺序与 handlers 一致 """
+        _BATCH_SIZE.observe(len(handlers))
+        lines = self.plan(handlers)
+        last = {line.owner: i for i, line in enumerate(lines)}
+        sent, exc = await self._session(lines)
+        return [None if last.get(i, -1) < sent else exc for i in range(len(handlers))]
+
+    async def _session(self, lines: list[ChatLine]) -> tuple[int, Optional[BaseException]]:
+        """ 连续打字：每行过出站限流后在输入线程里发，行间等待在事件循环里；返回 (发出的行数, 中断时的异常) """
+        backend = current_backend()
+        if type(backend) is KeyboardBackend:        # 键盘后端换成会话里的短延迟
+            if self._keyboard is None:
+                self._keyboard = KeyboardBackend(self.open_delay, self.paste_delay)
+            backend = self._keyboard
+        for i, line in enumerate(lines):
+            try:
+                delay = self._not_before - clock.now()
+                if delay > 0:
+                    await pause(delay, backend)
+                await send_limited(backend, line.text)
+            except Exception as exc:
+                logger.exception(f"输入会话在第 {i + 1}/{len(lines)} 行中断：{exc}")
+                return i, exc
+            self._not_before = clock.now() + line.gap
+            _LINES.value += 1
+            if line.switch:
+                _SWITCHES.value += 1
+        return len(lines), None
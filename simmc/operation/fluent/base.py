@@ -2,16 +2,21 @@
 # simmc/operation/Fluent/base.py
 from __future__ import annotations
 import asyncio
+from contextvars import ContextVar
 from functools import partial
 from datetime import timedelta
 from typing import Awaitable, Callable, Optional, Self, Any
-from ..player_control import PlayerControl
-from ..actions import jump_action
+from ..player_control import PlayerControl, Priority
+from ..actions import jump_action, wait_action
+from ..ack import AckResult, AckSpec, PendingAck, run_confirmed
+from .plan import ExecutionPlan, PlanStep, run_plan
 from ...security import json_export
+from ...exceptions import ServerCommandError
 from ...utils.logger import logger
 from ...schemas.typing import TimeDeltaLike
 
 _global_control: Optional[PlayerControl] = None
+_session_control: ContextVar[Optional[PlayerControl]] = ContextVar("session_control", default=None)
 
 def _to_sec(value: TimeDeltaLike) -> float:
     """ 把TimeDeltaLike类型转float类型 """
@@ -27,16 +32,72 @@ def fluent_init_control(c: PlayerControl) -> None:
     _global_control = c
     logger.debug("玩家控制器设置完成，后续可以使用流操作")
 
+def fluent_bind_control(c: PlayerControl) -> None:
+    """
+    只在当前上下文（会话）内绑定控制器，多账号同进程时使用；
+    在此上下文里创建的任务执行流操作都会落到这个控制器上
+    """
+    _session_control.set(c)
+
+def current_control() -> Optional[PlayerControl]:
+    """ 当前上下文生效的控制器：会话绑定优先，其次全局 """
+    return _session_control.get() or _global_control
+
 # -------------- 基类：所有 Fluent 命令的骨架 --------------
 class FluentBase:
     """Fluent API 基类：负责生成处理器 + 统一收口 ctrl.request"""
-    _timeout: TimeDeltaLike = 10.0
-    _fut: asyncio.Future[None] | None = None
+    _timeout: TimeDeltaLike | None = None
+    _fut: asyncio.Future[Optional[PendingAck]] | None = None
+    _priority: Priority = Priority.NORMAL
+    _coalesce: bool = False
+    _queue_deadline: TimeDeltaLike | None = None
+    _exec_timeout: TimeDeltaLike | None = None
+    _confirm: TimeDeltaLike | None = None
 
     def timeout(self, sec: TimeDeltaLike) -> Self:
+        """ 总等待时间（排队+执行）；只影响调用方，超时时若还没开始执行则一并作废 """
         self._timeout = sec
         return self
+
+    @json_export
+    def queue_deadline(self, sec: TimeDeltaLike) -> Self:
+        """ 排队最多等多久，过期作废、不再执行 """
+        self._queue_deadline = sec
+        return self
+
+    @json_export
+    def exec_timeout(self, sec: TimeDeltaLike) -> Self:
+        """ 轮到执行后最多执行多久，超时中止 """
+        self._exec_timeout = sec
+        return self
+
+    @json_export
+    def priority(self, level: Priority | int | str) -> Self:
+        """ 排队优先级：urgent / high / normal / low（或 Priority 枚举） """
+        self._priority = Priority[level.upper()] if isinstance(level, str) else Priority(level)
+        return self
+
+    @json_export
+    def coalesce(self, on: bool = True) -> Self:
+        """ 和队列里还没执行的等价操作合并成一次 """
+        self._coalesce = on
+        return self
     
+    @json_export
+    def confirm(self, sec: TimeDeltaLike = 5.0) -> Self:
+        """
+        发出后再等服务器回执（最多 sec 秒）：await 返回 AckResult，
+        服务器回复失败抛 CommandRejectedError，等不到抛 AckTimeout。只有声明了回执规则的指令能用
+        """
+        if self._ack_of() is None:
+            raise ServerCommandError(f"{type(self).__name__} 没有声明回执规则，不能 confirm()")
+        self._confirm = sec
+        return self
+
+    def _ack_of(self) -> tuple[AckSpec, tuple[str, ...]] | None:
+        """ 子类按需覆盖：这条指令的回执规则和用来对号的 key """
+        return None
+
     def __await__(self):
         return self._execute().__await__()
     
@@ -44,16 +105,28 @@ class FluentBase:
         """ 链接下一个操作 """
         return SeqChain(self) >> other
 
-    async def _execute(self) -> None:
+    async def _execute(self) -> AckResult | None:
         """提交到玩家控制队列，唯一正确入口"""
-        if not _global_control:
+        control = current_control()
+        if not control:
             raise RuntimeError("未设置PlayerControl, 请先 fluent_init_control")
         handler = self._build_handler()
-        self._fut = await _global_control.request(handler)
-        await asyncio.wait_for(self._fut, _to_sec(self._timeout))
+        self._fut = await control.request(
+            handler,
+            priority=self._priority,
+            coalesce=self._coalesce,
+            queue_deadline=None if self._queue_deadline is None else _to_sec(self._queue_deadline),
+            exec_timeout=None if self._exec_timeout is None else _to_sec(self._exec_timeout),
+            expect=self._ack_of() if self._confirm is not None else None,     # worker 发送前才登记
+        )
+        timeout = self._timeout
+        if timeout is None and self._queue_deadline is None and self._exec_timeout is None:
+            timeout = 10.0      # 都没配置时的兜底
+        ack = await asyncio.wait_for(self._fut, None if timeout is None else _to_sec(timeout))
+        return None if ack is None else await ack.wait(_to_sec(self._confirm))   # type: ignore[arg-type]
 
     def cancel(self) -> None:
-        """ 取消 """
+        """ 取消；还在排队的会直接从队列作废，已经开始执行的不会被打断 """
         if self._fut and not self._fut.done():
             self._fut.cancel()
 
@@ -68,31 +141,125 @@ class FluentBase:
         raise NotImplementedError
 
 class SeqChain:
-    """顺序链：把多个 Builder 按 >> 串起来，一次性排队执行"""
-    __slots__ = ("_steps",)
+    """
+    顺序链：把多个 Builder 按 >> 串起来。
+    执行前编译成一个 ExecutionPlan，整条链只占一个队列位，在控制锁内连续执行，
+    中间不会插入别的请求。>> 只追加一个节点（不复制步骤表），长链也是线性开销。
+    """
+    __slots__ = ("_prev", "_tail", "_size", "_plan", "_priority", "_coalesce", "_deadline", "_fut")
+
+    def __init__(self, *steps: FluentBase, prev: SeqChain | None = None) -> None:
+        self._prev = prev
+        self._tail: tuple[FluentBase, ...] = steps
+        self._size: int = len(steps) + (prev._size if prev is not None else 0)
+        self._plan: ExecutionPlan | None = None
+        self._priority: Priority | None = None
+        self._coalesce: bool = False
+        self._deadline: TimeDeltaLike | None = None
+        self._fut: asyncio.Future[None] | None = None
+
+    @property
+    def _steps(self) -> list[FluentBase]:
+        """ 按顺序展开全部步骤 """
+        parts: list[tuple[FluentBase, ...]] = []
+        node: SeqChain | None = self
+        while node is not None:
+            parts.append(node._tail)
+            node = node._prev
+        return [step for part in reversed(parts) for step in part]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __rshift__(self, other: FluentBase | SeqChain) -> SeqChain:
+        """ 链接下一个操作；两段链上显式的优先级、合并、期限都带到新链上 """
+        if isinstance(other, SeqChain):
+            chain = SeqChain(*other._steps, prev=self)
+            chain._inherit(self, other)
+        else:
+            chain = SeqChain(other, prev=self)
+            chain._inherit(self)
+        return chain
+
+    def _inherit(self, *parts: SeqChain) -> None:
+        """ 优先级取最紧急的，期限取最短的，任一段要求合并就合并 """
+        levels = [p._priority for p in parts if p._priority is not None]
+        self._priority = min(levels) if levels else None
+        self._coalesce = any(p._coalesce for p in parts)
+        limits = [p._deadline for p in parts if p._deadline is not None]
+        self._deadline = min(limits, key=_to_sec) if limits else None
+
+    def priority(self, level: Priority | int | str) -> Self:
+        """ 整条链的排队优先级；不设置时取各步里最紧急的 """
+        self._priority = Priority[level.upper()] if isinstance(level, str) else Priority(level)
+        self._plan = None
+        return self
+
+    def coalesce(self, on: bool = True) -> Self:
+        """ 和队列里还没执行的相同链（每一步同命令同参数）合并成一次 """
+        self._coalesce = on
+        return self
+
+    def deadline(self, sec: TimeDeltaLike) -> Self:
+        """ 整体期限（排队+执行），到点没开始就作废，执行中则中止剩下的步骤 """
+        self._deadline = sec
+        return self
 
-    def __init__(self, *steps: FluentBase) -> None:
-        self._steps = list(steps)
-    
     def timeout_all(self, sec: TimeDeltaLike) -> TimeoutChain:
         """返回一个可等待包装，整体超时 sec 秒"""
         return TimeoutChain(self, sec)
 
-    def __rshift__(self, other: FluentBase | SeqChain) -> SeqChain:
-        """ 链接下一个操作 """
-        if isinstance(other, SeqChain):
-            return SeqChain(*self._steps, *other._steps)
-        return SeqChain(*self._steps, other)
+    def compile(self) -> ExecutionPlan:
+        """
+        编译成不可变的执行计划（只编译一次，之后再改步骤的参数不会生效）。
+        单步超时取该步的 exec_timeout / timeout，都没有则 10 秒兜底（confirm 的步骤再加上等回执的时间）。
+        confirm 的步骤要等到服务器回执成功，下一步才开始。
+        """
+        if self._plan is None:
+            steps = self._steps
+            plan_steps = []
+            for step in steps:
+                handler = step._build_handler()
+                limit = step._exec_timeout if step._exec_timeout is not None else step._timeout
+                sec = 10.0 if limit is None else _to_sec(limit)
+                expected = step._ack_of() if step._confirm is not None else None
+                if expected is not None:
+                    confirm = _to_sec(step._confirm)    # type: ignore[arg-type]
+                    handler = partial(run_confirmed, handler, *expected, confirm)
+                    if limit is None:
+                        sec += confirm
+                plan_steps.append(PlanStep(type(step).__name__, handler, sec))
+            priority = self._priority
+            if priority is None:
+                priority = min((s._priority for s in steps), default=Priority.NORMAL)
+            self._plan = ExecutionPlan.of(tuple(plan_steps), priority)
+        return self._plan
 
     def __await__(self):
         return self._run().__await__()
 
-    async def _run(self) -> None:
-        for step in self._steps:
-            await step._execute()   # 每条都走 PlayerControl 队列
+    async def _run(self, deadline: TimeDeltaLike | None = None) -> list[tuple[str, float]]:
+        """ 提交整条链，返回各步 (步骤名, 耗时)；合并执行时拿不到明细，返回空表 """
+        control = current_control()
+        if not control:
+            raise RuntimeError("未设置PlayerControl, 请先 fluent_init_control")
+        plan = self.compile()
+        limit = deadline if deadline is not None else self._deadline
+        sec = None if limit is None else _to_sec(limit)
+        deadline_at = None if sec is None else asyncio.get_running_loop().time() + sec
+        timings: list[tuple[str, float]] = []
+        if self._coalesce:
+            handler = partial(run_plan, plan)       # 不带明细和截止时刻，才能和别的链比较
+        else:
+            handler = partial(run_plan, plan, timings=timings)
+        self._fut = await control.request(
+            handler, priority=plan.priority, coalesce=self._coalesce, queue_deadline=sec, run_deadline=deadline_at,
+        )
+        await asyncio.wait_for(self._fut, sec if sec is not None else sum(s.timeout or 0.0 for s in plan.steps))
+        return timings
 
     def futures(self) -> list[asyncio.Future[None]]:
-        return [s._fut for s in self._steps if s._fut]
+        return [self._fut] if self._fut else []
     
 class TimeoutChain:
     __slots__ = ("_chain", "_sec")
@@ -102,7 +269,7 @@ class TimeoutChain:
         self._sec = sec
 
     def __await__(self):
-        return asyncio.wait_for(self._chain._run(), _to_sec(self._sec)).__await__()
+        return self._chain._run(self._sec).__await__()
 
 class ServerCommand:
     """ 服务器命令 """
@@ -145,7 +312,7 @@ class FluentBlock(FluentBase):
         self._sec = sec
 
     def _build_handler(self) -> Callable[..., Awaitable[None]]:
-        return lambda **kw: asyncio.sleep(_to_sec(self._sec))
+        return partial(wait_action, _to_sec(self._sec))
 
 def jump(times: int = 3) -> JumpFluent:
     """ 跳跃 """
@@ -3,6 +3,7 @@ from functools import partial
 from typing import Optional, Self, Callable, Awaitable
 from .base import ServerCommand, FluentBase, _to_sec
 from ..type_chat import type_in_chat
+from ..ack import SYSTEM_MESSAGE, AckSpec
 from ...schemas.typing import TimeDeltaLike
 from ...utils.logger import logger
 from ...constants import CMD_CHANNEL_TABLE
@@ -19,6 +20,7 @@ class ChatCommandFluent(ServerCommand, FluentBase):
         self._player: Optional[str] = None          # None = 公屏
         self._interval: TimeDeltaLike = 0.0
         self._channel: str = "global"
+        self._switch: Optional[str] = None          # 发送前要切到的频道
 
     @json_export
     def ensure_channel(self, name: str = "global") -> Self:
@@ -32,8 +34,7 @@ class ChatCommandFluent(ServerCommand, FluentBase):
         if self._player is not None:
             logger.debug("sendto 模式，忽略频道切换")
             return self
-        prefix = CMD_CHANNEL_TABLE.get(channel, self._channel)
-        self._cmd_line.insert(0, f"/{prefix}")
+        self._switch = CMD_CHANNEL_TABLE.get(channel, self._channel)
         return self
     
     @json_export
@@ -57,11 +58,31 @@ class ChatCommandFluent(ServerCommand, FluentBase):
 
     def _build_handler(self) -> Callable[..., Awaitable[None]]:
         if self._player is None:
+            if self._switch is not None:
+                return partial(type_in_chat, self.content, _to_sec(self._interval), channel=self._switch)
             text = self.content
         else:
             text = self._get_cmd_line()
         return partial(type_in_chat, text, _to_sec(self._interval))
     
+PAY_ACK = AckSpec(
+    "pay",
+    success=(
+        SYSTEM_MESSAGE + r"\$?[\d,]+(?:\.\d+)?\s*has been sent to\s+(?P<player>\w+)",
+        SYSTEM_MESSAGE + r"(?:你|您)?(?:已|成功)(?:向|给|将.*?(?:发送|转)给)\s*(?P<player>\w+)",
+        SYSTEM_MESSAGE + r"(?:你|您)(?:向|给)\s*(?P<player>\w+)\s*(?:支付|转账|转)了",
+    ),
+    failure=(
+        SYSTEM_MESSAGE + r"(?:Error:\s*|错误[:：]\s*)?(?:player\s+|玩家\s*)(?P<player>[A-Za-z0-9_]{3,16})\s*(?:not found|is not online|(?:不存在|未找到|不在线))",
+        SYSTEM_MESSAGE + r"(?:Error:\s*|错误[:：]\s*)?(?:You\s+|(?:你|您)的?)?"
+        r"(?:do not have sufficient funds|insufficient funds|余额不足|没有足够的(?:钱|金钱|资金|金币))",
+        SYSTEM_MESSAGE + r"(?:Error:\s*|错误[:：]\s*)?(?:player not found|找不到(?:该)?玩家|(?:该)?玩家(?:不存在|未找到|不在线))",
+        SYSTEM_MESSAGE + r"(?:Error:\s*|错误[:：]\s*)?(?:You\s+cannot pay yourself|(?:你|您)?不能(?:给|向)自己)",
+    ),
+    key=("player",),
+)
+""" /pay 的回执：只认系统消息。带收款人的按收款人对号（点名别人的“不在线”不会算到这笔头上）；不带名字的失败给最早的那笔 """
+
 class PayCommandFluent(ServerCommand, FluentBase):
     """ /pay <player> <amount> 金币转账流 """
     def __init__(self, amount: int) -> None:
@@ -77,6 +98,9 @@ class PayCommandFluent(ServerCommand, FluentBase):
         self._target = player.strip()
         return self
 
+    def _ack_of(self) -> tuple[AckSpec, tuple[str, ...]]:
+        return PAY_ACK, (self._target or "",)
+
     # -------- 内部：生成真正执行的协程 --------
     def _build_handler(self) -> Callable[..., Awaitable[None]]:
         cmd = f"/pay {self._target} {self._amount}"
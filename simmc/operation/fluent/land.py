@@ -6,8 +6,29 @@ from functools import partial
 from .base import ServerCommand, FluentBase
 from ...security import json_export
 from ..type_chat import type_in_chat
+from ..ack import SYSTEM_MESSAGE, AckSpec
 from ...exceptions import ServerCommandError
 
+LAND_ACCEPT_ACK = AckSpec(
+    "land_accept",
+    success=(SYSTEM_MESSAGE + r"(?!.*邀请)领土>>.*?(?:你|您)(?:已经?|成功)?加入了?(?:领土)?\s*(?P<land>[\w\u4e00-\u9fff·\-]+)",),
+    failure=(SYSTEM_MESSAGE + r"领土>>.*?(?:邀请(?:已过期|不存在|无效)|没有.*?邀请)",),
+    key=("land",),
+)
+LAND_DEPOSIT_ACK = AckSpec(
+    "land_deposit",
+    success=(SYSTEM_MESSAGE + r"领土>>\s+收件箱\s-\s领土\s+(?P<land>[^:]+):\s+玩家\s+\w+\s+存入了",),
+    failure=(SYSTEM_MESSAGE + r"领土>>.*?(?:余额不足|没有足够的(?:钱|金钱|资金))",),
+    key=("land",),
+)
+LAND_BALANCE_ACK = AckSpec(
+    "land_balance",
+    success=(SYSTEM_MESSAGE + r"领土>>.*?领土\s+(?P<land>[^:：]+?)\s*[:：的]\s*(?:银行)?余额[:：为]?\s*\$(?P<balance>[\d,]+(?:\.\d+)?)",),
+    failure=(SYSTEM_MESSAGE + r"领土>>.*?(?:领土不存在|找不到(?:该)?领土)",),
+    key=("land",),
+)
+""" 领地指令的回执，按领地名对号；存钱的成功规则和 patten.json 里的“领地存钱”是同一条消息 """
+
 # 1. 编辑上下文对象，仅负责“构造”命令，不直接动键鼠
 class _EditCtx(FluentBase):
     def __init__(self, land_name: str) -> None:
@@ -138,6 +159,13 @@ class LandFluent(ServerCommand, FluentBase):
         self._value: str = str(value).lower()
         return self
     
+    @property
+    @json_export
+    def balance(self) -> LandFluent:
+        """查询领地余额；配合 .confirm() 拿到服务器回复，回执分组 balance 是余额"""
+        self._sub_command = "balance"
+        return self
+
     @asynccontextmanager
     @json_export
     async def edit(self, land_name: str | None = None) -> AsyncGenerator[_EditCtx, None]:
@@ -167,12 +195,23 @@ class LandFluent(ServerCommand, FluentBase):
         self._operation = "deny"
         return self
 
+    def _ack_of(self) -> Optional[tuple[AckSpec, tuple[str, ...]]]:
+        if self._sub_command == "invite" and self._operation == "accept":
+            return LAND_ACCEPT_ACK, (self._land,)
+        if self._sub_command == "deposit":
+            return LAND_DEPOSIT_ACK, (self._land,)
+        if self._sub_command == "balance":
+            return LAND_BALANCE_ACK, (self._land,)
+        return None
+
     # ---------- 内部：生成协程 ----------
     def _build_handler(self) -> Callable[..., Awaitable[None]]:
         if self._sub_command == "invite":
             cmd = f"/land {self._operation} {self._land}"
         elif self._sub_command == "deposit":
             cmd = f"/land deposit {self._value} {self._land}"
+        elif self._sub_command == "balance":
+            cmd = f"/land balance {self._land}"
         else:
             raise RuntimeError("子命令未设置，无法构建 handler")
         return partial(type_in_chat, cmd, 0.0)
@@ -0,0 +1,88 @@
+""" 编译好的执行计划：整条链只占一个队列位，在控制锁内连续执行 """
+# simmc/operation/fluent/plan.py
+from __future__ import annotations
+import asyncio
+from dataclasses import dataclass
+from typing import Hashable, Optional
+from ..player_control import Handler, Priority, coalesce_key
+from ...utils import clock
+from ...utils.logger import logger
+from ...utils.metrics import REGISTRY, Histogram
+
+_PLAN_SEC = REGISTRY.histogram("simmc_plan_seconds", "执行计划整体耗时（不含排队）")
+_PLAN_STEPS: dict[str, Histogram] = {}
+
+def _step_histogram(name: str) -> Histogram:
+    hist = _PLAN_STEPS.get(name)
+    if hist is None:
+        hist = _PLAN_STEPS[name] = REGISTRY.histogram("simmc_plan_step_seconds", "执行计划单步耗时", {"step": name})
+    return hist
+
+@dataclass(frozen=True, slots=True)
+class PlanStep:
+    """ 计划里的一步 """
+    name: str
+    """ 步骤名（Fluent 类名），用于日志和指标 """
+    handler: Handler
+    timeout: Optional[float] = None
+    """ 单步超时（秒） """
+
+@dataclass(frozen=True, slots=True, eq=False)
+class ExecutionPlan:
+    """
+    不可变的执行计划。由 SeqChain.compile() 生成，生成后可以反复执行。
+    两个计划的步骤（函数 + 参数）完全相同时视为相等，可以在队列里合并。
+    """
+    steps: tuple[PlanStep, ...]
+    priority: Priority = Priority.NORMAL
+    key: Optional[Hashable] = None
+    """ 合并键：各步的 (函数, 参数, 超时)；有步骤无法比较时为 None """
+
+    @classmethod
+    def of(cls, steps: tuple[PlanStep, ...], priority: Priority = Priority.NORMAL) -> ExecutionPlan:
+        parts = []
+        for step in steps:
+            k = coalesce_key(step.handler, {})
+            if k is None:
+                return cls(steps, priority, None)
+            parts.append((k, step.timeout))
+        return cls(steps, priority, tuple(parts))
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ExecutionPlan):
+            return NotImplemented
+        return self is other or (self.key is not None and self.key == other.key)
+
+    def __hash__(self) -> int:
+        return hash(self.key) if self.key is not None else id(self)
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+async def run_plan(
+    plan: ExecutionPlan,
+    deadline_at: Optional[float] = None,
+    timings: Optional[list[tuple[str, float]]] = None,
+) -> None:
+    """
+    PlayerControl 的处理器：在同一次控制权内依次执行各步，中间不会插入别的请求。
+    :param deadline_at: 整体截止时间（事件循环时间），到点中止剩下的步骤
+    :param timings: 传入时按顺序追加 (步骤名, 耗时)
+    """
+    started = clock.now()
+    done = 0
+    try:
+        async with asyncio.timeout_at(deadline_at):
+            for step in plan.steps:
+                t0 = clock.now()
+                async with asyncio.timeout(step.timeout):
+                    await step.handler()
+                cost = clock.now() - t0
+                _step_histogram(step.name).observe(cost)
+                if timings is not None:
+                    timings.append((step.name, cost))
+                done += 1
+    finally:
+        cost = clock.now() - started
+        _PLAN_SEC.observe(cost)
+        logger.debug(f"执行计划结束：{done}/{len(plan)} 步，用时 {cost:.3f}s")
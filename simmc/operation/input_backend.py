@@ -0,0 +1,316 @@
+""" 输入后端：键鼠模拟 / 通过 Py4J agent 直接调用客户端 / 只记录的虚拟后端 """
+# simmc/operation/input_backend.py
+from __future__ import annotations
+import time
+import threading
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import cache
+from typing import Any, Optional, Protocol
+from ..exceptions import InputBackendError
+from ..utils.clock import VirtualClock
+from ..utils.logger import logger
+from ..utils.metrics import REGISTRY
+
+_RPC_SEC = REGISTRY.histogram("simmc_agent_rpc_seconds", "agent 后端单次调用耗时")
+_FALLBACKS = REGISTRY.counter("simmc_agent_fallbacks_total", "agent 调用失败、退回键盘后端的次数")
+
+class InputBackend(Protocol):
+    """
+    输入后端：所有动作（type_in_chat、jump_action、聊天批处理……）只通过它碰键鼠或客户端。
+    按键用 pyautogui 的键名（space / w / shift ...），指令不带开头的 /。
+    方法都是同步的，在输入线程里调用。
+    """
+    needs_focus: bool
+    """ 是否要求 MC 窗口在前台 """
+    realtime: bool
+    """ wait 是否真的等待；虚拟后端为 False，事件循环里的等待也会改成推进虚拟时钟 """
+
+    def key_down(self, key: str) -> None: ...
+
+    def key_up(self, key: str) -> None: ...
+
+    def type_text(self, text: str) -> None: ...
+
+    def run_command(self, command: str) -> None: ...
+
+    def wait(self, sec: float) -> None: ...
+
+@cache
+def _pyautogui() -> Any:
+    """ 第一次真正按键时才导入：没有 DISPLAY 的环境一导入就报错，虚拟 / agent 后端用不到它 """
+    import pyautogui
+    pyautogui.FAILSAFE = True     # 防止 pyautogui 把鼠标飞走
+    pyautogui.PAUSE = 0.0         # 手动控制延迟，不用默认 sleep
+    return pyautogui
+
+class KeyboardBackend:
+    """ 键鼠模拟：pyautogui 按键 + 剪贴板粘贴，需要 MC 窗口在前台 """
+    needs_focus = True
+    realtime = True
+
+    def __init__(self, open_delay: float = 0.2, paste_delay: float = 0.1) -> None:
+        self.open_delay = open_delay
+        """ 回车后等聊天栏弹出 """
+        self.paste_delay = paste_delay
+        """ 粘贴后等输入框刷新 """
+
+    def key_down(self, key: str) -> None:
+        _pyautogui().keyDown(key)
+
+    def key_up(self, key: str) -> None:
+        _pyautogui().keyUp(key)
+
+    def paste(self, text: str) -> None:
+        """ 把 text 放进剪贴板并粘贴到当前输入框 """
+        import pyperclip
+        pyperclip.copy(text)
+        _pyautogui().hotkey("ctrl", "v")
+
+    def type_text(self, text: str) -> None:
+        """
+        打开聊天栏 -> 粘贴 -> 回车。会在调用线程里睡 open_delay + paste_delay，
+        事件循环里发送走 timeline.send_text，把这两段等待放到循环上。
+        """
+        gui = _pyautogui()
+        gui.press("enter")
+        time.sleep(self.open_delay)
+        self.paste(text)
+        time.sleep(self.paste_delay)
+        gui.press("enter")
+
+    def run_command(self, command: str) -> None:
+        """ 执行指令（不带 /） """
+        self.type_text(f"/{command}")
+
+    def wait(self, sec: float) -> None:
+        time.sleep(sec)
+
+# pyautogui 键名 -> GameOptions 里的 KeyBinding 字段（Yarn 名）
+_KEY_BINDINGS: dict[str, str] = {
+    "space": "jumpKey",
+    "w": "forwardKey",
+    "s": "backKey",
+    "a": "leftKey",
+    "d": "rightKey",
+    "shift": "sneakKey",
+    "ctrl": "sprintKey",
+}
+
+class AgentBackend:
+    """
+    通过 simmc/MC/agent.py 的 Py4J 网关直接调用客户端：
+    聊天/指令走 ClientPlayNetworkHandler.sendChatMessage / sendChatCommand，
+    按键直接改 KeyBinding 的按下状态。不需要窗口在前台，也没有打字等待，一次调用就是一次 RPC。
+    名字经 TinyMapper 转成混淆名后缓存；任何一次调用失败都会退回 fallback（默认键盘后端）。
+    """
+    needs_focus = False
+    realtime = True
+    retry_sec = 30.0
+    """ 调用失败后多久内直接走 fallback，不再尝试 agent """
+
+    def __init__(self, fallback: Optional[KeyboardBackend] = None) -> None:
+        self.fallback = fallback if fallback is not None else KeyboardBackend()
+        self._lock = threading.Lock()
+        self._down_until = 0.0
+        self._agent: Any = None
+        self._client: Any = None
+        self._names: dict[str, str] = {}
+        self._keys: dict[str, Any] = {}
+
+    # ---------------- 连接与名字解析 ----------------
+    def _connect(self) -> None:
+        from ..MC import agent          # 导入即连接网关，推迟到第一次使用
+        mapper = agent.mapper
+
+        def method(cls: str, name: str) -> str:
+            info = mapper.deobf_method(cls, name)
+            if info is None:
+                raise InputBackendError(f"映射表里找不到 {cls}.{name}")
+            return info.obf_name
+
+        def field(cls: str, name: str) -> str:
+            info = mapper.deobf_field(cls, name)
+            if info is None:
+                raise InputBackendError(f"映射表里找不到 {cls}.{name}")
+            return info.obf_name
+
+        self._names = {
+            "getNetworkHandler": method("MinecraftClient", "getNetworkHandler"),
+            "options": field("MinecraftClient", "options"),
+            "sendChatMessage": method("ClientPlayNetworkHandler", "sendChatMessage"),
+            "sendChatCommand": method("ClientPlayNetworkHandler", "sendChatCommand"),
+            "setPressed": method("KeyBinding", "setPressed"),
+            **{name: field("GameOptions", name) for name in _KEY_BINDINGS.values()},
+        }
+        self._agent = agent.entry
+        self._client = agent.MinecraftClient
+        logger.info("agent 输入后端已连接")
+
+    def _ensure(self) -> Any:
+        if self._agent is None:
+            self._connect()
+        return self._agent
+
+    def _network_handler(self) -> Any:
+        """
+        每次发送都重新取：断线、换服后旧对象还能调用但消息发不出去，也不会报错，缓存它会悄悄丢消息。
+        未进服时为 None。
+        """
+        net = self._agent.invokeMethodNoArgs(self._client, self._names["getNetworkHandler"])
+        if net is None:
+            raise InputBackendError("客户端还没连上服务器")
+        return net
+
+    def _key_binding(self, key: str) -> Any:
+        binding = self._keys.get(key)
+        if binding is None:
+            name = _KEY_BINDINGS.get(key)
+            if name is None:
+                raise InputBackendError(f"没有与 {key!r} 对应的按键绑定")
+            options = self._agent.readField(self._client, self._names["options"])
+            binding = self._keys[key] = self._agent.readField(options, self._names[name])
+        return binding
+
+    def _call(self, what: str, fn: Any, fallback: Any) -> None:
+        started = time.perf_counter()
+        if started < self._down_until:
+            _FALLBACKS.value += 1
+            fallback()
+            return
+        try:
+            with self._lock:            # Py4J 连接不保证多线程下的调用顺序
+                self._ensure()
+                fn()
+        except Exception as exc:
+            self._keys.clear()
+            self._down_until = time.perf_counter() + self.retry_sec
+            _FALLBACKS.value += 1
+            logger.warning(f"agent {what} 失败，{self.retry_sec:.0f}s 内改用键盘输入：{exc}")
+            fallback()
+        else:
+            _RPC_SEC.observe(time.perf_counter() - started)
+
+    # ---------------- 输入接口 ----------------
+    def key_down(self, key: str) -> None:
+        self._call(
+            f"按下 {key}",
+            lambda: self._agent.invokeMethod(self._key_binding(key), self._names["setPressed"], True),
+            lambda: self.fallback.key_down(key),
+        )
+
+    def key_up(self, key: str) -> None:
+        self._call(
+            f"松开 {key}",
+            lambda: self._agent.invokeMethod(self._key_binding(key), self._names["setPressed"], False),
+            lambda: self.fallback.key_up(key),
+        )
+
+    def type_text(self, text: str) -> None:
+        self._call(
+            "发送聊天",
+            lambda: self._agent.invokeMethod(self._network_handler(), self._names["sendChatMessage"], text),
+            lambda: self.fallback.type_text(text),
+        )
+
+    def run_command(self, command: str) -> None:
+        self._call(
+            "执行指令",
+            lambda: self._agent.invokeMethod(self._network_handler(), self._names["sendChatCommand"], command),
+            lambda: self.fallback.run_command(command),
+        )
+
+    def wait(self, sec: float) -> None:
+        time.sleep(sec)
+
+@dataclass(frozen=True, slots=True)
+class RecordedAction:
+    """ 虚拟后端记下的一次输入 """
+    t: float
+    """ 发生时的虚拟时间（秒） """
+    kind: str
+    """ key_down / key_up / text / command """
+    value: str
+
+class VirtualBackend:
+    """
+    虚拟后端：不碰键鼠也不连客户端，只把输入连同虚拟时间记下来，wait 只推进虚拟时钟不真等。
+    无界面的 CI 上用它测 PlayerControl 吞吐、排队延迟和 SeqChain 各步耗时：
+
+        backend = VirtualBackend(text_cost=0.3)
+        with use_clock(backend.clock):
+            ctrl = PlayerControl(backend=backend)
+            ...
+        backend.actions  # [RecordedAction(t=0.0, kind="text", value="hi"), ...]
+    """
+    needs_focus = False
+    realtime = False
+
+    def __init__(
+        self,
+        clock: Optional[VirtualClock] = None,
+        key_cost: float = 0.0,
+        text_cost: float = 0.0,
+        command_cost: float = 0.0,
+    ) -> None:
+        """
+        :param clock: 共用的虚拟时钟，默认新建一个从 0 开始的
+        :param key_cost: / text_cost / command_cost: 每次按键、聊天、指令要花的虚拟时间，用来模拟真实后端
+        """
+        self.clock = clock if clock is not None else VirtualClock()
+        self.key_cost = key_cost
+        self.text_cost = text_cost
+        self.command_cost = command_cost
+        self.actions: list[RecordedAction] = []
+
+    def _record(self, kind: str, value: str, cost: float) -> None:
+        self.actions.append(RecordedAction(self.clock(), kind, value))
+        if cost:
+            self.clock.advance(cost)
+
+    def key_down(self, key: str) -> None:
+        self._record("key_down", key, self.key_cost)
+
+    def key_up(self, key: str) -> None:
+        self._record("key_up", key, self.key_cost)
+
+    def type_text(self, text: str) -> None:
+        self._record("text", text, self.text_cost)
+
+    def run_command(self, command: str) -> None:
+        self._record("command", command, self.command_cost)
+
+    def wait(self, sec: float) -> None:
+        self.clock.advance(sec)
+
+    def lines(self) -> list[str]:
+        """ 发出的聊天和指令（指令带 /），按顺序 """
+        return [a.value if a.kind == "text" else f"/{a.value}" for a in self.actions if a.kind in ("text", "command")]
+
+_DEFAULT_BACKEND = KeyboardBackend()
+_current_backend: ContextVar[Optional[InputBackend]] = ContextVar("input_backend", default=None)
+
+def current_backend() -> InputBackend:
+    """ 当前上下文的输入后端：PlayerControl 的 worker 里是该控制器的后端，其它地方默认键盘 """
+    return _current_backend.get() or _DEFAULT_BACKEND
+
+def use_backend(backend: InputBackend) -> None:
+    """ 在当前上下文里切换输入后端 """
+    _current_backend.set(backend)
+
+def make_backend(kind: str) -> InputBackend:
+    """ 按配置名构建后端：keyboard / agent / virtual """
+    if kind == "keyboard":
+        return KeyboardBackend()
+    if kind == "agent":
+        return AgentBackend()
+    if kind == "virtual":
+        return VirtualBackend()
+    raise ValueError(f"未知输入后端: {kind}")
+
+def send_line(backend: InputBackend, text: str) -> None:
+    """ 以 / 开头的当指令执行，其余当聊天发送 """
+    if text.startswith("/"):
+        backend.run_command(text[1:])
+    else:
+        backend.type_text(text)
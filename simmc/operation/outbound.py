@@ -0,0 +1,224 @@
+""" 出站限流：所有聊天/指令发出前按类别取令牌，速率随服务器的防刷屏提示自动升降（AIMD） """
+# simmc/operation/outbound.py
+from __future__ import annotations
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Optional
+from .input_backend import InputBackend
+from .timeline import pause, send_text
+from ..constants import CMD_CHANNEL_TABLE
+from ..schemas.event import ChatThrottledEvent
+from ..utils import clock
+from ..utils.conf_injector import Inject
+from ..utils.logger import logger
+from ..utils.metrics import REGISTRY
+
+_WAIT = REGISTRY.histogram(
+    "simmc_outbound_wait_seconds", "发送前在出站限流上等待的时间",
+    buckets=(0.0, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+_THROTTLED = REGISTRY.counter("simmc_outbound_throttled_total", "服务器提示发送过快的次数")
+_BACKOFFS = REGISTRY.counter("simmc_outbound_backoffs_total", "因限流提示而降速的次数")
+
+# 指令名 -> 类别；没列出的指令都算 command，不以 / 开头的算 chat
+_COMMAND_CLASSES: dict[str, str] = {
+    "m": "whisper",
+    "msg": "whisper",
+    "tell": "whisper",
+    "w": "whisper",
+    "r": "whisper",
+    "pay": "pay",
+    "land": "land",
+    "lands": "land",
+}
+
+def command_class(text: str) -> str:
+    """ 一行输入属于哪一类：chat / whisper / pay / land / command """
+    if not text.startswith("/"):
+        return "chat"
+    head = text[1:].split(" ", 1)[0].lower()
+    return _COMMAND_CLASSES.get(head, "command")
+
+@dataclass(slots=True)
+class ClassBudget:
+    """ 一类输入的自适应令牌桶：rate 条/秒，最多攒 burst 条 """
+    rate: float
+    floor: float
+    ceiling: float
+    burst: int
+    tokens: float = 0.0
+    at: float = 0.0
+    hold_until: float = 0.0
+    """ 被限流后的冷却截止时刻，之前不发 """
+    last_sent: float = float("-inf")
+    sent: int = 0
+    backoffs: int = 0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(float(self.burst), self.tokens + (now - self.at) * self.rate)
+        self.at = now
+
+    def delay(self, now: float) -> float:
+        """ 距离下一次可以发送还要等多久（秒） """
+        self._refill(now)
+        need = 0.0 if self.tokens >= 1.0 else (1.0 - self.tokens) / self.rate
+        return max(need, self.hold_until - now)
+
+    def take(self, now: float, increase: float) -> None:
+        """ 记一次发送，并加性提速：满速发送时每秒大约加 increase 条/秒 """
+        self._refill(now)
+        self.tokens -= 1.0
+        self.last_sent = now
+        self.sent += 1
+        self.rate = min(self.ceiling, self.rate + increase / self.rate)
+
+    def back_off(self, now: float, decrease: float, cooldown: float) -> bool:
+        """ 乘性降速并冷却；冷却期内再来的提示算同一轮，不重复降速 """
+        if now < self.hold_until:
+            return False
+        self.rate = max(self.floor, self.rate * decrease)
+        self.tokens = min(self.tokens, 0.0)
+        self.hold_until = now + cooldown
+        self.backoffs += 1
+        return True
+
+@Inject(at={
+    "enabled", "chat_rate", "whisper_rate", "pay_rate", "land_rate", "command_rate",
+    "floor", "ceiling", "burst", "increase", "decrease", "cooldown", "blame_window",
+})
+class OutboundLimiter:
+    """
+    出站限流器：PlayerControl 的 worker 把它绑到上下文里，type_in_chat 和聊天批处理的每一行都先过这里。
+    每类输入从配置的速率起步，没被限流就慢慢加速，服务器一提示“太快”就把最近发过的那一类乘性降速，
+    长期吞吐贴着服务器的上限走。同时作为服务挂到调度器上接收 ChatThrottledEvent。
+    """
+    # 下面配置会自动注入
+    enabled: bool = True
+    chat_rate: float = 1.0
+    """ 公屏聊天的起步速率（条/秒），下面几类同理 """
+    whisper_rate: float = 1.0
+    pay_rate: float = 2.0
+    land_rate: float = 2.0
+    command_rate: float = 2.0
+    floor: float = 0.2
+    """ 降速下限（条/秒） """
+    ceiling: float = 10.0
+    """ 提速上限（条/秒） """
+    burst: int = 3
+    """ 允许连发的条数 """
+    increase: float = 0.1
+    """ 加性提速：满速发送且没被限流时，每秒加多少条/秒 """
+    decrease: float = 0.7
+    """ 乘性降速：被限流时速率乘以它 """
+    cooldown: float = 2.0
+    """ 被限流后至少停多久（秒）；提示里带了等待秒数时取较大者 """
+    blame_window: float = 3.0
+    """ 限流提示只归到这段时间内最后发送的那一类，更早的提示视为与本账号无关 """
+
+    def __init__(self) -> None:
+        self._budgets: dict[str, ClassBudget] = {}
+        self._last: Optional[str] = None
+        self._restored: dict[str, float] = {}
+
+    def budget(self, cls: str) -> ClassBudget:
+        """ 取某一类的令牌桶，第一次使用时按配置创建（配置在 __init__ 之后才注入） """
+        b = self._budgets.get(cls)
+        if b is None:
+            start = self._restored.get(cls, getattr(self, f"{cls}_rate", self.command_rate))
+            floor = max(self.floor, 1e-3)
+            b = self._budgets[cls] = ClassBudget(
+                min(max(start, floor), self.ceiling), floor, self.ceiling, max(self.burst, 1),
+                tokens=float(max(self.burst, 1)), at=clock.now(),
+            )
+            REGISTRY.gauge("simmc_outbound_rate", "出站限流当前速率（条/秒）", {"class": cls}, fn=lambda: b.rate)
+        return b
+
+    async def acquire(self, cls: str, backend: Optional[InputBackend] = None) -> None:
+        """ 等到这一类可以发送，并记下这次发送 """
+        if not self.enabled:
+            return
+        b = self.budget(cls)
+        started = clock.now()
+        while (delay := b.delay(clock.now())) > 1e-6:     # 等待期间可能又被限流，醒来再看一次；浮点误差不算
+            await pause(delay, backend)
+        now = clock.now()
+        _WAIT.observe(now - started)
+        b.take(now, self.increase)
+        self._last = cls
+
+    def throttled(self, wait: Optional[float] = None) -> Optional[str]:
+        """ 收到一次限流提示：降速最近发送的那一类，返回被降速的类别 """
+        _THROTTLED.value += 1
+        now = clock.now()
+        cls = self._last
+        b = self._budgets.get(cls) if cls is not None else None
+        if b is None or now - b.last_sent > self.blame_window:
+            logger.debug("收到限流提示，但最近没有发送，忽略")
+            return None
+        before = b.rate
+        if not b.back_off(now, self.decrease, max(self.cooldown, wait or 0.0)):
+            return None
+        _BACKOFFS.value += 1
+        logger.warning(f"服务器提示发送过快：{cls} 速率 {before:.2f} -> {b.rate:.2f} 条/秒，冷却 {b.hold_until - now:.1f}s")
+        return cls
+
+    def current_rates(self) -> dict[str, float]:
+        """ 各类当前速率 """
+        return {cls: round(b.rate, 3) for cls, b in self._budgets.items()}
+
+    # --------- 统一的 IService 接口 ---------
+    async def handle(self, ev: ChatThrottledEvent) -> None:
+        self.throttled(ev.wait)
+
+    # --------- 热重启快照：学到的速率留着，重启后不用重新试探 ---------
+    def snapshot(self) -> dict[str, Any]:
+        return {"rates": {cls: b.rate for cls, b in self._budgets.items()}}
+
+    def restore(self, state: dict[str, Any]) -> None:
+        self._restored = dict(state.get("rates", {}))
+        self._budgets.clear()
+
+_current_limiter: ContextVar[Optional[OutboundLimiter]] = ContextVar("outbound_limiter", default=None)
+
+@dataclass(slots=True)
+class ChannelState:
+    """
+    服务器这边当前所在的聊天频道，由发送层记录：不管是批处理、单独执行的 type_in_chat 还是手写的指令，
+    发出去的每一行切频道指令都会更新它。不带参数的陌生指令可能是频道别名（如 /g），记为未知。
+    """
+    current: Optional[str] = None
+
+    def observe(self, text: str) -> None:
+        if not text.startswith("/"):
+            return
+        command = text[1:].strip()
+        if command in _CHANNEL_COMMANDS:
+            self.current = command
+        elif " " not in command:
+            self.current = None
+
+_CHANNEL_COMMANDS = frozenset(CMD_CHANNEL_TABLE.values())
+_current_channel: ContextVar[Optional[ChannelState]] = ContextVar("chat_channel", default=None)
+
+def use_limiter(limiter: Optional[OutboundLimiter]) -> None:
+    """ 在当前上下文里绑定出站限流器；None 表示不限 """
+    _current_limiter.set(limiter)
+
+def use_channel(state: Optional[ChannelState]) -> None:
+    """ 在当前上下文里绑定频道记录；None 表示不记录 """
+    _current_channel.set(state)
+
+def current_channel() -> Optional[str]:
+    """ 当前上下文记录的频道，未知为 None """
+    state = _current_channel.get()
+    return None if state is None else state.current
+
+async def send_limited(backend: InputBackend, text: str) -> None:
+    """ 过一遍当前上下文的出站限流，再发出一行 """
+    limiter = _current_limiter.get()
+    if limiter is not None:
+        await limiter.acquire(command_class(text), backend)
+    await send_text(backend, text)
+    state = _current_channel.get()
+    if state is not None:
+        state.observe(text)
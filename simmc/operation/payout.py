@@ -0,0 +1,249 @@
+""" 批量转账：先写本地日志再发 /pay，逐笔等服务器回执，崩溃重启后从日志接着付 """
+# simmc/operation/payout.py
+from __future__ import annotations
+import os
+import csv
+import json
+import asyncio
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Literal, Optional
+from .ack import AckTimeout
+from .fluent.command import pay
+from .player_control import QueueDeadlineExceeded
+from ..exceptions import CommandRejectedError
+from ..utils import clock
+from ..utils.functools import sync_to_async
+from ..utils.logger import logger
+from ..utils.metrics import REGISTRY
+
+_RESULTS = {
+    result: REGISTRY.counter("simmc_payout_total", "批量转账每笔的结果", {"result": result})
+    for result in ("ok", "failed", "unknown")
+}
+
+type PayoutState = Literal["pending", "sent", "ok", "failed", "unknown"]
+
+@dataclass(frozen=True, slots=True)
+class PayoutItem:
+    """ 一笔转账 """
+    player: str
+    amount: int
+
+def load_csv(path: Path | str) -> list[PayoutItem]:
+    """
+    读 CSV：每行 玩家,金额；第一行不是数字金额时当表头跳过，空行和 # 开头的行忽略。
+    金额必须是正整数（/pay 只收整数）。
+    """
+    items: list[PayoutItem] = []
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        for n, row in enumerate(csv.reader(f), 1):
+            if not row or not row[0].strip() or row[0].lstrip().startswith("#"):
+                continue
+            if len(row) < 2:
+                raise ValueError(f"{path} 第 {n} 行缺少金额：{row}")
+            player, raw = row[0].strip(), row[1].strip().replace(",", "")
+            if not raw.isdigit():
+                if not items and n == 1:
+                    continue                # 表头
+                raise ValueError(f"{path} 第 {n} 行金额不是正整数：{row[1]!r}")
+            items.append(PayoutItem(player, int(raw)))
+    return items
+
+@dataclass(slots=True)
+class PayoutReport:
+    """ 一次批量转账的结果 """
+    total: int
+    paid: int = 0
+    """ 服务器确认成功的笔数（含之前几次运行里已确认的） """
+    failed: int = 0
+    unknown: int = 0
+    """ 已发出但不确定结果的笔数：等不到回执，或上次运行发出后就崩溃了；不会自动重发 """
+    requeued: int = 0
+    """ 排队超过期限、没有发出的笔数：留在 pending，下次运行会重发 """
+    resumed: int = 0
+    """ 本次启动时日志里已有结果、直接跳过的笔数 """
+    amount_paid: int = 0
+    elapsed_sec: float = 0.0
+    per_sec: float = 0.0
+    """ 本次运行实际发出的笔数 / 用时 """
+    failures: list[tuple[str, int, str]] = field(default_factory=list)
+    """ (玩家, 金额, 原因)，包括 unknown """
+
+class PayoutJournal:
+    """
+    追加式日志（JSON Lines）。第一行是整张付款单，之后每行记一笔的状态变化：
+        {"op": "plan", "items": [["Bob", 100], ...]}
+        {"op": "sent", "i": 0}                 发送前先落盘
+        {"op": "pending", "i": 0}              排队超过期限没发出，退回待付
+        {"op": "ok", "i": 0, "line": "..."}    服务器确认
+        {"op": "failed", "i": 0, "reason": "..."}
+        {"op": "unknown", "i": 0, "reason": "..."}
+    每行写完都 fsync；半行（写到一半崩溃）读取时丢弃。只有一个写线程，行不会交错。
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    def load(self) -> tuple[list[PayoutItem], list[PayoutState], dict[int, str]]:
+        """ 回放日志，返回付款单、每笔的最新状态和失败原因 """
+        items: list[PayoutItem] = []
+        states: list[PayoutState] = []
+        reasons: dict[int, str] = {}
+        with open(self.path, "r", encoding="utf-8") as f:
+            for raw in f:
+                try:
+                    rec = json.loads(raw)
+                except json.JSONDecodeError:
+                    logger.warning(f"转账日志 {self.path} 有损坏的行，已跳过")
+                    continue
+                if rec["op"] == "plan":
+                    items = [PayoutItem(p, int(a)) for p, a in rec["items"]]
+                    states = ["pending"] * len(items)
+                else:
+                    states[rec["i"]] = rec["op"]
+                    if "reason" in rec:
+                        reasons[rec["i"]] = rec["reason"]
+        if not items:
+            raise ValueError(f"{self.path} 里没有付款单")
+        return items, states, reasons
+
+    def create(self, items: list[PayoutItem]) -> None:
+        """ 原子地写出只含付款单的新日志 """
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"op": "plan", "items": [[it.player, it.amount] for it in items]}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    @sync_to_async(executor="journal")
+    def append(self, op: PayoutState, i: int, **extra: Any) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"op": op, "i": i, **extra}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+class BulkPayout:
+    """
+    批量转账。付款单第一次运行时写进日志，之后只认日志：
+        report = await BulkPayout("salary.journal", load_csv("salary.csv")).run()
+        report = await BulkPayout("salary.journal").run()      # 重启后接着付
+
+    每笔先记 sent 再排队，用 pay().confirm() 等服务器回执；同时最多 window 笔在途，
+    实际发送速度由聊天批处理和出站限流决定（pay 类速率会自适应到服务器上限附近）。
+    日志里是 sent 却没有结果的笔数说明上次发出后就崩溃了，记为 unknown，不会重发，避免重复付款。
+    排队超过 send_timeout 的笔请求已作废、肯定没发出，退回 pending，下次运行重发。
+    """
+
+    def __init__(
+        self,
+        journal: Path | str,
+        items: Optional[Iterable[PayoutItem | tuple[str, int]]] = None,
+        window: int = 8,
+        ack_timeout: float = 5.0,
+        send_timeout: float = 30.0,
+    ) -> None:
+        self.journal = PayoutJournal(Path(journal))
+        self.window = max(window, 1)
+        self.ack_timeout = ack_timeout
+        self.send_timeout = send_timeout
+        """ 排队最多等多久（queue_deadline）；不设执行超时，否则 pay 进不了聊天批处理 """
+        self.reasons: dict[int, str] = {}
+        """ 失败 / 不明的原因 """
+        plan = None if items is None else [it if isinstance(it, PayoutItem) else PayoutItem(*it) for it in items]
+        if self.journal.path.exists():
+            self.items, self.states, self.reasons = self.journal.load()
+            if plan is not None and plan != self.items:
+                raise ValueError(f"{self.journal.path} 已有另一张付款单；继续旧的请不传 items，重新开始请换个日志文件")
+        elif plan is None:
+            raise FileNotFoundError(f"没有转账日志 {self.journal.path}，第一次运行需要传入付款单")
+        else:
+            for it in plan:
+                if not it.player or it.amount <= 0:
+                    raise ValueError(f"无效的转账：{it}")
+            self.journal.create(plan)
+            self.items, self.states = plan, ["pending"] * len(plan)
+
+    async def run(self) -> PayoutReport:
+        report = PayoutReport(len(self.items))
+        todo: list[int] = []
+        for i, state in enumerate(self.states):
+            if state == "sent":                 # 上次发出后崩溃，结果不明
+                await self._settle(i, "unknown", reason="上次运行发出后中断")
+            if self.states[i] == "pending":
+                todo.append(i)
+            else:
+                report.resumed += 1
+        if report.resumed:
+            logger.info(f"转账日志 {self.journal.path}：{report.resumed} 笔已有结果，继续剩下的 {len(todo)} 笔")
+
+        started = clock.now()
+        slots = asyncio.Semaphore(self.window)
+
+        async def one(i: int) -> None:
+            async with slots:
+                await self._pay(i)
+
+        await asyncio.gather(*(one(i) for i in todo))
+        report.elapsed_sec = clock.now() - started
+        report.per_sec = len(todo) / report.elapsed_sec if report.elapsed_sec > 0 else 0.0
+
+        for i, (it, state) in enumerate(zip(self.items, self.states)):
+            if state == "ok":
+                report.paid += 1
+                report.amount_paid += it.amount
+                continue
+            if state == "pending":
+                report.requeued += 1
+                continue
+            if state == "failed":
+                report.failed += 1
+            elif state == "unknown":
+                report.unknown += 1
+            else:
+                continue
+            report.failures.append((it.player, it.amount, self.reasons.get(i, "")))
+        logger.info(
+            f"批量转账结束：成功 {report.paid}/{report.total}，失败 {report.failed}，不明 {report.unknown}，待重发 {report.requeued}，"
+            f"本次 {len(todo)} 笔用时 {report.elapsed_sec:.1f}s（{report.per_sec:.2f} 笔/秒）"
+        )
+        return report
+
+    async def _pay(self, i: int) -> None:
+        it = self.items[i]
+        await self.journal.append("sent", i)
+        self.states[i] = "sent"
+        try:
+            result = await pay(it.amount).transfer_to(it.player).queue_deadline(self.send_timeout).confirm(self.ack_timeout)
+        except CommandRejectedError as exc:
+            await self._settle(i, "failed", reason=str(exc))
+        except QueueDeadlineExceeded:
+            # 排队期限内没轮到，请求已作废、没有发出：退回 pending，不能记成 unknown
+            await self.journal.append("pending", i)
+            self.states[i] = "pending"
+            logger.warning(f"转账 {it} 排队超过 {self.send_timeout}s 没有发出，留待下次重发")
+        except (AckTimeout, asyncio.TimeoutError) as exc:
+            await self._settle(i, "unknown", reason=str(exc) or "发送超时")
+        except Exception as exc:
+            logger.exception(f"转账 {it} 出错：{exc}")
+            await self._settle(i, "unknown", reason=repr(exc))
+        else:
+            await self._settle(i, "ok", line=result.line)
+
+    async def _settle(self, i: int, state: PayoutState, **extra: Any) -> None:
+        self.states[i] = state
+        _RESULTS[state].value += 1
+        if "reason" in extra:
+            self.reasons[i] = extra["reason"]
+        await self.journal.append(state, i, **extra)
+
+async def bulk_pay(
+    journal: Path | str,
+    items: Iterable[PayoutItem | tuple[str, int]] | Path | str | None = None,
+    **kw: Any,
+) -> PayoutReport:
+    """ BulkPayout(journal, items, **kw).run() 的简写；items 可以是 CSV 路径 """
+    if isinstance(items, (str, Path)):
+        items = load_csv(items)
+    return await BulkPayout(journal, items, **kw).run()
@@ -1,40 +1,211 @@
 import asyncio
-from dataclasses import dataclass
-from typing import Callable, Awaitable, Optional
+import itertools
+from enum import IntEnum
+from functools import partial
+from dataclasses import dataclass, field
+from typing import Any, Callable, Awaitable, Hashable, Optional, Protocol, Sequence
+from .input_backend import InputBackend, KeyboardBackend, use_backend
+from .outbound import ChannelState, OutboundLimiter, use_channel, use_limiter
+from .ack import AckSpec, AckTracker, PendingAck, use_tracker
+from ..utils import clock
 from ..utils.logger import logger
+from ..utils.metrics import REGISTRY, Histogram
 
 # 回调签名：async fn(**kw) -> None
 Handler = Callable[..., Awaitable[None]]
 
+class Priority(IntEnum):
+    """ 请求优先级，数值越小越先执行；同优先级内先来先服务 """
+    URGENT = 0
+    HIGH = 1
+    NORMAL = 2
+    LOW = 3
+
+_QUEUE_DEPTH = REGISTRY.gauge("simmc_control_queue_depth", "玩家控制队列中等待的请求数")
+_QUEUE_WAIT: dict[Priority, Histogram] = {
+    p: REGISTRY.histogram("simmc_control_queue_wait_seconds", "请求在队列中的等待时间", {"priority": p.name.lower()})
+    for p in Priority
+}
+_ACTION_SEC = REGISTRY.histogram("simmc_control_action_seconds", "玩家操作执行耗时")
+_ACTION_FAILED = REGISTRY.counter("simmc_control_action_failures_total", "玩家操作执行失败数")
+_COALESCED = REGISTRY.counter("simmc_control_coalesced_total", "被合并到已排队请求上的请求数")
+_DROPPED = REGISTRY.counter("simmc_control_dropped_total", "执行前就被取消、直接丢弃的请求数")
+_EXPIRED = REGISTRY.counter("simmc_control_expired_total", "超过排队期限、未执行就作废的请求数")
+_EXEC_TIMEOUT = REGISTRY.counter("simmc_control_exec_timeouts_total", "执行超时被中止的请求数")
+
+class Batcher(Protocol):
+    """ 批处理器：把若干个就绪请求合并成一次执行（见 chat_batch.ChatBatcher） """
+    max_batch: int
+
+    def accepts(self, handler: Handler) -> bool: ...
+
+    async def run(self, handlers: Sequence[Handler]) -> list[Optional[BaseException]]: ...
+
+class QueueDeadlineExceeded(asyncio.TimeoutError):
+    """ 请求在排队期限内没轮到执行，已作废（不会再执行） """
+
 @dataclass(slots=True)
 class PlayerOperationRequest:
     handler: Handler
     kw: dict
-    future: asyncio.Future[None]
+    future: asyncio.Future[Optional[PendingAck]]
+    enqueued_at: float = field(default_factory=clock.now)
+    priority: Priority = Priority.NORMAL
+    coalesce_key: Optional[Hashable] = None
+    followers: list[asyncio.Future[Optional[PendingAck]]] = field(default_factory=list)
+    """ 合并进来的等价请求，执行结果同步给它们 """
+    deadline: Optional[float] = None
+    """ 排队期限（clock.now() 时间轴上的绝对时间），过了还没开始执行就作废 """
+    exec_timeout: Optional[float] = None
+    """ 执行超时（秒） """
+    run_deadline: Optional[float] = None
+    """ 执行截止（事件循环时间），到点中止；不参与合并键，合并时取各方里最晚的 """
+    expect: Optional[tuple[AckSpec, tuple[Any, ...]]] = None
+    """ 要等的服务器回执 (规则, key)，worker 在发送前一刻登记 """
+    ack: Optional[PendingAck] = None
+    """ 已登记的回执，执行成功后作为 future 的结果交给调用方 """
+    taken: bool = False
+    """ 已被 worker 取走或已作废；堆里残留的旧项取到时跳过 """
+    expiry: Optional[asyncio.TimerHandle] = None
+
+    def waiters(self) -> tuple[asyncio.Future[Optional[PendingAck]], ...]:
+        return (self.future, *self.followers)
+
+    def resolve(self, exc: Optional[BaseException] = None) -> None:
+        if self.ack is not None and (exc is not None or self.future.done()):
+            self.ack.cancel()                   # 没发出去，或者调用方已经不等了
+        for fut in self.waiters():
+            if fut.done():
+                continue
+            if exc is None:
+                fut.set_result(self.ack)
+            else:
+                fut.set_exception(exc)
+
+def coalesce_key(handler: Handler, kw: dict) -> Optional[Hashable]:
+    """
+    等价请求的合并键：同一个函数、同样的参数。
+    handler 多为 functools.partial（每次新建，不能直接比较），展开成 (函数, 位置参数, 关键字参数)。
+    参数不可哈希时返回 None（不合并）。
+    """
+    def _unwrap(fn: Callable) -> Hashable:
+        if isinstance(fn, partial):
+            return (_unwrap(fn.func), fn.args, tuple(sorted(fn.keywords.items())))
+        return fn
+    try:
+        key = (_unwrap(handler), tuple(sorted(kw.items())))
+        hash(key)
+    except TypeError:
+        return None
+    return key
 
 class PlayerControl:
-    """玩家身体独占控制器：天然协程安全、自带排队"""
+    """玩家身体独占控制器：天然协程安全、自带排队（按优先级，可合并等价请求）"""
 
-    def __init__(self) -> None:
-        self._queue: asyncio.Queue[PlayerOperationRequest] = asyncio.Queue()
+    def __init__(
+        self,
+        batcher: Optional[Batcher] = None,
+        backend: Optional[InputBackend] = None,
+        limiter: Optional[OutboundLimiter] = None,
+    ) -> None:
+        self.backend: InputBackend = backend if backend is not None else KeyboardBackend()
+        """ 输入后端：键盘模拟（默认）或 agent；worker 执行的所有处理器都用它 """
+        self.limiter = limiter
+        """ 可选的出站限流器；worker 发出的每一行聊天/指令都先过它 """
+        self.acks = AckTracker()
+        """ 等服务器回执的指令表，由日志监听器喂行 """
+        self.channel = ChannelState()
+        """ 当前聊天频道，worker 发出的每一行切频道指令都会更新它，批处理据此少切频道 """
+        self.batcher = batcher
+        """ 可选的批处理器；取到它能处理的请求时，连同后面紧跟着的同类请求一起执行 """
+        self._queue: asyncio.PriorityQueue[tuple[int, int, PlayerOperationRequest]] = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        self._pending: dict[Hashable, PlayerOperationRequest] = {}
+        """ 合并键 -> 仍在排队（未开始执行）的请求 """
+        self._depth = 0
         self._worker_task: Optional[asyncio.Task] = None
         self._lock = asyncio.Lock()
+        self.completed: int = 0
+        """ 已完成（含失败）的请求数 """
+        self.latency_total: float = 0.0
+        """ 已完成请求的 排队+执行 总耗时（秒） """
+        self.coalesced: int = 0
+        """ 被合并、没有单独执行的请求数 """
+        self.dropped: int = 0
+        """ 执行前被取消而丢弃的请求数 """
+        self.expired: int = 0
+        """ 超过排队期限而作废的请求数 """
+        self.wait_by_priority: dict[str, list[float]] = {p.name.lower(): [0, 0.0] for p in Priority}
+        """ 优先级 -> [已出队数, 总排队时间] """
+
+    @property
+    def depth(self) -> int:
+        """ 排队中（未开始执行）的请求数，不含被合并的 """
+        return self._depth
 
     # ------------------ 公共 API ------------------
     async def request(
         self,
         handler: Handler,
+        *,
+        priority: Priority = Priority.NORMAL,
+        coalesce: bool = False,
+        queue_deadline: Optional[float] = None,
+        exec_timeout: Optional[float] = None,
+        run_deadline: Optional[float] = None,
+        expect: Optional[tuple[AckSpec, tuple[Any, ...]]] = None,
         **kw,
-    ) -> asyncio.Future[None]:
+    ) -> asyncio.Future[Optional[PendingAck]]:
         """
         排队申请玩家控制权
         :param handler: 真正需要动键鼠的协程函数
-        :param timeout: 排队+执行最大等待时间
+        :param priority: 优先级，紧急请求插到低优先级积压前面
+        :param coalesce: 与仍在排队的等价请求（同 handler 同参数）合并为一次执行，结果同时通知双方
+        :param queue_deadline: 排队最多等多少秒，超时作废（future 抛 QueueDeadlineExceeded），不会再执行
+        :param exec_timeout: 执行最多多少秒，超时中止（future 抛 TimeoutError）
+        :param run_deadline: 绝对的执行截止时刻（loop.time()），和 exec_timeout 取先到的；不影响合并
+        :param expect: 要等的回执 (AckSpec, key)；worker 轮到它、发送前一刻才登记，future 的结果就是登记的 PendingAck。
+            要回执的请求各自对号，不合并
         :param kw: 传给 handler 的参数
+
+        返回的 future 被取消（包括等待方超时）时，若请求还没开始执行，就直接从队列作废。
         """
-        fut: asyncio.Future[None] = asyncio.Future()
-        req = PlayerOperationRequest(handler, kw, fut)
-        await self._queue.put(req)
+        loop = asyncio.get_running_loop()
+        fut: asyncio.Future[Optional[PendingAck]] = loop.create_future()
+        key = coalesce_key(handler, kw) if coalesce and expect is None else None
+        if key is not None:
+            pending = self._pending.get(key)
+            if pending is not None and not pending.taken:
+                pending.followers.append(fut)
+                self._widen(pending, queue_deadline, exec_timeout, run_deadline)
+                if queue_deadline is not None:
+                    loop.call_later(queue_deadline, self._expire_waiter, pending, fut)
+                fut.add_done_callback(lambda _: self._on_waiter_done(pending))
+                self.coalesced += 1
+                _COALESCED.value += 1
+                if priority < pending.priority:
+                    # 提升优先级：再压一个堆项，旧的那个取到时因 taken 被跳过
+                    pending.priority = priority
+                    self._queue.put_nowait((priority, next(self._seq), pending))
+                return fut
+
+        req = PlayerOperationRequest(
+            handler, kw, fut,
+            priority=priority,
+            coalesce_key=key,
+            deadline=None if queue_deadline is None else clock.now() + queue_deadline,
+            exec_timeout=exec_timeout,
+            run_deadline=run_deadline,
+            expect=expect,
+        )
+        if key is not None:
+            self._pending[key] = req
+        fut.add_done_callback(lambda _: self._on_waiter_done(req))
+        if queue_deadline is not None:
+            req.expiry = loop.call_later(queue_deadline, self._expire, req)
+        await self._queue.put((priority, next(self._seq), req))
+        self._depth += 1
+        _QUEUE_DEPTH.value += 1
         return fut
 
     # ------------------ 生命周期 ------------------
@@ -48,21 +219,207 @@ class PlayerControl:
             self._worker_task.cancel()
             self._worker_task = None
 
+    # ------------------ 作废 ------------------
+    def _discard(self, req: PlayerOperationRequest) -> None:
+        """ 把还在排队的请求标记为作废，堆项留在原地，worker 取到时跳过 """
+        req.taken = True
+        if req.expiry is not None:
+            req.expiry.cancel()
+        if req.coalesce_key is not None and self._pending.get(req.coalesce_key) is req:
+            del self._pending[req.coalesce_key]
+        self._depth -= 1
+        _QUEUE_DEPTH.value -= 1
+
+    def _widen(
+        self,
+        req: PlayerOperationRequest,
+        queue_deadline: Optional[float],
+        exec_timeout: Optional[float],
+        run_deadline: Optional[float],
+    ) -> None:
+        """
+        合并后一次执行要服务所有等待方，期限和超时都放宽到其中最宽的（有一方不限就不限）。
+        请求原来那个更紧的排队期限改成只作废领头的等待方，跟进来的各自另有定时器。
+        """
+        if req.deadline is not None:
+            deadline = None if queue_deadline is None else clock.now() + queue_deadline
+            if deadline is None or deadline > req.deadline:
+                loop = asyncio.get_running_loop()
+                if req.expiry is not None:
+                    req.expiry.cancel()
+                loop.call_later(req.deadline - clock.now(), self._expire_waiter, req, req.future)
+                req.deadline = deadline
+                req.expiry = None if deadline is None else loop.call_later(queue_deadline, self._expire, req)  # type: ignore[arg-type]
+        if req.exec_timeout is not None:
+            req.exec_timeout = None if exec_timeout is None else max(req.exec_timeout, exec_timeout)
+        if req.run_deadline is not None:
+            req.run_deadline = None if run_deadline is None else max(req.run_deadline, run_deadline)
+
+    def _on_waiter_done(self, req: PlayerOperationRequest) -> None:
+        """ 等待方取消或各自过期了：所有等待方都不要了、且还没开始执行，就丢弃 """
+        if req.taken or not all(f.done() for f in req.waiters()):
+            return
+        self._discard(req)
+        self.dropped += 1
+        _DROPPED.value += 1
+        logger.debug(f"玩家控制请求在执行前被取消，已丢弃：{req.handler!r}")
+
+    def _expire(self, req: PlayerOperationRequest) -> None:
+        if req.taken:
+            return
+        self._discard(req)
+        self.expired += 1
+        _EXPIRED.value += 1
+        logger.debug(f"玩家控制请求排队超过期限，已作废：{req.handler!r}")
+        req.resolve(QueueDeadlineExceeded("排队超过期限，请求已作废"))
+
+    def _expire_waiter(self, req: PlayerOperationRequest, fut: asyncio.Future[Optional[PendingAck]]) -> None:
+        """ 合并请求里某一个等待方自己的排队期限到了，只作废它；其它等待方照常 """
+        if req.taken or fut.done():
+            return
+        self.expired += 1
+        _EXPIRED.value += 1
+        fut.set_exception(QueueDeadlineExceeded("排队超过期限，请求已作废"))
+
     # ------------------ 内部 worker ------------------
+    def _batchable(self, req: PlayerOperationRequest) -> bool:
+        return self.batcher is not None and req.exec_timeout is None and req.run_deadline is None and not req.kw and self.batcher.accepts(req.handler)
+
+    def _drain(self, batch: list[PlayerOperationRequest]) -> None:
+        """ 从队头继续取可合并的请求，遇到不能合并的就放回去（保证不越过更靠前的其它操作） """
+        assert self.batcher is not None
+        while len(batch) < self.batcher.max_batch and not self._queue.empty():
+            item = self._queue.get_nowait()
+            self._queue.task_done()
+            req = item[2]
+            if req.taken:
+                continue
+            if not self._batchable(req):
+                self._queue.put_nowait(item)
+                break
+            batch.append(req)
+
+    def _take(self, req: PlayerOperationRequest, started: float) -> None:
+        self._discard(req)
+        waited = started - req.enqueued_at
+        _QUEUE_WAIT[req.priority].observe(waited)
+        stat = self.wait_by_priority[req.priority.name.lower()]
+        stat[0] += 1
+        stat[1] += waited
+
+    def _arm(self, req: PlayerOperationRequest) -> None:
+        """ 登记回执：放在发送前一刻，排队期间服务器对别的同类指令的回复不会被误认成它的 """
+        if req.expect is not None:
+            req.ack = self.acks.expect(*req.expect)
+
+    def _finish(self, req: PlayerOperationRequest, started: float, exc: Optional[BaseException]) -> None:
+        if exc is not None:
+            _ACTION_FAILED.value += 1
+        req.resolve(exc)
+        finished = clock.now()
+        _ACTION_SEC.observe(finished - started)
+        self.completed += 1
+        self.latency_total += finished - req.enqueued_at
+
     async def _worker(self) -> None:
-        logger.info("玩家控制器启动")
+        logger.info(f"玩家控制器启动，输入后端：{type(self.backend).__name__}")
+        use_backend(self.backend)              # worker 任务自己的上下文，处理器及其线程都能取到
+        use_limiter(self.limiter)
+        use_channel(self.channel)
+        use_tracker(self.acks)
         while True:
-            req = await self._queue.get()
-            try:
-                logger.debug(f"执行玩家控制请求：{req.handler!r}")
-                async with self._lock:
-                    await req.handler(**req.kw)          # 关键区
-            except Exception as exc:
-                logger.exception(f"玩家控制请求执行失败：{exc}")
-                if not req.future.done():
-                    req.future.set_exception(exc)
+            _, _, req = await self._queue.get()
+            if req.taken:                        # 提升优先级 / 作废留下的旧堆项
+                self._queue.task_done()
+                continue
+            if self._batchable(req):
+                batch = [req]
+                self._drain(batch)
+                await self._run_batch(batch)
             else:
-                if not req.future.done():
-                    req.future.set_result(None)
-            finally:
-                self._queue.task_done()
\ No newline at end of file
+                await self._run_one(req)
+            self._queue.task_done()
+
+    async def _run_one(self, req: PlayerOperationRequest) -> None:
+        started = clock.now()
+        self._take(req, started)
+        exc: Optional[BaseException] = None
+        limit = asyncio.timeout(req.exec_timeout)
+        try:
+            logger.debug(f"执行玩家控制请求：{req.handler!r}")
+            async with self._lock:
+                async with limit:                                   # 关键区
+                    if req.run_deadline is not None:
+                        when = limit.when()
+                        limit.reschedule(req.run_deadline if when is None else min(when, req.run_deadline))
+                    self._arm(req)
+                    await req.handler(**req.kw)
+        except TimeoutError as e:
+            exc = e
+            if limit.expired():
+                _EXEC_TIMEOUT.value += 1
+                logger.warning(f"玩家控制请求执行超时（{req.exec_timeout}s）或到达截止时刻，已中止：{req.handler!r}")
+            else:                                                   # handler 自己抛的（如等回执超时）
+                logger.warning(f"玩家控制请求执行失败：{e!r}")
+        except Exception as e:
+            logger.exception(f"玩家控制请求执行失败：{e}")
+            exc = e
+        self._finish(req, started, exc)
+
+    async def _run_batch(self, batch: list[PlayerOperationRequest]) -> None:
+        assert self.batcher is not None
+        started = clock.now()
+        for req in batch:
+            self._take(req, started)
+        logger.debug(f"合并执行 {len(batch)} 个玩家控制请求")
+        try:
+            async with self._lock:
+                for req in batch:
+                    self._arm(req)
+                results = await self.batcher.run([req.handler for req in batch])   # 关键区
+        except Exception as e:
+            logger.exception(f"玩家控制批量请求执行失败：{e}")
+            results = [e] * len(batch)
+        for req, exc in zip(batch, results):
+            self._finish(req, started, exc)
+
+# ---------------- 无界面基准：python -m simmc.operation.player_control ----------------
+if __name__ == "__main__":
+    import time
+    from simmc.operation.player_control import PlayerControl as _Control
+    from simmc.operation.chat_batch import ChatBatcher
+    from simmc.operation.input_backend import VirtualBackend
+    from simmc.operation.fluent.base import fluent_bind_control, fluent_wait, jump
+    from simmc.operation.fluent.command import chat, pay
+    from simmc.utils.clock import use_clock
+
+    async def _bench(n: int = 2000) -> None:
+        # 按键盘后端的真实开销模拟：每条聊天/指令 0.3s
+        backend = VirtualBackend(text_cost=0.3, command_cost=0.3)
+        with use_clock(backend.clock):
+            ctrl = _Control(ChatBatcher(), backend)
+            ctrl.start()
+            fluent_bind_control(ctrl)
+            ops = []
+            for i in range(n):
+                match i % 4:
+                    case 0: ops.append(chat(f"hello {i}")._execute())
+                    case 1: ops.append(pay(1).transfer_to(f"p{i}")._execute())
+                    case 2: ops.append(jump(1).interval(0.5)._execute())
+                    case _: ops.append((chat(f"macro {i}") >> fluent_wait(1) >> jump(1).interval(0))._run())
+            wall = time.perf_counter()
+            results = await asyncio.gather(*ops)
+            wall = time.perf_counter() - wall
+            ctrl.stop()
+        steps: dict[str, list[float]] = {}
+        for timings in results:
+            for name, sec in timings or ():
+                steps.setdefault(name, []).append(sec)
+        print(f"{n} 个操作, 输入 {len(backend.actions)} 次, 虚拟耗时 {backend.clock():.1f}s, "
+              f"真实耗时 {wall:.2f}s ({n / wall:,.0f} ops/s 调度开销)")
+        print(f"  平均 排队+执行: {ctrl.latency_total / ctrl.completed:.1f}s, "
+              + ", ".join(f"{p} 平均排队 {t / c:.1f}s" for p, (c, t) in ctrl.wait_by_priority.items() if c))
+        print("  SeqChain 各步: " + ", ".join(f"{k} {sum(v) / len(v):.2f}s" for k, v in steps.items()))
+
+    logger.disable("simmc")
+    asyncio.run(_bench())
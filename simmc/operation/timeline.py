@@ -0,0 +1,163 @@
+""" 输入时间线：把宏描述成带时刻的原子输入，由事件循环按点调度，不占着线程睡觉 """
+# simmc/operation/timeline.py
+from __future__ import annotations
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Callable, Literal, Optional, Self, TypeVar
+from .input_backend import InputBackend, KeyboardBackend, current_backend, send_line
+from ..utils.executors import get_executor
+from ..utils.logger import logger
+from ..utils.metrics import REGISTRY
+
+T = TypeVar("T")
+
+_LAG = REGISTRY.histogram(
+    "simmc_input_timeline_lag_seconds", "时间线事件实际执行相对计划时刻的延迟",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+_INPUT_THREAD = get_executor("input")
+""" 唯一的输入线程：所有真实按键/打字都在这里按提交顺序执行 """
+
+type InputKind = Literal["key_down", "key_up", "text", "command", "paste"]
+
+@dataclass(frozen=True, slots=True)
+class InputEvent:
+    """ 时间线上的一个原子输入 """
+    at: float
+    """ 相对时间线开始的时刻（秒） """
+    kind: InputKind
+    value: str
+
+    def apply(self, backend: InputBackend) -> None:
+        match self.kind:
+            case "key_down":
+                backend.key_down(self.value)
+            case "key_up":
+                backend.key_up(self.value)
+            case "text":
+                backend.type_text(self.value)
+            case "command":
+                backend.run_command(self.value)
+            case "paste":
+                if not isinstance(backend, KeyboardBackend):
+                    raise TypeError(f"{type(backend).__name__} 不支持剪贴板粘贴")
+                backend.paste(self.value)
+
+@dataclass(frozen=True, slots=True)
+class Timeline:
+    """ 不可变的时间线：事件按时刻排好序，duration 是整条时间线的长度（可以长于最后一个事件） """
+    events: tuple[InputEvent, ...] = ()
+    duration: float = 0.0
+
+    @classmethod
+    def press(cls, key: str, hold: float = 0.2, after: float = 0.0) -> Self:
+        """ 按住 hold 秒再松开，之后留 after 秒空档 """
+        return cls((InputEvent(0.0, "key_down", key), InputEvent(hold, "key_up", key)), hold + after)
+
+    def then(self, other: Timeline) -> Timeline:
+        """ 接在本时间线之后 """
+        shifted = tuple(InputEvent(ev.at + self.duration, ev.kind, ev.value) for ev in other.events)
+        return Timeline(self.events + shifted, self.duration + other.duration)
+
+    def repeat(self, times: int) -> Timeline:
+        out = Timeline()
+        for _ in range(times):
+            out = out.then(self)
+        return out
+
+_TAP = 0.02
+""" 时间线里单击一个键时按住的时长：按下和松开不能排在同一时刻，否则先后顺序没有保证 """
+
+def chat_timeline(text: str, open_delay: float = 0.2, paste_delay: float = 0.1) -> Timeline:
+    """ 键盘打字：回车打开聊天栏，等 open_delay 后粘贴，再等 paste_delay 后回车发出 """
+    open_chat = Timeline.press("enter", _TAP, max(open_delay - _TAP, 0.0))
+    paste = Timeline((InputEvent(0.0, "paste", text),), paste_delay)
+    return open_chat.then(paste).then(Timeline.press("enter", _TAP))
+
+def jump_timeline(times: int = 3, interval: float = 1.0, hold: float = 0.2) -> Timeline:
+    """ 跳 times 次：按住空格 hold 秒，每次之后再隔 interval 秒 """
+    return Timeline.press("space", hold, interval).repeat(times)
+
+async def input_call(backend: InputBackend, fn: Callable[..., T], *args: Any) -> T:
+    """ 在输入线程上执行一次瞬时输入；虚拟后端直接在当前线程调用 """
+    if not backend.realtime:
+        return fn(*args)
+    return await asyncio.get_running_loop().run_in_executor(_INPUT_THREAD, fn, *args)
+
+async def send_text(backend: InputBackend, text: str) -> None:
+    """
+    发出一行聊天/指令。键盘后端拆成 chat_timeline 播放，等聊天栏、等粘贴都在事件循环里等，
+    输入线程只执行瞬时的按键和粘贴；其它后端一次调用 send_line。
+    """
+    if isinstance(backend, KeyboardBackend):
+        await play(chat_timeline(text, backend.open_delay, backend.paste_delay), backend)
+    else:
+        await input_call(backend, send_line, backend, text)
+
+async def pause(sec: float, backend: Optional[InputBackend] = None) -> None:
+    """ 等待：真实后端在事件循环里等，虚拟后端只推进虚拟时钟 """
+    backend = backend if backend is not None else current_backend()
+    if backend.realtime:
+        await asyncio.sleep(sec)
+    else:
+        backend.wait(sec)
+
+async def play(timeline: Timeline, backend: Optional[InputBackend] = None) -> None:
+    """
+    播放时间线：每个事件用 loop.call_at 定在各自的时刻，到点才把那一次按键交给输入线程。
+    整个过程不占用线程池；被取消时撤掉还没到点的事件，并松开已经按下的键。
+    """
+    backend = backend if backend is not None else current_backend()
+    if not backend.realtime:
+        t = 0.0
+        for ev in timeline.events:
+            if ev.at > t:
+                backend.wait(ev.at - t)
+                t = ev.at
+            ev.apply(backend)
+        if timeline.duration > t:
+            backend.wait(timeline.duration - t)
+        return
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    held: set[str] = set()
+
+    def fire(ev: InputEvent, fut: asyncio.Future[None]) -> None:
+        _LAG.observe(loop.time() - start - ev.at)
+        if ev.kind == "key_down":
+            held.add(ev.value)
+        elif ev.kind == "key_up":
+            held.discard(ev.value)
+
+        def settle(done: asyncio.Future[None]) -> None:
+            if fut.done():
+                return
+            exc = done.exception()
+            if exc is None:
+                fut.set_result(None)
+            else:
+                fut.set_exception(exc)
+
+        asyncio.wrap_future(_INPUT_THREAD.submit(ev.apply, backend), loop=loop).add_done_callback(settle)
+
+    futs: list[asyncio.Future[None]] = []
+    handles: list[asyncio.TimerHandle] = []
+    for ev in timeline.events:
+        fut = loop.create_future()
+        futs.append(fut)
+        handles.append(loop.call_at(start + ev.at, fire, ev, fut))
+    try:
+        await asyncio.gather(*futs)
+        rest = start + timeline.duration - loop.time()
+        if rest > 0:
+            await asyncio.sleep(rest)
+    except BaseException:
+        for handle in handles:
+            handle.cancel()
+        for key in held:                    # 输入线程按顺序执行，松键一定排在按键之后
+            _INPUT_THREAD.submit(backend.key_up, key)
+        if held:
+            logger.debug(f"时间线中断，松开 {sorted(held)}")
+        raise
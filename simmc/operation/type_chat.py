@@ -1,26 +1,15 @@
+from .input_backend import current_backend
+from .outbound import send_limited
+from .timeline import pause
 
-import time
-import pyautogui
-import pyperclip
-from ..utils.functools import sync_to_async
-# 防止 pyautogui 把鼠标飞走
-pyautogui.FAILSAFE = True
-pyautogui.PAUSE = 0.0         # 手动控制延迟，不用默认 sleep
-
-@sync_to_async
-def type_in_chat(text: str | list[str], interval: float = 1.0) -> None:
-    """ 打字 """
-    if isinstance(text, list):
-        for _text in text:
-            _type_in_chat(_text)
-    else:
-        _type_in_chat(text)
-    time.sleep(interval)
-
-def _type_in_chat(text: str) -> None:
-    pyperclip.copy(text)
-    pyautogui.press("enter")
-    time.sleep(0.2)
-    pyautogui.hotkey("ctrl", "v")
-    time.sleep(0.1)
-    pyautogui.press("enter")
\ No newline at end of file
+async def type_in_chat(text: str | list[str], interval: float = 1.0, channel: str | None = None) -> None:
+    """
+    打字（经当前输入后端：键盘模拟或 agent），每一行先过出站限流再在输入线程里发，之后的 interval 在事件循环里等
+    :param channel: 公屏消息要发到的频道（CHAT_CHANNELS 里的值），先发 /<channel> 切过去
+    """
+    backend = current_backend()
+    if channel is not None:
+        await send_limited(backend, f"/{channel}")
+    for _text in text if isinstance(text, list) else [text]:
+        await send_limited(backend, _text)
+    await pause(interval, backend)
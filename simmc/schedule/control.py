@@ -0,0 +1,252 @@
+""" 本机控制接口 """
+
+# simmc/schedule/control.py
+import os
+import hmac
+import json
+import asyncio
+import secrets
+import inspect
+import contextvars
+import dataclasses
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+from .default import EventLoopScheduler
+from .offload import ProcessOffloadService
+from ..operation.player_control import PlayerControl
+from ..operation.fluent.base import current_control, fire
+from ..schemas.event_registry import get_event
+from ..security import _safe_attr, exported_names
+from ..services.triggers import build_fluent
+from ..utils.conf_injector import Inject
+from ..utils.executors import executor_stats
+from ..utils.metrics import REGISTRY
+from ..utils.logger import logger
+
+type Reply = Callable[[dict[str, Any]], None]
+
+def _to_json(value: Any) -> Any:
+    """ json.dumps 兜底：dataclass -> dict，集合 -> list，其余转字符串 """
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    return str(value)
+
+@Inject(at={"enabled", "path", "host", "port", "token_path"})
+class ControlServer:
+    """
+    本机控制面：行分隔 JSON，一行一个请求，一行一个响应，按 id 对应。
+    同一连接上的请求可以连续发送（流水线），不必等上一条响应。
+
+    请求示例：
+        {"id": 1, "op": "ping"}
+        {"id": 2, "op": "state"}
+        {"id": 3, "op": "call", "service": "ChannelEnsureService", "method": "get_channel", "args": []}
+        {"id": 4, "op": "emit", "event": "悄悄话", "args": {"sender": "Alice", "text": "V我100"}}
+        {"id": 5, "op": "fluent", "cmd": "pay", "args": {"amount": 100}, "chain": [["transfer_to", "Alice"]]}
+        {"id": 6, "op": "metrics"}
+    响应：
+        {"id": 1, "ok": true, "result": ...} / {"id": 1, "ok": false, "error": "..."}
+
+    TCP 方式（Windows）谁都能连本机端口，连上后第一行必须是
+        {"id": 0, "op": "auth", "token": "<token_path 文件里的内容>"}
+    令牌不对就断开。任何一行不是 JSON 对象也立即断开：浏览器页面能向本机端口发 POST，
+    但发不出一个开头就是合法 JSON 的连接。
+
+    call / fluent 都走 json_export 出口白名单，和 JsonTriggerService 的安检一致。
+    fluent 默认等执行完才响应，带 "wait": false 则入队即响应。
+    """
+    # 下面配置会自动注入
+    enabled: bool = False
+    path: Path = Path("simmc.sock")
+    """ Unix 域套接字路径 """
+    host: str = "127.0.0.1"
+    """ 不支持 Unix 套接字的平台（Windows）退回本机 TCP """
+    port: int = 25336
+    token_path: Path = Path("simmc.token")
+    """ TCP 方式的共享令牌，第一次启动时生成，只有当前用户可读 """
+
+    def __init__(self, scheduler: EventLoopScheduler, control: Optional[PlayerControl] = None) -> None:
+        self._scheduler = scheduler
+        self._control = control
+        self._server: asyncio.Server | None = None
+        self._context: contextvars.Context | None = None
+        self._token: Optional[bytes] = None
+        """ TCP 方式要求的令牌；Unix 套接字靠文件权限，为 None """
+        self._ops: dict[str, Callable[[dict[str, Any]], Awaitable[Any]]] = {
+            "ping": self._op_ping,
+            "state": self._op_state,
+            "call": self._op_call,
+            "emit": self._op_emit,
+            "fluent": self._op_fluent,
+            "metrics": self._op_metrics,
+        }
+
+    # ---------------- 生命周期 ----------------
+    async def start(self) -> None:
+        """ 启动控制面，作为调度器启动前置使用 """
+        if not self.enabled or self._server is not None:
+            return
+        # 记住启动时的上下文（多账号会话时即会话上下文），流操作在里面提交
+        self._context = contextvars.copy_context()
+        self._control = self._control or current_control()
+        if hasattr(asyncio, "start_unix_server") and os.name != "nt":
+            self.path.unlink(missing_ok=True)
+            self._server = await asyncio.start_unix_server(self._serve, path=str(self.path))
+            os.chmod(self.path, 0o600)
+            logger.success(f"控制接口已启动: unix:{self.path}")
+        else:
+            self._token = self._load_token().encode("utf-8")
+            self._server = await asyncio.start_server(self._serve, self.host, self.port)
+            logger.success(f"控制接口已启动: tcp://{self.host}:{self.port}")
+
+    def _load_token(self) -> str:
+        """ 读令牌文件，没有就生成一个（0600） """
+        try:
+            token = self.token_path.read_text(encoding="utf-8").strip()
+        except FileNotFoundError:
+            token = ""
+        if not token:
+            token = secrets.token_urlsafe(32)
+            fd = os.open(self.token_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(token)
+            logger.info(f"已生成控制接口令牌: {self.token_path}")
+        os.chmod(self.token_path, 0o600)
+        return token
+
+    def stop(self) -> None:
+        """ 关闭控制面，作为退出回调使用 """
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+            if os.name != "nt":
+                self.path.unlink(missing_ok=True)
+
+    # ---------------- 连接处理 ----------------
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        pending: set[asyncio.Task] = set()
+
+        def reply(resp: dict[str, Any]) -> None:
+            if not writer.is_closing():
+                writer.write(json.dumps(resp, ensure_ascii=False, default=_to_json).encode("utf-8") + b"\n")
+
+        authed = self._token is None
+        try:
+            while raw := await reader.readline():
+                line = raw.strip()
+                if not line:
+                    continue
+                try:
+                    req = json.loads(line)
+                    if not isinstance(req, dict):
+                        raise ValueError("请求必须是 JSON 对象")
+                except ValueError as exc:           # 不是本协议的客户端（例如 HTTP），不再读后面的内容
+                    reply({"id": None, "ok": False, "error": f"{type(exc).__name__}: {exc}"})
+                    logger.warning(f"控制接口收到无法解析的请求，已断开连接: {line[:64]!r}")
+                    break
+                if not authed:
+                    token = str(req.get("token", "")).encode("utf-8")
+                    if req.get("op") != "auth" or not hmac.compare_digest(token, self._token):  # type: ignore[arg-type]
+                        reply({"id": req.get("id"), "ok": False, "error": "PermissionError: 需要先用令牌认证"})
+                        logger.warning("控制接口连接未通过令牌认证，已断开")
+                        break
+                    authed = True
+                    reply({"id": req.get("id"), "ok": True, "result": "ok"})
+                    continue
+                # 每条请求独立成任务：慢请求不挡后面的请求；创建顺序即入队顺序
+                task = asyncio.create_task(self._handle_request(req, reply), context=self._context)
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                await writer.drain()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            for task in pending:
+                task.cancel()
+            writer.close()
+
+    async def _handle_request(self, req: dict[str, Any], reply: Reply) -> None:
+        req_id = req.get("id")
+        try:
+            op = self._ops.get(req.get("op", ""))
+            if op is None:
+                raise ValueError(f"未知操作: {req.get('op')!r}")
+            result = await op(req)
+        except Exception as exc:
+            reply({"id": req_id, "ok": False, "error": f"{type(exc).__name__}: {exc}"})
+        else:
+            reply({"id": req_id, "ok": True, "result": result})
+
+    # ---------------- 操作 ----------------
+    def _services(self) -> dict[str, Any]:
+        """ 服务类名 -> 服务实例（进程池服务按原服务名登记） """
+        out: dict[str, Any] = {}
+        for svc in self._scheduler._services:
+            name = type(svc.inner).__name__ if isinstance(svc, ProcessOffloadService) else type(svc).__name__
+            out[name] = svc
+        return out
+
+    async def _op_ping(self, req: dict[str, Any]) -> Any:
+        return "pong"
+
+    async def _op_state(self, req: dict[str, Any]) -> Any:
+        sch = self._scheduler
+        control = self._control
+        return {
+            "running_sec": sch.get_running_time().total_seconds(),
+            "dispatched": sch.dispatched,
+            "listeners": [type(l).__name__ for l in sch._listeners],
+            "services": {name: sorted(exported_names(svc)) for name, svc in self._services().items()},
+            "handlers": {name: [fn.__name__ for fn in fns] for name, fns in sch._handlers.items()},
+            "offload": sch.offload_stats(),
+            "executors": executor_stats(),
+            "control": None if control is None else {
+                "queue_depth": control.depth,
+                "completed": control.completed,
+                "coalesced": control.coalesced,
+                "dropped": control.dropped,
+                "expired": control.expired,
+                "avg_latency_sec": control.latency_total / control.completed if control.completed else 0.0,
+                "avg_wait_sec": {p: total / n if n else 0.0 for p, (n, total) in control.wait_by_priority.items()},
+                "outbound_rates": None if control.limiter is None else control.limiter.current_rates(),
+                "pending_acks": control.acks.pending(),
+                "acks_matched": control.acks.matched,
+            },
+        }
+
+    async def _op_call(self, req: dict[str, Any]) -> Any:
+        svc = self._services().get(req["service"])
+        if svc is None:
+            raise KeyError(f"没有服务: {req['service']}")
+        attr = _safe_attr(svc, req["method"])     # 安检
+        result = attr(*req.get("args", [])) if callable(attr) else attr
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    async def _op_emit(self, req: dict[str, Any]) -> Any:
+        name = req["event"]
+        event_cls = get_event(name)
+        if event_cls is None:
+            raise KeyError(f"事件 {name} 未注册")
+        self._scheduler.publish(event_cls(**req.get("args", {})))
+        return None
+
+    async def _op_fluent(self, req: dict[str, Any]) -> Any:
+        fluent = build_fluent(req["cmd"], req.get("args", {}), req.get("chain", []))
+        logger.info(f"控制接口提交: {req['cmd']}({req.get('args', {})}) {req.get('chain', [])}")
+        if req.get("wait", True):
+            await fire(fluent)
+            return "done"
+        task = asyncio.create_task(fire(fluent))
+        task.add_done_callback(self._scheduler._handle_task_exc)
+        await asyncio.sleep(0)       # 让它先入队，保证和后续请求的顺序
+        return "queued"
+
+    async def _op_metrics(self, req: dict[str, Any]) -> Any:
+        return REGISTRY.render()
@@ -0,0 +1,254 @@
+""" 多实例协同（SQLite WAL） """
+
+# simmc/schedule/coordination.py
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+from ..schemas.event import EventBase
+from ..schemas.event_registry import get_event_name
+from ..utils.conf_injector import Inject
+from ..utils.metrics import REGISTRY
+from ..utils.logger import logger
+from ..constants import MYSELF
+
+_CLAIMS_WON = REGISTRY.counter("simmc_coord_claims_won_total", "抢到执行权的事件数")
+_CLAIMS_LOST = REGISTRY.counter("simmc_coord_claims_lost_total", "被其他实例抢先的事件数")
+_BATCHES = REGISTRY.counter("simmc_coord_batches_total", "SQLite 批量事务数")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (action TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS claims (fp TEXT PRIMARY KEY, owner TEXT NOT NULL, at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS state  (key TEXT PRIMARY KEY, value TEXT NOT NULL, owner TEXT NOT NULL, updated REAL NOT NULL);
+"""
+
+def event_fingerprint(ev: EventBase, salt: str = "") -> str:
+    """ 事件指纹：事件名 + 全部字段，同一行日志在不同实例上得到同一个指纹 """
+    payload = json.dumps(ev.as_dict(), sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(f"{get_event_name(ev)}|{salt}|{payload}".encode("utf-8")).hexdigest()[:24]
+
+@Inject(at={"enabled", "path", "lease_sec", "claim_ttl", "flush_interval"})
+class Coordinator:
+    """
+    同机多个 bot 进程通过一个 WAL 模式的 SQLite 库协同：
+    - claim(): 执行前先抢占事件指纹，只有一个实例会真正动手（去重）
+    - is_leader(): 按动作类别（如 "land"、"pay"）选主，租约过期自动易主
+    - put_state()/get_state(): 共享派生状态，写入先缓冲再批量提交
+
+    同一个事件循环 tick 内的请求合并成一个短事务，在专用线程里执行，不阻塞事件循环。
+    未启用时所有操作退化为单机语义（总能抢到、总是 leader、状态只在本进程）。
+    """
+    # 下面配置会自动注入
+    enabled: bool = False
+    path: Path = Path("simmc.coord.db")
+    lease_sec: float = 10.0
+    """ leader 租约时长（秒） """
+    claim_ttl: float = 30.0
+    """ 同一指纹在这段时间内只允许一个实例执行（秒）；认领它的实例自己再遇到照常执行 """
+    flush_interval: float = 0.5
+    """ 共享状态批量提交间隔（秒） """
+
+    def __init__(self, owner: Optional[str] = None) -> None:
+        self.owner = owner or f"{MYSELF}@{os.getpid()}"
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="Coordinator")
+        self._conn: sqlite3.Connection | None = None
+        self._batch: list[tuple[str, tuple[Any, ...], asyncio.Future[Any]]] = []
+        self._state_buf: dict[str, str] = {}
+        self._local_state: dict[str, Any] = {}
+        self._leader_until: dict[str, float] = {}
+        self._task: asyncio.Task | None = None
+
+    # ---------------- 生命周期 ----------------
+    async def start(self) -> None:
+        """ 打开数据库并启动后台刷新，作为调度器启动前置使用 """
+        if not self.enabled or self._conn is not None:
+            return
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._open)
+        self._task = asyncio.create_task(self._background())
+        logger.success(f"协同后端已启动: {self.path} (owner={self.owner})")
+
+    def stop(self) -> None:
+        """ 刷出缓冲并关闭，作为退出回调使用 """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._conn is not None:
+            self._executor.submit(self._close).result()
+        self._executor.shutdown(wait=False)
+
+    def _open(self) -> None:
+        self._conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def _close(self) -> None:
+        assert self._conn is not None
+        if self._state_buf:
+            self._run_batch([("put_many", (list(self._state_buf.items()),))])
+            self._state_buf.clear()
+        # 主动让出租约，别的实例立刻可以接手
+        self._conn.execute("DELETE FROM leases WHERE owner = ?", (self.owner,))
+        self._conn.close()
+        self._conn = None
+
+    # ---------------- 公共 API ----------------
+    async def claim(self, fingerprint: str) -> bool:
+        """ 抢占执行权，True 表示本实例负责执行 """
+        if self._conn is None:
+            return True
+        won = await self._submit("claim", fingerprint)
+        if won:
+            _CLAIMS_WON.value += 1
+        else:
+            _CLAIMS_LOST.value += 1
+            logger.debug(f"事件 {fingerprint} 已被其他实例认领，跳过")
+        return won
+
+    async def claim_event(self, ev: EventBase, salt: str = "") -> bool:
+        """
+        以事件指纹抢占执行权。指纹只看事件内容，同一玩家重复发同样的话也是同一个指纹，
+        所以只拦别的实例的认领：本实例认领过的指纹再来（两条真实的相同日志）照常放行。
+        """
+        return await self.claim(event_fingerprint(ev, salt))
+
+    async def is_leader(self, action: str) -> bool:
+        """ 本实例是否是该动作类别的 leader（租约缓存在本地，半个租约内不查库） """
+        if self._conn is None:
+            return True
+        if self._leader_until.get(action, 0.0) > time.time():
+            return True
+        expires = await self._submit("lease", action)
+        if expires:
+            self._leader_until[action] = expires - self.lease_sec / 2
+            return True
+        self._leader_until.pop(action, None)
+        return False
+
+    def put_state(self, key: str, value: Any) -> None:
+        """ 写共享状态（缓冲，flush_interval 内批量提交） """
+        self._local_state[key] = value
+        if self._conn is not None:
+            self._state_buf[key] = json.dumps(value, ensure_ascii=False)
+
+    async def get_state(self, key: str, default: Any = None) -> Any:
+        """ 读共享状态，本进程未提交的写入优先 """
+        if self._conn is None or key in self._state_buf:
+            return self._local_state.get(key, default)
+        raw = await self._submit("get", key)
+        return default if raw is None else json.loads(raw)
+
+    # ---------------- 批处理 ----------------
+    def _submit(self, op: str, *args: Any) -> asyncio.Future[Any]:
+        loop = asyncio.get_running_loop()
+        fut: asyncio.Future[Any] = loop.create_future()
+        if not self._batch:
+            loop.call_soon(self._flush_batch)     # 本 tick 内的请求合并成一个事务
+        self._batch.append((op, args, fut))
+        return fut
+
+    def _flush_batch(self) -> None:
+        batch, self._batch = self._batch, []
+        writes, self._state_buf = self._state_buf, {}
+        ops = [(op, args) for op, args, _ in batch]
+        if writes:
+            ops.insert(0, ("put_many", (list(writes.items()),)))
+        exec_fut = asyncio.get_running_loop().run_in_executor(self._executor, self._run_batch, ops)
+
+        def _deliver(done: asyncio.Future[list[Any]]) -> None:
+            exc = done.exception()
+            results = [exc] * len(ops) if exc is not None else done.result()
+            if writes:
+                failed = results.pop(0)
+                if failed is not None:
+                    # 状态写入没人等：记下来并放回缓冲，下一批重试；期间的新写入优先
+                    logger.warning(f"协同状态写入失败，{len(writes)} 项留到下一批重试: {failed!r}")
+                    self._state_buf = {**writes, **self._state_buf}
+            for (_, _, fut), result in zip(batch, results):
+                if fut.done():
+                    continue
+                if isinstance(result, BaseException):
+                    fut.set_exception(result)
+                else:
+                    fut.set_result(result)
+        exec_fut.add_done_callback(_deliver)
+
+    def _run_batch(self, ops: list[tuple[str, tuple[Any, ...]]]) -> list[Any]:
+        """ 专用线程：一个 BEGIN IMMEDIATE 短事务执行整批操作 """
+        conn = self._conn
+        if conn is None:
+            raise RuntimeError("协同后端未启动")
+        now = time.time()
+        results: list[Any] = []
+        _BATCHES.value += 1
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for op, args in ops:
+                try:
+                    results.append(self._apply(conn, op, args, now))
+                except sqlite3.Error as exc:
+                    results.append(exc)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return results
+
+    def _apply(self, conn: sqlite3.Connection, op: str, args: tuple[Any, ...], now: float) -> Any:
+        if op == "claim":
+            cur = conn.execute(
+                "INSERT INTO claims(fp, owner, at) VALUES (?, ?, ?) "
+                "ON CONFLICT(fp) DO UPDATE SET owner = excluded.owner, at = excluded.at "
+                "WHERE claims.owner = excluded.owner OR claims.at < ?",
+                (args[0], self.owner, now, now - self.claim_ttl),
+            )
+            return cur.rowcount == 1
+        if op == "lease":
+            conn.execute(
+                "INSERT INTO leases(action, owner, expires) VALUES (?, ?, ?) "
+                "ON CONFLICT(action) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+                "WHERE leases.owner = excluded.owner OR leases.expires < ?",
+                (args[0], self.owner, now + self.lease_sec, now),
+            )
+            owner, expires = conn.execute("SELECT owner, expires FROM leases WHERE action = ?", (args[0],)).fetchone()
+            return expires if owner == self.owner else 0.0
+        if op == "get":
+            row = conn.execute("SELECT value FROM state WHERE key = ?", (args[0],)).fetchone()
+            return row[0] if row else None
+        if op == "put_many":
+            conn.executemany(
+                "INSERT INTO state(key, value, owner, updated) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, owner = excluded.owner, updated = excluded.updated",
+                [(k, v, self.owner, now) for k, v in args[0]],
+            )
+            return None
+        if op == "flush":
+            return None
+        if op == "purge":
+            conn.execute("DELETE FROM claims WHERE at < ?", (now - self.claim_ttl,))
+            conn.execute("DELETE FROM leases WHERE expires < ?", (now,))
+            return None
+        raise ValueError(f"未知协同操作: {op}")
+
+    async def _background(self) -> None:
+        """ 定期：提交状态缓冲、续租、清理过期认领 """
+        last_purge = time.time()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                if self._state_buf and not self._batch:
+                    await self._submit("flush")      # 状态缓冲随这一批写入
+                for action, until in list(self._leader_until.items()):
+                    if until - time.time() < self.lease_sec / 4:
+                        self._leader_until.pop(action, None)
+                        await self.is_leader(action)
+                if time.time() - last_purge > self.claim_ttl:
+                    last_purge = time.time()
+                    await self._submit("purge")
+            except sqlite3.Error as exc:
+                logger.warning(f"协同后端后台任务出错: {exc!r}")
@@ -8,14 +8,21 @@ from datetime import timedelta
 from typing import Callable, Awaitable, TypeVar, Coroutine, Any, Self
 from ..schemas.event import EventRequest, EventBase
 from ..schemas.protocols import IListener, IService
+from ..schemas.event_registry import get_event_name
 from ..utils.functools import sync_to_async
 from ..utils.logger import logger
+from ..utils.metrics import REGISTRY
 from ..constants import _ART
 from ..metadata import print_banner
+from .offload import ProcessOffloadService, OffloadOptions, OffloadStats, get_offload_options
 
 EVENT = TypeVar('EVENT', bound=EventBase, covariant=True)
 Handler = Callable[[EVENT], None] | Callable[[EVENT], Awaitable[None]]
 
+_DISPATCHED = REGISTRY.counter("simmc_events_dispatched_total", "调度器发布的事件数")
+_HANDLER_TASKS = REGISTRY.counter("simmc_handler_tasks_total", "为服务/业务装饰器创建的处理任务数")
+_HANDLER_ERRORS = REGISTRY.counter("simmc_handler_errors_total", "处理任务抛出的异常数")
+
 class EventLoopScheduler:
     """ 事件调度器 """
     def __init__(self) -> None:
@@ -30,6 +37,8 @@ class EventLoopScheduler:
         self._svc_routes: list[tuple[IService, tuple[type, ...]]] = []
         self._runner: asyncio.Task | None = None
         self._start_mono: float = monotonic()
+        self.dispatched: int = 0
+        """ 已发布的事件总数 """
 
         self._exit_flag: bool = False
 
@@ -39,8 +48,8 @@ class EventLoopScheduler:
         print_banner()
 
     def _extract_event_types(self, svc: IService) -> tuple[type, ...]:
-        """ 获取服务类型 """
-        sig = inspect.signature(svc.handle)
+        """ 获取服务类型（服务模块用了 from __future__ import annotations 时注解是字符串，这里求值） """
+        sig = inspect.signature(svc.handle, eval_str=True)
         param = next(iter(sig.parameters.values()), None)
         if param is None:
             return (EventBase,)          # 无参默认全收
@@ -55,6 +64,13 @@ class EventLoopScheduler:
             return tuple(args)
         return (wanted_type,)
 
+    def snapshot(self) -> dict[str, Any]:
+        """ 热重启快照 """
+        return {"dispatched": self.dispatched}
+
+    def restore(self, state: dict[str, Any]) -> None:
+        self.dispatched = state.get("dispatched", 0)
+
     def get_running_time(self) -> timedelta:
         """ 获取调度器运行时间 """
         return timedelta(seconds=monotonic() - self._start_mono)
@@ -72,12 +88,31 @@ class EventLoopScheduler:
         logger.debug(f"添加监听器：{type(listener).__name__}")
         self._listeners.append(listener)
 
-    def add_service(self, svc: IService) -> None:
-        """ 添加服务 """
+    def add_service(self, svc: IService, *, processes: int | None = None, emit: bool = False) -> None:
+        """
+        添加服务
+        :param processes: 给服务一个独立进程池（进程数），handle 在子进程里执行；
+                          不传则看服务类上是否有 @offload 标记
+        :param emit: 进程池模式下，handle 返回的事件是否重新发布到调度器
+        """
+        wanted_types = self._extract_event_types(svc)   # 以原服务的签名为准
+        logger.debug(f"服务 {type(svc).__name__} 注册事件类型 {wanted_types}; 描述: {type(svc).__doc__}")
+        options = get_offload_options(svc)
+        if processes is not None:
+            options = OffloadOptions(processes, emit)
+        if options is not None:
+            logger.debug(f"服务 {type(svc).__name__} 卸载到进程池: {options}")
+            svc = ProcessOffloadService(svc, options, self.publish)
+            self.add_exit_callback(svc.shutdown)
         self._services.append(svc)
-        wanted_types = self._extract_event_types(svc)
         self._svc_routes.append((svc, wanted_types))
-        logger.debug(f"服务 {type(svc).__name__} 注册事件类型 {wanted_types}; 描述: {type(svc).__doc__}")
+
+    def offload_stats(self) -> dict[str, OffloadStats]:
+        """ 所有进程池服务的指标（服务类名 -> 指标） """
+        return {
+            type(svc.inner).__name__: svc.stats()
+            for svc in self._services if isinstance(svc, ProcessOffloadService)
+        }
 
     def add_start_prepare(self, start_prepare_function: Callable[..., None]) -> None:
         """ 添加启动前置执行 """
@@ -106,13 +141,16 @@ class EventLoopScheduler:
         """ 订阅一个事件，触发将取决于你加入的监听器发布事件的名字 """
         def event_decorator(fn: Handler) -> Handler:
             logger.debug(f"注册事件处理函数: {name} -> ({fn.__name__}) 描述: {fn.__doc__}")
-            self._handlers.setdefault(name, []).append(fn)
+            # 同步处理器注册时包一次，发布时不再每次新建包装
+            handler = fn if inspect.iscoroutinefunction(fn) else sync_to_async(fn)
+            self._handlers.setdefault(name, []).append(handler)
             return fn
         return event_decorator
 
-    async def loop(self) -> None:
+    async def loop(self, show_banner: bool = True) -> None:
         """ 主循环 """
-        self.show_info()
+        if show_banner:
+            self.show_info()
         logger.info(f"开始运行...")
         self.ensure_loop()
         # 执行启动前置
@@ -169,6 +207,14 @@ class EventLoopScheduler:
                 continue
         logger.success("所有回调执行完成，正式退出...")
 
+    def publish(self, ev: EventBase) -> None:
+        """ 由服务/外部直接发布一个事件（必须在事件循环内调用） """
+        name = get_event_name(ev)
+        if name is None:
+            logger.warning(f"事件 {type(ev).__name__} 未注册，无法发布")
+            return
+        self._dispatch(EventRequest(name, ev))
+
     # ------------------------
     async def _pump(self, listener: IListener) -> None:
         async for ev in listener.listen(): 
@@ -176,6 +222,8 @@ class EventLoopScheduler:
 
     def _dispatch(self, ev: EventRequest) -> None:
         """ 发布事件 """
+        self.dispatched += 1
+        _DISPATCHED.value += 1
         self.__to_service(ev)
         self.__to_decorator(ev)
 
@@ -184,6 +232,7 @@ class EventLoopScheduler:
         for svc, types in self._svc_routes:
             if any(isinstance(ev.event, t) for t in types):
                 coro = svc.handle(ev.event)
+                _HANDLER_TASKS.value += 1
                 task = asyncio.create_task(coro, name=ev.event_name)
                 task.add_done_callback(self._handle_task_exc)
 
@@ -191,8 +240,8 @@ class EventLoopScheduler:
         """ 发给业务装饰器 """
         for handler in self._handlers.get(ev.event_name, []):
             logger.trace(f"发布事件处理请求 {ev.event_name} 给业务装饰器: -> {handler.__name__}")
-            coro = handler(ev.event) if inspect.iscoroutinefunction(handler) \
-                else sync_to_async(handler)(ev.event)
+            coro = handler(ev.event)
+            _HANDLER_TASKS.value += 1
             task = asyncio.create_task(coro, name=ev.event_name)
             # 关键：任务结束后统一检查异常
             task.add_done_callback(self._handle_task_exc)
@@ -200,6 +249,7 @@ class EventLoopScheduler:
     def _handle_task_exc(self, t: asyncio.Task) -> None:
         exc = t.exception()
         if exc:
+            _HANDLER_ERRORS.value += 1
             logger.error(f"处理事件: {t.get_name()} 的时候发生了异常: {type(exc).__name__}: {exc}", exc_info=exc)
         if isinstance(exc, KeyboardInterrupt):
             logger.critical(f"收到处理函数传来的退出信号，正在退出，原因: {exc}")
@@ -0,0 +1,165 @@
+""" 进程池卸载 """
+
+# simmc/schedule/offload.py
+import asyncio
+import inspect
+from time import perf_counter
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+from ..schemas.event import EventBase
+from ..schemas.protocols import IService
+from ..utils.logger import logger
+from ..utils.metrics import REGISTRY
+from ..security import json_export
+
+S = TypeVar("S", bound=type)
+
+_OFFLOAD_ATTR = "__simmc_offload__"
+
+@dataclass(slots=True, frozen=True)
+class OffloadOptions:
+    """ 卸载选项 """
+    workers: int = 1
+    """ 该服务独占的进程数 """
+    emit: bool = False
+    """ handle 的返回值（事件 / 事件列表）是否作为新事件重新发布 """
+
+@dataclass(slots=True)
+class OffloadStats:
+    """ 卸载服务运行指标 """
+    workers: int
+    pending: int
+    """ 已提交、尚未返回的事件数（队列深度） """
+    peak_pending: int
+    submitted: int
+    completed: int
+    failed: int
+    emitted: int
+    avg_run_sec: float
+    """ 子进程内 handle 的平均耗时 """
+
+def offload(workers: int = 1, *, emit: bool = False) -> Callable[[S], S]:
+    """
+    服务类装饰器：add_service 时自动把 handle 放进独立进程池执行
+    例：
+        @offload(workers=2, emit=True)
+        class OcrService:
+            def handle(self, ev: MessageEvent) -> list[EventBase]: ...
+
+    注意：服务实例和事件都要能被 pickle；主模块需要有 `if __name__ == "__main__"` 保护。
+    """
+    if workers < 1:
+        raise ValueError("workers 至少为 1")
+
+    def _decorator(cls: S) -> S:
+        setattr(cls, _OFFLOAD_ATTR, OffloadOptions(workers, emit))
+        return cls
+    return _decorator
+
+def get_offload_options(svc: IService) -> OffloadOptions | None:
+    """ 读取服务上的卸载标记 """
+    return getattr(type(svc), _OFFLOAD_ATTR, None)
+
+# ---------------- 子进程侧 ----------------
+_worker_svc: Any = None
+
+def _worker_init(svc: IService) -> None:
+    """ 每个子进程只反序列化一次服务实例，之后只传事件 """
+    global _worker_svc
+    _worker_svc = svc
+
+def _worker_call(ev: EventBase) -> tuple[Any, float]:
+    start = perf_counter()
+    result = _worker_svc.handle(ev)
+    if inspect.iscoroutine(result):
+        result = asyncio.run(result)
+    return result, perf_counter() - start
+
+# ---------------- 主进程侧 ----------------
+class ProcessOffloadService:
+    """ 把任意服务的 handle 挪到独立进程池里跑，避免 CPU 密集任务抢占按键时序 """
+
+    def __init__(
+        self,
+        svc: IService,
+        options: OffloadOptions,
+        publish: Optional[Callable[[EventBase], None]] = None,
+    ) -> None:
+        self._svc = svc
+        self._options = options
+        self._publish = publish
+        self._pool: ProcessPoolExecutor | None = None
+
+        self._pending = 0
+        self._peak_pending = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._emitted = 0
+        self._run_total = 0.0
+
+        labels = {"service": type(svc).__name__}
+        REGISTRY.gauge("simmc_offload_pending", "进程池服务已提交未完成的事件数", labels, fn=lambda: self._pending)
+        REGISTRY.gauge("simmc_offload_completed", "进程池服务已完成的事件数", labels, fn=lambda: self._completed)
+        REGISTRY.gauge("simmc_offload_failed", "进程池服务失败的事件数", labels, fn=lambda: self._failed)
+
+    @property
+    def inner(self) -> IService:
+        """ 被包装的原服务 """
+        return self._svc
+
+    def _ensure_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self._options.workers,
+                initializer=_worker_init,
+                initargs=(self._svc,),
+            )
+            logger.debug(f"服务 {type(self._svc).__name__} 进程池启动，进程数: {self._options.workers}")
+        return self._pool
+
+    async def handle(self, ev: EventBase) -> None:
+        loop = asyncio.get_running_loop()
+        pool = self._ensure_pool()
+        self._submitted += 1
+        self._pending += 1
+        self._peak_pending = max(self._peak_pending, self._pending)
+        try:
+            result, run_sec = await loop.run_in_executor(pool, _worker_call, ev)
+        except Exception:
+            self._failed += 1
+            raise
+        finally:
+            self._pending -= 1
+        self._completed += 1
+        self._run_total += run_sec
+
+        if self._options.emit and self._publish is not None and result is not None:
+            results = result if isinstance(result, (list, tuple)) else (result,)
+            for new_ev in results:
+                if isinstance(new_ev, EventBase):
+                    self._emitted += 1
+                    self._publish(new_ev)
+                else:
+                    logger.warning(f"服务 {type(self._svc).__name__} 返回了非事件对象: {new_ev!r}，忽略")
+
+    @json_export
+    def stats(self) -> OffloadStats:
+        """ 当前指标快照 """
+        return OffloadStats(
+            workers=self._options.workers,
+            pending=self._pending,
+            peak_pending=self._peak_pending,
+            submitted=self._submitted,
+            completed=self._completed,
+            failed=self._failed,
+            emitted=self._emitted,
+            avg_run_sec=self._run_total / self._completed if self._completed else 0.0,
+        )
+
+    def shutdown(self) -> None:
+        """ 关闭进程池 """
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,197 @@
+""" 多账号会话 """
+
+# simmc/schedule/session.py
+import asyncio
+import inspect
+import contextvars
+from time import monotonic
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Any, Optional, Self
+from .default import EventLoopScheduler
+from .snapshot import Checkpointer
+from ..listeners.evt_listener import MinecraftLogListener
+from ..operation.player_control import PlayerControl
+from ..operation.chat_batch import ChatBatcher
+from ..operation.outbound import OutboundLimiter
+from ..operation.input_backend import make_backend
+from ..operation.fluent.base import fluent_bind_control
+from ..schemas.protocols import IListener, IService
+from ..utils.logger import logger
+from ..utils.smart_serializer import deserialize_value
+from ..constants import SESSIONS, INPUT_BACKEND
+
+_current_session: contextvars.ContextVar[Optional["Session"]] = contextvars.ContextVar("current_session", default=None)
+
+def current_session() -> Optional["Session"]:
+    """ 当前任务所属的会话（单账号模式下为 None） """
+    return _current_session.get()
+
+@dataclass(slots=True)
+class SessionStats:
+    """ 会话运行指标 """
+    name: str
+    my_id: str
+    uptime_sec: float
+    events: int
+    """ 已发布事件数 """
+    events_per_sec: float
+    actions: int
+    """ 已完成的玩家操作数 """
+    action_avg_latency_sec: float
+    """ 玩家操作平均 排队+执行 耗时 """
+    queue_depth: int
+
+class Session:
+    """
+    一个账号会话：身份 + 监听器 + 玩家控制器 + 服务 + 配置。
+    多个会话共用同一个事件循环、预编译正则表和线程池。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        my_id: str,
+        listener: IListener | None = None,
+        config: dict[str, Any] | None = None,
+    ) -> None:
+        self.name = name
+        self.my_id = my_id
+        """ 该会话的玩家 ID（代替全局 MYSELF） """
+        self.config = config or {}
+        self.outbound = OutboundLimiter()
+        """ 出站限流按账号各自学习，服务器对每个玩家单独计数 """
+        self.control = PlayerControl(
+            ChatBatcher(), make_backend(self.config.get("INPUT_BACKEND", INPUT_BACKEND)), self.outbound,
+        )
+        self.scheduler = EventLoopScheduler()
+        self.scheduler.add_service(self.outbound)
+        self.scheduler.add_start_prepare(self.control.start)
+        self.scheduler.add_exit_callback(self.control.stop)
+        listener = listener or self._build_listener()
+        if isinstance(listener, MinecraftLogListener) and listener.acks is None:
+            listener.acks = self.control.acks       # 日志行同时喂给本会话的回执表
+        self.scheduler.add_listener(listener)
+        self.checkpointer = Checkpointer(self.scheduler)
+        self.checkpointer.path = Path(f"simmc.{name}.snapshot")   # 每个会话一份快照
+        self._start_mono = monotonic()
+
+        # 会话专属上下文：在里面创建的任务，流操作都落到本会话的控制器
+        self.context = contextvars.copy_context()
+        self.context.run(fluent_bind_control, self.control)
+        self.context.run(_current_session.set, self)
+
+    @classmethod
+    def from_config(cls, entry: dict[str, Any]) -> Self:
+        """ 从 config.json 的 SESSIONS 条目构建 """
+        my_id = entry["USER_ID"]
+        return cls(entry.get("NAME", my_id), my_id, config=entry)
+
+    def _build_listener(self) -> MinecraftLogListener:
+        """ 按会话配置覆盖监听器参数（端口、日志路径等） """
+        listener = MinecraftLogListener()
+        annotations = inspect.get_annotations(type(listener))
+        for key, value in self.config.get("MinecraftLogListener", {}).items():
+            if key not in annotations:
+                logger.warning(f"会话 {self.name}: 未知监听器配置 {key}，忽略")
+                continue
+            setattr(listener, key, deserialize_value(value, annotations[key]))
+        return listener
+
+    # ---------------- 注册入口（转发给会话调度器） ----------------
+    def add_service(self, svc: IService, **kw: Any) -> None:
+        """ 添加服务 """
+        self.scheduler.add_service(svc, **kw)
+
+    def add_default_services(self) -> None:
+        """ 挂上和 main.py 相同的一套默认服务 """
+        from ..services.channel_ensure import ChannelEnsureService
+        from ..services.idle_service import IdleService
+        from ..services.land_balance import LandBalanceCache
+        from ..services.triggers import JsonTriggerService
+        self.add_service(ChannelEnsureService(self.my_id, 5))
+        self.add_service(IdleService())
+        self.add_service(LandBalanceCache())
+        self.add_service(JsonTriggerService())
+
+    def on_event(self, name: str):
+        """ 订阅本会话的事件 """
+        return self.scheduler.on_event(name)
+
+    # ---------------- 指标 ----------------
+    def stats(self) -> SessionStats:
+        uptime = monotonic() - self._start_mono
+        events = self.scheduler.dispatched
+        actions = self.control.completed
+        return SessionStats(
+            name=self.name,
+            my_id=self.my_id,
+            uptime_sec=uptime,
+            events=events,
+            events_per_sec=events / uptime if uptime > 0 else 0.0,
+            actions=actions,
+            action_avg_latency_sec=self.control.latency_total / actions if actions else 0.0,
+            queue_depth=self.control.depth,
+        )
+
+class SessionHub:
+    """ 会话总控：一个进程、一个事件循环驱动多个客户端 """
+
+    def __init__(self, report_interval: float | None = 60.0) -> None:
+        self._sessions: dict[str, Session] = {}
+        self._report_interval = report_interval
+
+    @classmethod
+    def from_config(cls, default_services: bool = True, **kw: Any) -> Self:
+        """ 按 config.json 的 SESSIONS 建立所有会话 """
+        hub = cls(**kw)
+        for entry in SESSIONS:
+            session = Session.from_config(entry)
+            if default_services:
+                session.add_default_services()
+            hub.add(session)
+        return hub
+
+    def add(self, session: Session) -> Session:
+        if session.name in self._sessions:
+            raise ValueError(f"会话 {session.name} 已存在")
+        self._sessions[session.name] = session
+        logger.debug(f"添加会话: {session.name} ({session.my_id})")
+        return session
+
+    def get(self, name: str) -> Session | None:
+        return self._sessions.get(name)
+
+    def stats(self) -> dict[str, SessionStats]:
+        """ 每个会话的吞吐/延迟 """
+        return {name: s.stats() for name, s in self._sessions.items()}
+
+    async def _report(self) -> None:
+        while True:
+            await asyncio.sleep(self._report_interval)
+            for st in self.stats().values():
+                logger.info(
+                    f"会话<{st.name}> 事件 {st.events} ({st.events_per_sec:.2f}/s), "
+                    f"操作 {st.actions} (平均 {st.action_avg_latency_sec * 1000:.0f}ms), 排队 {st.queue_depth}"
+                )
+
+    async def run(self) -> None:
+        """ 同一事件循环里并发跑所有会话，单个会话退出（被踢/断开）不影响其他会话 """
+        if not self._sessions:
+            raise RuntimeError("没有会话，请先 add()")
+        next(iter(self._sessions.values())).scheduler.show_info()
+        runners = [
+            asyncio.create_task(s.scheduler.loop(show_banner=False), name=f"session:{s.name}", context=s.context)
+            for s in self._sessions.values()
+        ]
+        reporter = asyncio.create_task(self._report()) if self._report_interval else None
+        try:
+            results = await asyncio.gather(*runners, return_exceptions=True)
+            for session, result in zip(self._sessions.values(), results):
+                if isinstance(result, BaseException):
+                    logger.error(f"会话 {session.name} 异常退出: {result!r}")
+        finally:
+            if reporter:
+                reporter.cancel()
+            for s in self._sessions.values():
+                await s.scheduler.stop()
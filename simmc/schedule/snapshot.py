@@ -0,0 +1,166 @@
+""" 热重启快照 """
+
+# simmc/schedule/snapshot.py
+import os
+import json
+import asyncio
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any
+from .default import EventLoopScheduler
+from ..schemas.protocols import ISnapshot
+from ..utils.conf_injector import Inject
+from ..utils.functools import sync_to_async
+from ..utils.logger import logger
+
+_LOCK = threading.Lock()
+
+def _dumps(state: Any) -> str:
+    return json.dumps(state, ensure_ascii=False, separators=(",", ":"))
+
+def _record(key: str, dumped: str) -> str:
+    return f'{{"k":{json.dumps(key, ensure_ascii=False)},"v":{dumped}}}\n'
+
+class SnapshotStore:
+    """
+    追加式快照日志：每行一条 {"k": 组件名, "v": 状态}，只追加发生变化的组件（增量）。
+    读取时同名取最后一条；半行（写到一半崩溃）直接丢弃，因此任何时刻崩溃都能读回上一个完整状态。
+    日志行数超过 compact_after 时原子重写为每个组件一行。
+    """
+
+    def __init__(self, path: Path, compact_after: int = 256) -> None:
+        self._path = path
+        self._compact_after = compact_after
+        self._written: dict[str, str] = {}     # 组件 -> 已落盘的状态串
+        self._lines = 0
+        self._needs_compact = False
+
+    def load(self) -> dict[str, Any]:
+        """ 回放日志，返回每个组件的最新状态 """
+        states: dict[str, Any] = {}
+        if not self._path.exists():
+            return states
+        with open(self._path, "r", encoding="utf-8") as f:
+            for raw in f:
+                try:
+                    rec = json.loads(raw)
+                    states[rec["k"]] = rec["v"]
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    logger.warning(f"快照 {self._path} 有损坏的行，已跳过")
+                    self._needs_compact = True     # 坏尾巴后面不能再追加
+                    continue
+                self._lines += 1
+        self._written = {k: _dumps(v) for k, v in states.items()}
+        return states
+
+    def write(self, states: dict[str, Any]) -> int:
+        """ 只追加有变化的组件，返回写入条数 """
+        with _LOCK:
+            changed: dict[str, str] = {}
+            for key, state in states.items():
+                dumped = _dumps(state)
+                if self._written.get(key) != dumped:
+                    changed[key] = dumped
+            if not changed:
+                return 0
+
+            if self._needs_compact or self._lines + len(changed) > self._compact_after:
+                self._written.update(changed)
+                self._compact()
+            else:
+                with open(self._path, "a", encoding="utf-8") as f:
+                    f.write("".join(_record(k, v) for k, v in changed.items()))
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._written.update(changed)
+                self._lines += len(changed)
+        return len(changed)
+
+    def _compact(self) -> None:
+        """ 每个组件只留一行，临时文件 + os.replace 原子替换 """
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self._path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write("".join(_record(k, v) for k, v in self._written.items()))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self._path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+        self._lines = len(self._written)
+        self._needs_compact = False
+
+@Inject(at={"enabled", "path", "interval"})
+class Checkpointer:
+    """
+    周期性保存所有实现了 snapshot()/restore() 的服务（以及手动 register 的组件），
+    启动时自动恢复，退出（含被踢/断开）时再存一次。
+    """
+    # 下面配置会自动注入
+    enabled: bool = True
+    path: Path = Path("simmc.snapshot")
+    interval: float = 15.0
+    """ 检查点间隔（秒） """
+
+    def __init__(self, scheduler: EventLoopScheduler) -> None:
+        self._scheduler = scheduler
+        self._extra: dict[str, ISnapshot] = {}
+        self._store: SnapshotStore | None = None
+        self.register(scheduler)
+        scheduler.add_start_prepare(self.start)
+        scheduler.add_exit_callback(self.checkpoint)
+
+    def register(self, obj: ISnapshot, key: str | None = None) -> None:
+        """ 登记一个非服务组件（例如 QueueEtaService），key 默认为类名 """
+        self._extra[key or type(obj).__name__] = obj
+
+    def _participants(self) -> dict[str, ISnapshot]:
+        found: dict[str, ISnapshot] = {}
+        for svc in self._scheduler._services:
+            if hasattr(svc, "snapshot") and hasattr(svc, "restore"):
+                found[type(svc).__name__] = svc  # type: ignore[assignment]
+        found.update(self._extra)
+        return found
+
+    async def start(self) -> None:
+        """ 恢复快照并启动周期检查点，作为调度器启动前置使用 """
+        if not self.enabled:
+            return
+        self._store = SnapshotStore(self.path)
+        states = self._store.load()
+        for key, obj in self._participants().items():
+            if key not in states:
+                continue
+            try:
+                obj.restore(states[key])
+                logger.success(f"已从快照恢复: {key}")
+            except Exception as exc:
+                logger.warning(f"恢复 {key} 失败，按全新状态启动: {exc!r}")
+        self._scheduler.add_runtime_entrust(self._periodic())
+
+    async def _periodic(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            if self._store is None:
+                continue
+            # 在事件循环里取快照（避免和服务并发改状态），落盘放到线程
+            written = await sync_to_async(self._store.write)(self._collect())
+            if written:
+                logger.trace(f"检查点已保存 {written} 个组件")
+
+    def _collect(self) -> dict[str, Any]:
+        states: dict[str, Any] = {}
+        for key, obj in self._participants().items():
+            try:
+                states[key] = obj.snapshot()
+            except Exception as exc:
+                logger.warning(f"组件 {key} 生成快照失败: {exc!r}")
+        return states
+
+    def checkpoint(self) -> None:
+        """ 立即保存一次（只写有变化的组件），作为退出回调使用 """
+        if self._store is not None:
+            self._store.write(self._collect())
@@ -1,12 +1,66 @@
 """ 事件发生数据 """
 
 from datetime import datetime
+from decimal import Decimal
 from dataclasses import dataclass
-from typing import Generic, TypeVar
+from typing import Any, Callable, ClassVar, Generic, TypeVar
 from .event_registry import event
 from ..constants import CMD_CHANNEL_TABLE
 
 T = TypeVar("T")
+V = TypeVar("V")
+
+class derived(Generic[V]):
+    """
+    惰性派生字段：第一次访问时才计算，结果缓存在同名前加下划线的槽位里。
+    所在类的 __slots__ 必须声明 "_<字段名>"。
+    """
+    __slots__ = ("_fn", "_cache")
+
+    def __init__(self, fn: Callable[[Any], V]) -> None:
+        self._fn = fn
+        self._cache = ""
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self._cache = f"_{name}"
+
+    def __get__(self, obj: Any, owner: type | None = None) -> V:
+        if obj is None:
+            return self  # type: ignore[return-value]
+        try:
+            return getattr(obj, self._cache)
+        except AttributeError:
+            value = self._fn(obj)
+            setattr(obj, self._cache, value)
+            return value
+
+class EventBase(Generic[T]):
+    """ 事件基类：子类用 __slots__ 声明字段，不带实例 __dict__ """
+    __slots__ = ()
+
+    FIELDS: ClassVar[tuple[str, ...]] = ()
+    """ 事件字段名（公开槽位 + 惰性派生字段），触发器等按它读取字段 """
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        names: list[str] = []
+        for klass in reversed(cls.__mro__):
+            slots = klass.__dict__.get("__slots__", ())
+            for slot in (slots,) if isinstance(slots, str) else slots:
+                if not slot.startswith("_") and slot not in names:
+                    names.append(slot)
+            for attr, value in klass.__dict__.items():
+                if isinstance(value, derived) and attr not in names:
+                    names.append(attr)
+        cls.FIELDS = tuple(names)
+
+    def as_dict(self) -> dict[str, Any]:
+        """ 字段名 -> 值（会触发惰性字段计算） """
+        return {name: getattr(self, name, None) for name in self.FIELDS}
+
+    def __repr__(self) -> str:
+        body = ", ".join(f"{name}={getattr(self, name, None)!r}" for name in self.FIELDS)
+        return f"{type(self).__name__}({body})"
 
 @dataclass(slots=True)
 class EventRequest:
@@ -18,13 +72,12 @@ class EventRequest:
     happen_time = datetime.now()
     """ 事件发生时间 """
 
-class EventBase(Generic[T]):
-    """ 事件基类 """
-
 @event("消息")
 class MessageEvent(EventBase[str]):
     """ 消息事件 """
-    def __init__(self, 
+    __slots__ = ("server_name", "_channel_tag", "tag", "player", "content", "_channel")
+
+    def __init__(self,
         server_name: str = "主服",
         channel: str = "G",
         tag: str = "流浪者",
@@ -33,8 +86,7 @@ class MessageEvent(EventBase[str]):
     ) -> None:
         self.server_name = server_name
         """ 玩家所在服务器区域 """
-        self.channel = CMD_CHANNEL_TABLE.get(channel, "G")
-        """ 玩家所在频道 """
+        self._channel_tag = channel
         self.tag = tag
         """ 玩家标签 """
         self.player = player
@@ -42,9 +94,16 @@ class MessageEvent(EventBase[str]):
         self.content = content
         """ 消息内容 """
 
+    @derived
+    def channel(self) -> str:
+        """ 玩家所在频道 """
+        return CMD_CHANNEL_TABLE.get(self._channel_tag, "G")
+
 @event("悄悄话")
 class WhisperEvent(EventBase[str]):
     """ 悄悄话消息事件 """
+    __slots__ = ("sender", "text")
+
     def __init__(self, sender: str, text: str) -> None:
         self.sender = sender
         """ 发送者 """
@@ -54,7 +113,7 @@ class WhisperEvent(EventBase[str]):
     def sender_is(self, name: str) -> bool:
         """ 发送者是不是 ... """
         return self.sender == name
-    
+
     @property
     def content(self) -> str:
         """ 消息内容 """
@@ -63,21 +122,28 @@ class WhisperEvent(EventBase[str]):
 @event("加入")
 class JoinEvent(EventBase[str]):
     """ 玩家加入事件 """
+    __slots__ = ("player",)
+
     def __init__(self, player: str) -> None:
         self.player = player
 
 @event("退出")
 class QuitEvent(EventBase[str]):
     """ 玩家退出事件 """
+    __slots__ = ("player",)
+
     def __init__(self, player: str) -> None:
         self.player = player
 
 @event("踢出")
 class KickEvent(EventBase[None]):
     """ 踢出事件 """
+    __slots__ = ()
 
 @event("视角变化")
 class ViewForcedEvent(EventBase[int]):
+    __slots__ = ("dx", "dy")
+
     def __init__(self, dx: int, dy: int) -> None:
         self.dx = dx
         self.dy = dy
@@ -85,6 +151,8 @@ class ViewForcedEvent(EventBase[int]):
 @event("视角同步")
 class ViewSyncEvent(EventBase[str]):
     """ 视角同步事件 """
+    __slots__ = ("admin_name",)
+
     def __init__(self, admin_name: str) -> None:
         self.admin_name = admin_name
         """ 哪个管理员同步了我的视角？ """
@@ -92,10 +160,13 @@ class ViewSyncEvent(EventBase[str]):
 @event("断开")
 class DisconnectEvent(EventBase[None]):
     """ 网络层断开事件 """
+    __slots__ = ()
 
 @event("领地邀请")
 class LandInviteEvent(EventBase[str]):
     """ 领地邀请事件 """
+    __slots__ = ("inviter", "land_name")
+
     def __init__(self, inviter: str, land_name: str) -> None:
         self.inviter = inviter
         """ 邀请人 """
@@ -105,27 +176,107 @@ class LandInviteEvent(EventBase[str]):
 @event("挂机")
 class PlayerIdleEvent(EventBase[None]):
     """服务器检测到玩家静止，自动标记为挂机"""
+    __slots__ = ()
 
 @event("挂机恢复")
 class PlayerResumeEvent(EventBase[None]):
     """玩家恢复操作，服务器取消挂机标记"""
+    __slots__ = ()
+
+def _money(raw: str) -> Decimal:
+    """ "1,234.50" -> Decimal("1234.50") """
+    return Decimal(raw.replace(",", ""))
 
 @event("领地存钱")
 class LandDepositEvent(EventBase[str]):
+    __slots__ = ("land_name", "player", "_in_raw", "now_value", "_in_value", "_amount", "_balance")
+
     def __init__(self, land_name: str, player: str, in_value: str, now_value: str):
         self.land_name = land_name
         self.player = player
-        self.in_value = float(in_value.replace(",", ""))
+        self._in_raw = in_value
         self.now_value = now_value
 
+    @derived
+    def in_value(self) -> float:
+        return float(self._in_raw.replace(",", ""))
+
+    @derived
+    def amount(self) -> Decimal:
+        """ 存入金额（精确值） """
+        return _money(self._in_raw)
+
+    @derived
+    def balance(self) -> Decimal:
+        """ 存入后的领地余额（精确值） """
+        return _money(self.now_value)
+
 @event("领地取钱")
 class LandWithdrawEvent(EventBase[str]):
+    __slots__ = ("land_name", "player", "_out_raw", "now_value", "_out_value", "_amount", "_balance")
+
     def __init__(self, land_name: str, player: str, out_value: str, now_value: str):
         self.land_name = land_name
         self.player = player
-        self.out_value = float(out_value.replace(",", ""))
+        self._out_raw = out_value
         self.now_value = now_value
 
+    @derived
+    def out_value(self) -> float:
+        return float(self._out_raw.replace(",", ""))
+
+    @derived
+    def amount(self) -> Decimal:
+        """ 取出金额（精确值，正数） """
+        return _money(self._out_raw)
+
+    @derived
+    def balance(self) -> Decimal:
+        """ 取出后的领地余额（精确值） """
+        return _money(self.now_value)
+
 @event("游戏崩溃")
 class GameCrashedEvent(EventBase[None]):
-    """MC 进程自身抛出 FATAL / 生成 crash-report"""
\ No newline at end of file
+    """MC 进程自身抛出 FATAL / 生成 crash-report"""
+    __slots__ = ()
+
+@event("发言限流")
+class ChatThrottledEvent(EventBase[str]):
+    """ 服务器提示发言/指令太快（防刷屏） """
+    __slots__ = ("_wait_raw", "_wait")
+
+    def __init__(self, wait: str | None = None) -> None:
+        self._wait_raw = wait
+
+    @derived
+    def wait(self) -> float | None:
+        """ 服务器要求等待的秒数，提示里没说为 None """
+        return float(self._wait_raw) if self._wait_raw else None
+
+# ---------------- 微基准：python -m simmc.schemas.event ----------------
+if __name__ == "__main__":
+    import timeit
+    import tracemalloc
+
+    class _DictMessageEvent:
+        """ 旧版写法：实例 __dict__ + 构造时立即查频道表 """
+        def __init__(self, server_name="主服", channel="G", tag="流浪者", player="", content=""):
+            self.server_name = server_name
+            self.channel = CMD_CHANNEL_TABLE.get(channel, "G")
+            self.tag = tag
+            self.player = player
+            self.content = content
+
+    def _measure(factory: Callable[[], Any], n: int = 100_000) -> tuple[float, float]:
+        tracemalloc.start()
+        keep = [factory() for _ in range(n)]
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del keep
+        sec = min(timeit.repeat(factory, number=n, repeat=5))
+        return size / n, sec / n * 1e9
+
+    args = ("主服", "G", "流浪者", "Steve", "hello world")
+    for label, cls in (("dict", _DictMessageEvent), ("slots", MessageEvent)):
+        mem, ns = _measure(lambda: cls(*args))
+        print(f"{label:>6}: {mem:7.1f} B/event  {ns:7.1f} ns/event")
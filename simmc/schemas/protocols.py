@@ -1,6 +1,6 @@
 """ 协议规范 """
 # simmc/schemas/interfaces.py
-from typing import AsyncGenerator, Protocol, TypeVar
+from typing import Any, AsyncGenerator, Protocol, TypeVar
 from .event import EventBase, EventRequest
 
 TEVENT = TypeVar("TEVENT", bound=EventBase, contravariant=True)
@@ -11,4 +11,11 @@ class IListener(Protocol):
 
 class IService(Protocol[TEVENT]):
 
-    async def handle(self, ev: TEVENT) -> None: ...
\ No newline at end of file
+    async def handle(self, ev: TEVENT) -> None: ...
+
+class ISnapshot(Protocol):
+    """ 可热重启的组件：snapshot 返回可 JSON 化的状态，restore 从中恢复 """
+
+    def snapshot(self) -> dict[str, Any]: ...
+
+    def restore(self, state: dict[str, Any]) -> None: ...
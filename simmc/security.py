@@ -12,9 +12,16 @@ def json_export(func: Callable[P, T]) -> Callable[P, T]:
     _ALLOW_METHOD.setdefault(cls_name, set()).add(func.__name__)
     return func
 
+def exported_names(obj: Any) -> set[str]:
+    """ 对象所属类（含基类）在出口白名单里的成员名 """
+    names: set[str] = set()
+    for klass in type(obj).__mro__:
+        names |= _ALLOW_METHOD.get(klass.__name__, set())
+    return names
+
 def _safe_attr(cls: type, name: str) -> Any:
     cls_name = type(cls).__name__          # 也是 str
-    allowed = _ALLOW_METHOD.get(cls_name, set())
+    allowed = exported_names(cls)          # 基类导出的方法子类同样可用
     if name not in allowed:
         raise PermissionError(f"{cls_name}.{name} 未在出口白名单，为了避免安全问题，拒绝执行")
     return getattr(cls, name)
\ No newline at end of file
@@ -3,10 +3,13 @@
 import re
 import uuid
 import asyncio
+from typing import Any
 from ..operation.fluent.base import fire
 from ..operation.fluent.command import chat
 from ..schemas.event import MessageEvent
 from ..utils.logger import logger
+from ..utils.metrics import REGISTRY
+from ..security import json_export
 
 # 前缀 → 频道名
 _PREFIX_MAP: dict[str, str] = {
@@ -20,6 +23,9 @@ _PREFIX_MAP: dict[str, str] = {
 # 预编译正则
 _COMPILED = {re.compile(p): v for p, v in _PREFIX_MAP.items()}
 
+_PROBES = REGISTRY.counter("simmc_channel_probes_total", "频道探针发送次数")
+_PROBE_TIMEOUTS = REGISTRY.counter("simmc_channel_probe_timeouts_total", "频道探针超时次数")
+
 class ChannelEnsureService:
     """只看『自己发的聊天行』来推断当前频道，带探针防止被洪水覆盖"""
 
@@ -55,6 +61,7 @@ class ChannelEnsureService:
             self._current = channel
 
     # -------- 业务代码查询接口 --------
+    @json_export
     async def get_channel(self) -> str:
         """发探针 -> 等探针回来 -> 返回那一刻频道"""
         uid = uuid.uuid4().hex[:4]          # 4 位足够
@@ -63,18 +70,27 @@ class ChannelEnsureService:
             self._pending_probe[uid] = fut
 
         # 发探针：服务器一般会回显“.[uid]”
+        _PROBES.value += 1
         await fire(chat(f"{self._probe_prefix}{uid}"))
 
         try:
             channel = await asyncio.wait_for(fut, self._timeout)
             return channel
         except asyncio.TimeoutError:
+            _PROBE_TIMEOUTS.value += 1
             logger.warning(f"探针 {uid} 超时，用缓存 {self._current}")
             return self._current
         finally:
             async with self._lock:
                 self._pending_probe.pop(uid, None)
 
+    # -------- 热重启快照 --------
+    def snapshot(self) -> dict[str, Any]:
+        return {"current": self._current}
+
+    def restore(self, state: dict[str, Any]) -> None:
+        self._current = state.get("current", self._current)
+
     # -------- 工具：扫行首 --------
     def _parse_channel(self, content: str) -> str:
         for pattern, ch in _COMPILED.items():
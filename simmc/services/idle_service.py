@@ -1,7 +1,12 @@
 
+from typing import Any
 from ..schemas.event import PlayerIdleEvent, PlayerResumeEvent
 from ..operation.fluent.base import jump, fluent_wait
 from ..utils.logger import logger
+from ..security import json_export
+from ..utils.metrics import REGISTRY
+
+_IDLE_DETECTED = REGISTRY.counter("simmc_idle_detected_total", "服务器判定挂机的次数")
 
 class IdleService:
     """ 挂机服务 """
@@ -23,9 +28,11 @@ class IdleService:
             return
         self.detected = True
         self._detected_nums += 1
+        _IDLE_DETECTED.value += 1
         logger.info("服务器检测到我挂机了，跳一跳来避免被踢出...")
         while self.detected:
-            await (jump(3).interval(1).timeout(4) >> fluent_wait(4))
+            # 低优先级 + 合并：不挡住紧急操作，积压时也只跳一次；跳完连着等，中间不让别的操作插进来
+            await (jump(3).interval(1).timeout(4) >> fluent_wait(4)).priority("low").coalesce()
 
     def handle_resume(self, ev: PlayerResumeEvent) -> None:
         if not self.detected:
@@ -33,5 +40,14 @@ class IdleService:
         self.detected = False
         logger.info(f"已经骗过服务器 {self._detected_nums} 次.")
 
+    # --------- 热重启快照 ---------
+    def snapshot(self) -> dict[str, Any]:
+        return {"detected_nums": self._detected_nums}
+
+    def restore(self, state: dict[str, Any]) -> None:
+        # detected 不恢复：跳跃协程已随旧进程结束，等服务器重新判定挂机
+        self._detected_nums = state.get("detected_nums", 0)
+
+    @json_export
     def detect_times(self) -> int:
         return self._detected_nums
\ No newline at end of file
@@ -0,0 +1,115 @@
+""" 领地余额缓存：靠存取钱事件增量维护，过期了才发指令去查 """
+# simmc/services/land_balance.py
+from __future__ import annotations
+import asyncio
+from decimal import Decimal, InvalidOperation
+from dataclasses import dataclass
+from typing import Any, Literal, Optional
+from ..operation.fluent.land import land
+from ..schemas.event import LandDepositEvent, LandWithdrawEvent
+from ..security import json_export
+from ..utils import clock
+from ..utils.conf_injector import Inject
+from ..utils.logger import logger
+from ..utils.metrics import REGISTRY
+
+_LOOKUPS = {
+    result: REGISTRY.counter("simmc_land_balance_lookups_total", "领地余额查询：缓存命中 / 发指令刷新", {"result": result})
+    for result in ("hit", "refresh")
+}
+_DRIFT = REGISTRY.counter("simmc_land_balance_drift_total", "按存取金额推算的余额和服务器报的余额对不上的次数（漏了事件）")
+
+@dataclass(slots=True)
+class LandState:
+    """ 一块领地的缓存状态 """
+    balance: Decimal
+    updated_at: float
+    """ 最后一次更新的时刻（clock.now()） """
+    source: Literal["event", "query", "snapshot"]
+
+@Inject(at={"max_age", "query_timeout"})
+class LandBalanceCache:
+    """
+    领地余额缓存，按领地名索引。
+    收到“领地存钱 / 领地取钱”时直接更新（Decimal 精确计算）：服务器消息里带了变动后的余额，以它为准，
+    同时用 旧余额 ± 变动金额 核对一遍，对不上说明之前漏了事件，记一次 drift。
+    await balance(name) 在缓存新鲜时立即返回；过期或没有时才发 /land balance 并等回执，
+    同一块领地同时只发一次查询，其余调用方等同一个结果。
+    """
+    # 下面配置会自动注入
+    max_age: float = 300.0
+    """ 缓存多久后视为过期（秒） """
+    query_timeout: float = 5.0
+    """ 查询指令等服务器回执的时间（秒） """
+
+    def __init__(self) -> None:
+        self._lands: dict[str, LandState] = {}
+        self._inflight: dict[str, asyncio.Task[Decimal]] = {}
+
+    def peek(self, name: str) -> Optional[LandState]:
+        """ 只看缓存，不发指令（可能已过期） """
+        return self._lands.get(name.strip())
+
+    def is_fresh(self, name: str, max_age: Optional[float] = None) -> bool:
+        state = self._lands.get(name.strip())
+        limit = self.max_age if max_age is None else max_age
+        return state is not None and clock.now() - state.updated_at <= limit
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        """ 让某块（不传则全部）领地的缓存过期，下次 balance() 重新查询；旧值仍可 peek """
+        for key, state in self._lands.items():
+            if name is None or key == name.strip():
+                state.updated_at = float("-inf")
+
+    @json_export
+    async def balance(self, name: str, max_age: Optional[float] = None) -> Decimal:
+        """ 领地余额：缓存新鲜直接返回，否则查询一次 """
+        name = name.strip()
+        if self.is_fresh(name, max_age):
+            _LOOKUPS["hit"].value += 1
+            return self._lands[name].balance
+        task = self._inflight.get(name)
+        if task is None:
+            _LOOKUPS["refresh"].value += 1
+            task = self._inflight[name] = asyncio.ensure_future(self._refresh(name))
+            task.add_done_callback(lambda _: self._inflight.pop(name, None))
+        return await asyncio.shield(task)           # 一个调用方被取消不影响其他人等的结果
+
+    async def _refresh(self, name: str) -> Decimal:
+        sent_at = clock.now()
+        result = await land(name).balance.confirm(self.query_timeout)
+        try:
+            value = Decimal(result.groups["balance"].replace(",", ""))
+        except (KeyError, AttributeError, InvalidOperation):
+            raise ValueError(f"领地 {name} 余额回复无法解析：{result.line}") from None
+        state = self._lands.get(name)
+        if state is not None and state.updated_at > sent_at:    # 等回复期间来了存取钱事件，它更新
+            return state.balance
+        self._lands[name] = LandState(value, clock.now(), "query")
+        logger.debug(f"领地 {name} 余额 {value}（查询）")
+        return value
+
+    def _apply(self, name: str, delta: Decimal, balance: Decimal) -> None:
+        name = name.strip()
+        state = self._lands.get(name)
+        if state is not None and state.source != "snapshot" and state.balance + delta != balance:
+            _DRIFT.value += 1
+            logger.debug(f"领地 {name} 余额推算 {state.balance + delta}，服务器报 {balance}，以服务器为准")
+        self._lands[name] = LandState(balance, clock.now(), "event")
+
+    # --------- 统一的 IService 接口 ---------
+    async def handle(self, ev: LandDepositEvent | LandWithdrawEvent) -> None:
+        if isinstance(ev, LandDepositEvent):
+            self._apply(ev.land_name, ev.amount, ev.balance)
+        elif isinstance(ev, LandWithdrawEvent):
+            self._apply(ev.land_name, -ev.amount, ev.balance)
+
+    # --------- 热重启快照：余额留着可以 peek，但都按过期处理（停机期间可能漏了事件） ---------
+    def snapshot(self) -> dict[str, Any]:
+        return {"balances": {name: str(state.balance) for name, state in self._lands.items()}}
+
+    def restore(self, state: dict[str, Any]) -> None:
+        self._lands = {
+            name: LandState(Decimal(value), float("-inf"), "snapshot")
+            for name, value in state.get("balances", {}).items()
+        }
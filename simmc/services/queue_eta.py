@@ -2,7 +2,7 @@
 import time
 from datetime import timedelta
 from collections import deque
-from typing import Optional
+from typing import Any, Optional
 
 class QueueEtaService:
     """
@@ -39,6 +39,22 @@ class QueueEtaService:
         self.last_dequeued = None
         self.position_history.clear()
 
+    def snapshot(self) -> dict[str, Any]:
+        """热重启快照：历史数据全是 UTC 时间戳，重启后可直接接着用"""
+        return {
+            "service_times": list(self.service_times),
+            "last_dequeued": self.last_dequeued,
+            "position_history": list(self.position_history),
+        }
+
+    def restore(self, state: dict[str, Any]) -> None:
+        """从快照恢复，过期的排队位置在下次 look() 时自然清理"""
+        self.service_times.clear()
+        self.service_times.extend(state.get("service_times", []))
+        last = state.get("last_dequeued")
+        self.last_dequeued = (int(last[0]), float(last[1])) if last else None
+        self.position_history = deque((float(ts), int(q)) for ts, q in state.get("position_history", []))
+
     def _update_service_time(self, current: int, now: float) -> None:
         """
         更新服务时间估计。
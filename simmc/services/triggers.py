@@ -1,15 +1,26 @@
 
 import re
+import time
+import asyncio
 import inspect
-from typing import Any, Callable
-from ..security import _safe_attr
+from functools import cache
+from operator import attrgetter
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable, Optional
+from ..security import _ALLOW_METHOD, _safe_attr
 from ..schemas.event import EventBase
-from ..schemas.event_registry import get_event_name
-from ..operation.fluent.base import fire, jump
+from ..schemas.event_registry import get_event, get_event_name
+from ..operation.fluent.base import FluentBase, fire, jump
 from ..operation.fluent.command import chat, pay
 from ..operation.fluent.land import land
+from ..schedule.coordination import Coordinator
 from ..constants import _TRIGGERS
+from ..utils import clock
+from ..utils.aho_corasick import KeywordMatcher
 from ..utils.logger import logger
+from ..utils.throttle import RateLimit
+from ..utils.window import AggKind, SlidingAggregate
+from ..utils.metrics import REGISTRY, Counter
 
 _CMD_MAP: dict[str, Callable[..., Any]] = {
     "chat": chat,
@@ -18,66 +29,458 @@ _CMD_MAP: dict[str, Callable[..., Any]] = {
     "land": land
 }
 
+_HITS: dict[str, Counter] = {}
+_THROTTLED: dict[str, Counter] = {}
+
+def _hit_counter(name: str) -> Counter:
+    counter = _HITS.get(name)
+    if counter is None:
+        counter = _HITS[name] = REGISTRY.counter("simmc_trigger_hits_total", "触发器命中次数", {"event": name})
+    return counter
+
+def _throttled_counter(reason: str) -> Counter:
+    counter = _THROTTLED.get(reason)
+    if counter is None:
+        counter = _THROTTLED[reason] = REGISTRY.counter("simmc_trigger_throttled_total", "被限流丢弃的触发次数", {"reason": reason})
+    return counter
+
+def apply_chain(fluent: Any, chain: list[list[Any]]) -> Any:
+    """ 按白名单逐步执行链式调用：[["transfer_to", "Alice"], ["accept"]] """
+    for meth, *argv in chain:
+        attr = _safe_attr(fluent, meth)      # 安检
+        if callable(attr):
+            fluent = attr(*argv)                  # 方法调用
+        else:                                     # 属性继续链
+            fluent = attr
+    return fluent
+
+def build_fluent(cmd: str, args: dict[str, Any], chain: list[list[Any]]) -> FluentBase:
+    """ 由 cmd/args/chain 三元组构建流操作（触发器、控制接口共用） """
+    ctor = _CMD_MAP.get(cmd)
+    if not ctor:
+        raise KeyError(f"未知指令: {cmd}")
+    return apply_chain(ctor(**args), chain)
+
+type Predicate = Callable[[EventBase], bool]
+
+_TARGET_METHODS = frozenset({"transfer_to", "sendto", "add", "remove"})
+""" 链上这些方法的第一个参数视为动作对象（玩家） """
+_ACTOR_FIELDS = ("player", "sender", "inviter", "admin_name")
+""" 链上没写死对象时，按事件里的这些字段确定动作对象 """
+
+@dataclass(slots=True, frozen=True)
+class WindowSpec:
+    """ 滑动窗口聚合条件：by 分组内 sec 秒的 agg(field) 落在 [min, max] 才算命中 """
+    sec: float
+    agg: AggKind
+    by: Callable[[EventBase], Hashable]
+    value: Callable[[EventBase], Any]
+    min: Optional[float]
+    max: Optional[float]
+    buckets: int
+    max_keys: int
+
+    def new_state(self) -> SlidingAggregate:
+        return SlidingAggregate(self.agg, self.sec, self.buckets, self.max_keys)
+
+    def check(self, state: SlidingAggregate, ev: EventBase) -> bool:
+        got = state.observe(self.by(ev), self.value(ev))
+        return (self.min is None or got >= self.min) and (self.max is None or got <= self.max)
+
+@dataclass(slots=True, frozen=True)
+class CompiledTrigger:
+    """ 加载期编译好的一条触发器 """
+    index: int
+    """ 在 TRIGGERS 配置里的下标（协同认领的盐） """
+    on: str
+    cmd: str
+    ctor: Callable[..., Any]
+    args: dict[str, Any]
+    fill: tuple[str, ...]
+    """ 需要从事件补齐的构造器参数（签名已在加载期解析） """
+    chain: tuple[tuple[str, tuple[Any, ...]], ...]
+    predicates: tuple[Predicate, ...]
+    keywords: tuple[tuple[str, tuple[str, ...]], ...]
+    """ kw: 条件（字段, 关键词），由所在事件的共享自动机统一匹配 """
+    coord: str
+    target: Callable[[EventBase], Optional[str]]
+    """ 动作对象：同一对象的动作按顺序执行，不同对象并发 """
+    limit: Optional[dict[str, Any]]
+    """ 限流配置（已校验），每个服务实例各自建 RateLimit """
+    limit_key: Callable[[EventBase], Hashable]
+    """ 限流按哪个键分别计数，默认整条规则共用一个键 """
+    windows: tuple[WindowSpec, ...]
+    """ 滑动窗口条件，在无状态条件都满足之后才记入并判断 """
+
+    def matches(self, ev: EventBase, kw_hits: dict[str, set[int]]) -> bool:
+        for field, _ in self.keywords:
+            if self.index not in kw_hits[field]:
+                return False
+        for pred in self.predicates:
+            if not pred(ev):
+                return False
+        return True
+
+    def build(self, ev: EventBase) -> FluentBase:
+        args = self.args
+        if self.fill:
+            args = args.copy()
+            for name in self.fill:
+                args[name] = getattr(ev, name)
+        fluent = self.ctor(**args)
+        for meth, argv in self.chain:
+            attr = _safe_attr(fluent, meth)       # 运行期仍然过安检，名字已在加载期校验
+            fluent = attr(*argv) if callable(attr) else attr
+        return fluent
+
+def _compile_predicate(event_cls: type[EventBase], field: str, expect: Any) -> Predicate:
+    """ 字段=值 / 字段=[值列表] / 字段="re:正则"，事件没有的字段按 None 比较 """
+    if field in event_cls.FIELDS:
+        get: Callable[[EventBase], Any] = attrgetter(field)
+    else:
+        get = lambda ev: None
+    if isinstance(expect, list):
+        try:
+            choices: Any = frozenset(expect)
+        except TypeError:                     # 列表里有不可哈希的值
+            choices = tuple(expect)
+        return lambda ev: get(ev) in choices
+    if isinstance(expect, str) and expect.startswith("re:"):
+        try:
+            search = re.compile(expect[3:]).search
+        except re.error as exc:
+            raise ValueError(f"正则 {expect[3:]!r} 无效: {exc}") from None
+        return lambda ev: search(str(get(ev))) is not None
+    return lambda ev: get(ev) == expect
+
+def _field_text(event_cls: type[EventBase], field: str) -> Callable[[EventBase], str]:
+    """ kw: 条件取字段文本，事件没有的字段当作空串 """
+    if field not in event_cls.FIELDS:
+        return lambda ev: ""
+    get = attrgetter(field)
+    return lambda ev: str(get(ev) or "")
+
+def _compile_window(event_cls: type[EventBase], on: str, cfg: dict[str, Any]) -> WindowSpec:
+    """ {"sec": 600, "by": "player", "agg": "sum", "field": "in_value", "min": 1000} """
+    unknown = set(cfg) - {"sec", "by", "agg", "field", "min", "max", "buckets", "max_keys"}
+    if unknown:
+        raise ValueError(f"未知窗口项: {sorted(unknown)}")
+    agg = cfg.get("agg", "count")
+    if agg not in ("count", "sum", "distinct"):
+        raise ValueError(f"未知聚合: {agg}")
+    if "min" not in cfg and "max" not in cfg:
+        raise ValueError("窗口条件至少要有 min 或 max")
+
+    def getter(name: Optional[str], what: str) -> Callable[[EventBase], Any]:
+        if name is None:
+            return lambda ev: None
+        if name not in event_cls.FIELDS:
+            raise KeyError(f"{what} {name} 不是事件<{on}>的字段")
+        return attrgetter(name)
+
+    if agg != "count" and "field" not in cfg:
+        raise ValueError(f"{agg} 聚合需要 field")
+    value = getter(cfg.get("field"), "聚合字段") if agg != "count" else (lambda ev: 1.0)
+    return WindowSpec(
+        sec=float(cfg["sec"]),
+        agg=agg,
+        by=getter(cfg.get("by"), "分组字段"),
+        value=value,
+        min=cfg.get("min"),
+        max=cfg.get("max"),
+        buckets=int(cfg.get("buckets", 60)),
+        max_keys=int(cfg.get("max_keys", 1024)),
+    )
+
+def _compile_target(event_cls: type[EventBase], chain: tuple[tuple[str, tuple[Any, ...]], ...]) -> Callable[[EventBase], Optional[str]]:
+    for meth, argv in chain:
+        if meth in _TARGET_METHODS and argv and isinstance(argv[0], str):
+            player = argv[0]
+            return lambda ev: player
+    for field in _ACTOR_FIELDS:
+        if field in event_cls.FIELDS:
+            return attrgetter(field)
+    return lambda ev: None
+
+def _compile_rule(index: int, rule: dict[str, Any]) -> CompiledTrigger:
+    on = rule["on"]
+    event_cls = get_event(on)
+    if event_cls is None:
+        raise KeyError(f"事件 {on} 未注册")
+    cmd = rule["do"]["cmd"]
+    ctor = _CMD_MAP.get(cmd)
+    if not ctor:
+        raise KeyError(f"未知指令: {cmd}")
+
+    args = dict(rule["do"].get("args", {}))
+    # ⭐ 关键：构造器要求、用户没给、事件里刚好有的字段，运行时自动补
+    fill = tuple(
+        name for name in inspect.signature(ctor).parameters
+        if name not in args and name in event_cls.FIELDS
+    )
+
+    exported = set().union(*_ALLOW_METHOD.values())
+    chain: list[tuple[str, tuple[Any, ...]]] = []
+    for meth, *argv in rule["do"].get("chain", []):
+        if meth not in exported:
+            raise PermissionError(f"{meth} 未在出口白名单，为了避免安全问题，拒绝加载")
+        chain.append((meth, tuple(argv)))
+
+    predicates: list[Predicate] = []
+    keywords: list[tuple[str, tuple[str, ...]]] = []
+    for field, expect in rule.get("when", {}).items():
+        if isinstance(expect, str) and expect.startswith("kw:"):
+            kws = tuple(kw for kw in expect[3:].split("|") if kw)
+            if not kws:
+                raise ValueError(f"{field} 的 kw: 条件没有关键词")
+            keywords.append((field, kws))
+        else:
+            predicates.append(_compile_predicate(event_cls, field, expect))
+
+    limit = rule.get("limit")
+    limit_key: Callable[[EventBase], Hashable] = lambda ev: None
+    if limit is not None:
+        RateLimit.from_config(limit)          # 加载期校验
+        key_field = limit.get("key")
+        if key_field is not None:
+            if key_field not in event_cls.FIELDS:
+                raise KeyError(f"限流键 {key_field} 不是事件<{on}>的字段")
+            limit_key = attrgetter(key_field)
+
+    windows = rule.get("window", [])
+    if isinstance(windows, dict):
+        windows = [windows]
+
+    return CompiledTrigger(
+        index=index,
+        on=on,
+        cmd=cmd,
+        ctor=ctor,
+        args=args,
+        fill=fill,
+        chain=tuple(chain),
+        predicates=tuple(predicates),
+        keywords=tuple(keywords),
+        coord=rule.get("coord", "claim"),
+        target=_compile_target(event_cls, tuple(chain)),
+        limit=limit,
+        limit_key=limit_key,
+        windows=tuple(_compile_window(event_cls, on, w) for w in windows),
+    )
+
+@dataclass(slots=True, frozen=True)
+class TriggerGroup:
+    """ 同一事件名下的全部触发器，以及按字段共享的关键词自动机 """
+    plain: tuple[CompiledTrigger, ...]
+    """ 没有 kw: 条件的触发器，每个事件都要逐条判断 """
+    keyed: dict[int, CompiledTrigger]
+    """ 有 kw: 条件的触发器，只有自动机命中时才会被取出来判断 """
+    matchers: tuple[tuple[str, Callable[[EventBase], str], KeywordMatcher[int]], ...]
+    """ (字段, 取字段文本, 自动机)：自动机标签是触发器下标 """
+
+    def match(self, ev: EventBase) -> list[CompiledTrigger]:
+        """ 命中的触发器，按配置顺序 """
+        if not self.matchers:
+            return [trig for trig in self.plain if trig.matches(ev, {})]
+        # 每个字段只扫描一遍文本，得到所有 kw: 条件成立的触发器
+        kw_hits = {field: matcher.find(text(ev)) for field, text, matcher in self.matchers}
+        candidates = list(self.plain)
+        candidates.extend(self.keyed[i] for i in set().union(*kw_hits.values()))
+        hits = [trig for trig in candidates if trig.matches(ev, kw_hits)]
+        hits.sort(key=attrgetter("index"))
+        return hits
+
+    @classmethod
+    def of(cls, triggers: list[CompiledTrigger]) -> "TriggerGroup":
+        event_cls = get_event(triggers[0].on)
+        assert event_cls is not None
+        matchers: dict[str, KeywordMatcher[int]] = {}
+        for trig in triggers:
+            for field, kws in trig.keywords:
+                matcher = matchers.setdefault(field, KeywordMatcher())
+                for kw in kws:
+                    matcher.add(kw, trig.index)
+        return cls(
+            plain=tuple(trig for trig in triggers if not trig.keywords),
+            keyed={trig.index: trig for trig in triggers if trig.keywords},
+            matchers=tuple((f, _field_text(event_cls, f), m.build()) for f, m in matchers.items()),
+        )
+
+def compile_triggers(rules: list[dict[str, Any]]) -> dict[str, TriggerGroup]:
+    """ 把一组触发器配置编译成 事件名 -> 触发器 的索引，非法规则告警后丢弃 """
+    index: dict[str, list[CompiledTrigger]] = {}
+    for i, rule in enumerate(rules):
+        try:
+            trig = _compile_rule(i, rule)
+        except (KeyError, TypeError, ValueError, PermissionError) as exc:
+            logger.warning(f"触发器 #{i} ({rule.get('comment', rule.get('on'))}) 无效，已忽略: {exc}")
+            continue
+        index.setdefault(trig.on, []).append(trig)
+    logger.success(f"触发器编译完成，共 {sum(map(len, index.values()))} 条，覆盖事件 {len(index)} 种")
+    return {name: TriggerGroup.of(trigs) for name, trigs in index.items()}
+
+@cache
+def compiled_triggers() -> dict[str, TriggerGroup]:
+    """ config.json 里的 TRIGGERS，进程内只编译一次 """
+    return compile_triggers(_TRIGGERS)
+
 class JsonTriggerService:
-    """纯配置化触发器服务，挂载即生效"""
+    """
+    纯配置化触发器服务，挂载即生效
+
+    同一事件命中的多条规则并发执行；动作对象相同（同一玩家）的动作严格按命中顺序执行。
+    """
+
+    def __init__(
+        self,
+        coordinator: Optional[Coordinator] = None,
+        triggers: Optional[list[dict[str, Any]]] = None,
+    ) -> None:
+        """ triggers 不传时使用 config.json 的 TRIGGERS（回测时传入待验证的规则） """
+        self._coord = coordinator
+        self._index = compiled_triggers() if triggers is None else compile_triggers(triggers)
+        self._tails: dict[str, asyncio.Future[None]] = {}
+        """ 动作对象 -> 该对象最后一个动作的完成信号 """
+        self._limits: dict[int, RateLimit] = {
+            trig.index: RateLimit.from_config(trig.limit)
+            for group in self._index.values()
+            for trig in (*group.plain, *group.keyed.values())
+            if trig.limit is not None
+        }
+        self._windows: dict[int, list[tuple[WindowSpec, SlidingAggregate]]] = {
+            trig.index: [(spec, spec.new_state()) for spec in trig.windows]
+            for group in self._index.values()
+            for trig in (*group.plain, *group.keyed.values())
+            if trig.windows
+        }
+        self._rules: dict[int, str] = {
+            trig.index: f"{trig.on}:{trig.cmd}"
+            for group in self._index.values()
+            for trig in (*group.plain, *group.keyed.values())
+        }
+        """ 下标 -> 规则签名，恢复快照时核对，规则改过的不套用旧状态 """
 
     async def handle(self, ev: EventBase) -> None:
         name = get_event_name(ev)
         if not name:
             return
+        group = self._index.get(name)
+        if group is None:
+            return
 
-        for rule in _TRIGGERS:
-            if rule["on"] != name or not self._match_when(ev, rule["when"]):
-                continue
+        hits = [
+            trig for trig in group.match(ev)
+            if self._in_window(trig, ev) and self._admit(trig, ev, name)
+        ]
+        if not hits:
+            return
+        runs = [self._run(trig, ev, name) for trig in hits]
+        if len(runs) == 1:
+            await runs[0]
+            return
+        results = await asyncio.gather(*runs, return_exceptions=True)
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors:
+            raise errors[0]
 
-            cmd = rule["do"]["cmd"]
-            args = rule["do"].get("args", {})
-            ctor = _CMD_MAP.get(cmd)
-            if not ctor:
-                logger.warning(f"未知指令: {cmd}")
-                continue
+    def _in_window(self, trig: CompiledTrigger, ev: EventBase) -> bool:
+        """ 窗口条件：每个窗口都先记入本事件再判断（不短路，保证各窗口计数一致） """
+        windows = self._windows.get(trig.index)
+        if windows is None:
+            return True
+        ok = True
+        for spec, state in windows:
+            ok = spec.check(state, ev) and ok
+        return ok
+
+    def _admit(self, trig: CompiledTrigger, ev: EventBase, name: str) -> bool:
+        """ 限流检查：冷却 / 令牌桶 / 去重 / 在途上限，不通过的直接丢弃，不进入操作队列 """
+        limit = self._limits.get(trig.index)
+        if limit is None:
+            return True
+        reason = limit.try_acquire(trig.limit_key(ev), tuple(ev.as_dict().values()))
+        if reason is None:
+            return True
+        _throttled_counter(reason).value += 1
+        logger.debug(f"事件<{name}> 触发器 #{trig.index} 被限流({reason})，丢弃")
+        return False
 
-            # ⭐ 关键：自动补缺失字段
-            args = self._fill_missing_args(ctor, args, ev)
-            logger.trace(f"事件<{name}> 缺少字段自动填入: {cmd}({args})")
-            fluent = ctor(**args)
-            for meth, *argv in rule["do"]["chain"]:
-                attr = _safe_attr(fluent, meth)      # 安检
-                if callable(attr):
-                    fluent = attr(*argv)                  # 方法调用
-                else:                                     # 属性继续链
-                    fluent = attr
-
-            logger.info(f"事件<{name}> 命中 -> {cmd}({args})")
+    def _run(self, trig: CompiledTrigger, ev: EventBase, name: str) -> Any:
+        """ 同步地排进该动作对象的队尾（保证命中顺序），返回可等待的执行协程 """
+        key = trig.target(ev)
+        if key is None:
+            return self._fire(trig, ev, name, None)
+        prev = self._tails.get(key)
+        done: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._tails[key] = done
+        return self._fire(trig, ev, name, prev, done, key)
+
+    async def _fire(
+        self,
+        trig: CompiledTrigger,
+        ev: EventBase,
+        name: str,
+        prev: Optional[asyncio.Future[None]],
+        done: Optional[asyncio.Future[None]] = None,
+        key: Optional[str] = None,
+    ) -> None:
+        try:
+            if prev is not None and not prev.done():
+                await asyncio.shield(prev)
+            fluent = trig.build(ev)
+            if not await self._acquire(trig, ev):
+                return
+            logger.info(f"事件<{name}> 命中 -> {trig.cmd}({trig.args}) 对象: {key}")
+            _hit_counter(name).value += 1
             await fire(fluent)
+        finally:
+            limit = self._limits.get(trig.index)
+            if limit is not None:
+                limit.release()
+            if done is not None:
+                done.set_result(None)
+                if self._tails.get(key) is done:   # type: ignore[arg-type]
+                    del self._tails[key]           # type: ignore[arg-type]
 
-    # ---------- 工具 ----------
-    def _match_when(self, ev: EventBase, cond: dict[str, Any]) -> bool:
-        """支持字段=值 或 字段=[值列表]；可扩展正则、范围"""
-        ev_dict = ev.__dict__
-        for k, v in cond.items():
-            ev_val = ev_dict.get(k)
-            if isinstance(v, list):
-                if ev_val not in v:
-                    return False
-            elif isinstance(v, str) and v.startswith("re:"):
-                if not re.search(v[3:], str(ev_val)):
-                    return False
-            else:
-                if ev_val != v:
-                    return False
-        return True
+    # --------- 热重启快照：冷却 / 令牌桶 / 去重 / 窗口计数，停机时长照样算进过期 ---------
+    def snapshot(self) -> dict[str, Any]:
+        now = clock.now()
+        return {
+            "wall": time.time(),
+            "limits": {
+                str(i): {"rule": self._rules[i], "state": limit.dump(now)} for i, limit in self._limits.items()
+            },
+            "windows": {
+                str(i): {"rule": self._rules[i], "state": [agg.dump(now) for _, agg in windows]}
+                for i, windows in self._windows.items()
+            },
+        }
 
-    def _fill_missing_args(self, ctor: Callable, args: dict, ev: EventBase) -> dict:
+    def restore(self, state: dict[str, Any]) -> None:
+        now = clock.now()
+        elapsed = max(0.0, time.time() - state.get("wall", time.time()))
+        for i, saved in state.get("limits", {}).items():
+            limit = self._limits.get(int(i))
+            if limit is not None and self._rules.get(int(i)) == saved["rule"]:
+                limit.load(saved["state"], now, elapsed)
+        for i, saved in state.get("windows", {}).items():
+            windows = self._windows.get(int(i))
+            if windows is None or self._rules.get(int(i)) != saved["rule"] or len(windows) != len(saved["state"]):
+                continue
+            for (_, agg), entries in zip(windows, saved["state"]):
+                agg.load(entries, now, elapsed)
+
+    async def _acquire(self, trig: CompiledTrigger, ev: EventBase) -> bool:
         """
-        用事件字段补全 args 里缺位的构造器参数。
-        仅补“关键字同名且当前为 None / 缺失”的字段。
+        多实例协同（未配置 coordinator 时总是放行）：
+        - "coord": "claim"（默认）同一事件只由最先认领的实例执行
+        - "coord": "leader" 只有该指令类别的 leader 执行
+        - "coord": "none" 各实例都执行
         """
-        sig = inspect.signature(ctor)
-        ev_dict = ev.__dict__
-        filled = args.copy()
-        for name, param in sig.parameters.items():
-            # 构造器要求、用户没给、事件里刚好有，就自动补
-            if name not in filled and name in ev_dict:
-                filled[name] = ev_dict[name]
-        return filled
\ No newline at end of file
+        if self._coord is None:
+            return True
+        if trig.coord == "leader":
+            return await self._coord.is_leader(trig.cmd)
+        if trig.coord == "claim":
+            return await self._coord.claim_event(ev, salt=str(trig.index))
+        return True
@@ -0,0 +1,89 @@
+""" 多关键词匹配（Aho-Corasick） """
+
+# simmc/utils/aho_corasick.py
+from collections import deque
+from typing import Generic, Hashable, Iterable, Self, TypeVar
+
+T = TypeVar("T", bound=Hashable)
+
+class KeywordMatcher(Generic[T]):
+    """
+    把任意多个关键词编译成一个自动机，扫一遍文本就得到命中的全部标签，
+    耗时只和文本长度有关，和关键词数量无关。
+
+    例：
+        m = KeywordMatcher[int]()
+        m.add("跳一跳", 0).add("在", 0).add("V我", 1)
+        m.find("在吗 V我50")  # -> {0, 1}
+    """
+
+    def __init__(self) -> None:
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[frozenset[T]] = [frozenset()]
+        self._pending: list[set[T]] = [set()]
+        self._built = True
+
+    @classmethod
+    def of(cls, keywords: Iterable[str], tag: T) -> Self:
+        """ 所有关键词同一个标签，只关心“有没有命中” """
+        matcher = cls()
+        for kw in keywords:
+            matcher.add(kw, tag)
+        return matcher.build()
+
+    def add(self, keyword: str, tag: T) -> Self:
+        """ 登记关键词及其标签，同一个标签可以对应多个关键词 """
+        if not keyword:
+            raise ValueError("关键词不能为空")
+        state = 0
+        for ch in keyword:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(frozenset())
+                self._pending.append(set())
+            state = nxt
+        self._pending[state].add(tag)
+        self._built = False
+        return self
+
+    def build(self) -> Self:
+        """ BFS 计算失配指针，并把失配链上的输出合并到每个状态 """
+        outs: list[set[T]] = [set(p) for p in self._pending]
+        queue: deque[int] = deque(self._goto[0].values())
+        for s in queue:
+            self._fail[s] = 0
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                queue.append(nxt)
+            outs[state] |= outs[self._fail[state]]
+        self._out = [frozenset(o) for o in outs]
+        self._built = True
+        return self
+
+    def find(self, text: str) -> set[T]:
+        """ 扫描一遍文本，返回命中关键词的标签集合 """
+        if not self._built:
+            self.build()
+        goto, fail, out = self._goto, self._fail, self._out
+        found: set[T] = set()
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found |= out[state]
+        return found
+
+    def __bool__(self) -> bool:
+        return len(self._goto) > 1
@@ -0,0 +1,46 @@
+""" 可替换时钟 """
+
+# simmc/utils/clock.py
+import threading
+from time import monotonic
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+_source: Callable[[], float] = monotonic
+
+def now() -> float:
+    """ 限流、窗口等有状态条件使用的当前时间（秒），默认单调时钟 """
+    return _source()
+
+@contextmanager
+def use_clock(source: Callable[[], float]) -> Iterator[None]:
+    """ 临时替换时钟，例如回测时按日志里的时间推进 """
+    global _source
+    prev, _source = _source, source
+    try:
+        yield
+    finally:
+        _source = prev
+
+class VirtualClock:
+    """
+    手动推进的时钟，实例本身可调用，可直接交给 use_clock。
+    回测按日志时间 set，虚拟输入后端按动作耗时 advance。
+    """
+
+    def __init__(self, start: float = 0.0) -> None:
+        self._t = start
+        self._lock = threading.Lock()
+
+    def __call__(self) -> float:
+        return self._t
+
+    def advance(self, sec: float) -> float:
+        """ 向前推进 sec 秒，返回推进后的时间 """
+        with self._lock:
+            self._t += sec
+            return self._t
+
+    def set(self, t: float) -> None:
+        with self._lock:
+            self._t = t
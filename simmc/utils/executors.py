@@ -0,0 +1,109 @@
+""" 按负载分类的具名线程池，带排队/执行耗时指标 """
+
+# simmc/utils/executors.py
+import os
+import atexit
+import threading
+from time import perf_counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, TypeVar
+from .metrics import REGISTRY
+
+T = TypeVar("T")
+
+@dataclass(slots=True)
+class ExecutorStats:
+    """ 线程池运行统计 """
+    workers: int
+    queued: int = 0
+    """ 已提交、还没开始执行的任务数 """
+    running: int = 0
+    completed: int = 0
+    wait_total: float = 0.0
+    """ 已开始任务的总排队时间（秒） """
+    run_total: float = 0.0
+    """ 已完成任务的总执行时间（秒） """
+
+class InstrumentedExecutor(ThreadPoolExecutor):
+    """ 记录每个任务排队多久、跑了多久的线程池，可以直接交给 loop.run_in_executor """
+
+    def __init__(self, name: str, max_workers: int) -> None:
+        super().__init__(max_workers=max_workers, thread_name_prefix=f"{name.capitalize()}Thread")
+        self.name = name
+        self.stats = ExecutorStats(max_workers)
+        self._lock = threading.Lock()
+        labels = {"executor": name}
+        self._wait_hist = REGISTRY.histogram("simmc_executor_wait_seconds", "任务在线程池里排队的时间", labels)
+        self._run_hist = REGISTRY.histogram("simmc_executor_run_seconds", "任务在线程池里的执行时间", labels)
+        REGISTRY.gauge("simmc_executor_queued", "线程池里排队中的任务数", labels, fn=lambda: self.stats.queued)
+        REGISTRY.gauge("simmc_executor_running", "线程池里执行中的任务数", labels, fn=lambda: self.stats.running)
+
+    def submit(self, fn: Callable[..., T], /, *args: Any, **kwargs: Any) -> Future[T]:
+        enqueued = perf_counter()
+        stats = self.stats
+
+        def call() -> T:
+            started = perf_counter()
+            with self._lock:
+                stats.queued -= 1
+                stats.running += 1
+                stats.wait_total += started - enqueued
+            self._wait_hist.observe(started - enqueued)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                cost = perf_counter() - started
+                self._run_hist.observe(cost)
+                with self._lock:
+                    stats.running -= 1
+                    stats.completed += 1
+                    stats.run_total += cost
+
+        with self._lock:
+            stats.queued += 1
+        try:
+            return super().submit(call)
+        except BaseException:
+            with self._lock:
+                stats.queued -= 1
+            raise
+
+_CPUS = os.cpu_count() or 2
+
+_WORKERS: dict[str, int] = {
+    "input": 1,                           # 键鼠输入：单线程，严格按提交顺序
+    "cpu": max(1, _CPUS // 2),            # OCR / 截图 / 图像处理
+    "general": min(32, _CPUS + 4),        # 同步事件处理器、文件读写等
+    "journal": 1,                         # 需要 fsync 的追加日志：单线程，行按提交顺序落盘
+}
+
+_EXECUTORS: dict[str, InstrumentedExecutor] = {}
+_CREATE_LOCK = threading.Lock()
+
+def get_executor(name: str) -> InstrumentedExecutor:
+    """ 按名字取线程池，第一次使用时创建；未登记的名字按 1 个线程创建 """
+    pool = _EXECUTORS.get(name)
+    if pool is None:
+        with _CREATE_LOCK:
+            pool = _EXECUTORS.get(name)
+            if pool is None:
+                pool = _EXECUTORS[name] = InstrumentedExecutor(name, _WORKERS.get(name, 1))
+    return pool
+
+def configure_executor(name: str, workers: int) -> None:
+    """ 在第一次使用前调整线程数；input 必须是单线程 """
+    if name == "input" and workers != 1:
+        raise ValueError("input 线程池必须是单线程，否则输入顺序无法保证")
+    if name in _EXECUTORS:
+        raise RuntimeError(f"线程池 {name} 已经创建，不能再改线程数")
+    _WORKERS[name] = workers
+
+def executor_stats() -> dict[str, ExecutorStats]:
+    """ 已创建线程池的统计 """
+    return {name: pool.stats for name, pool in _EXECUTORS.items()}
+
+@atexit.register
+def _shutdown() -> None:
+    for pool in list(_EXECUTORS.values()):
+        pool.shutdown(wait=True)
@@ -1,26 +1,7 @@
-
-import sys
+""" 前台窗口标题（兼容旧接口，实际由 window_focus 的跟踪器缓存） """
+# simmc/utils/find_window.py
 from typing import Optional
+from .window_focus import get_window_tracker
 
-if sys.platform == "win32":
-    import win32gui
-
-    def get_foreground_title() -> Optional[str]:
-        hwnd = win32gui.GetForegroundWindow()
-        return win32gui.GetWindowText(hwnd) if hwnd else None
-
-elif sys.platform == "Darwin":
-    from AppKit import NSWorkspace
-
-    def get_foreground_title() -> Optional[str]:
-        app = NSWorkspace.sharedWorkspace().frontmostApplication()
-        return app.localizedName() if app else None
-
-else:  # Linux X11
-    def get_foreground_title() -> Optional[str]:
-        import subprocess, shlex
-        cmd = "xdotool getwindowfocus getwindowname"
-        try:
-            return subprocess.check_output(cmd, shell=True, text=True).strip()
-        except Exception:
-            return None
\ No newline at end of file
+def get_foreground_title() -> Optional[str]:
+    return get_window_tracker().foreground_title()
@@ -1,26 +1,53 @@
 """ 函数工具 """
 
-import asyncio, contextvars, functools, atexit
-from concurrent.futures import Executor, ThreadPoolExecutor
-from typing import Callable, TypeVar, ParamSpec, Optional, Coroutine
+import asyncio, contextvars, functools
+from concurrent.futures import Executor
+from typing import Callable, TypeVar, ParamSpec, Optional, Coroutine, overload
 from functools import partial
+from .executors import get_executor
 
 P = ParamSpec("P")
 T = TypeVar("T")
 
-_default_pool = ThreadPoolExecutor(thread_name_prefix="AsyncThread")
-atexit.register(_default_pool.shutdown, wait=True)
+type AsyncFn[**P, T] = Callable[P, Coroutine[None, None, T]]
 
+@overload
 def sync_to_async(
     fn: Callable[P, T],
     *,
-    executor: Optional[Executor] = None,
+    executor: Executor | str = "general",
     force_thread: bool = True,
-) -> Callable[P, Coroutine[None, None, T]]:
+    propagate_context: bool = True,
+) -> AsyncFn[P, T]: ...
+
+@overload
+def sync_to_async(
+    fn: None = None,
+    *,
+    executor: Executor | str = "general",
+    force_thread: bool = True,
+    propagate_context: bool = True,
+) -> Callable[[Callable[P, T]], AsyncFn[P, T]]: ...
+
+def sync_to_async(
+    fn: Optional[Callable[P, T]] = None,
+    *,
+    executor: Executor | str = "general",
+    force_thread: bool = True,
+    propagate_context: bool = True,
+) -> AsyncFn[P, T] | Callable[[Callable[P, T]], AsyncFn[P, T]]:
+    """
+    把同步函数包装成协程，丢到线程池里跑。
+    :param executor: 线程池或其名字（见 utils/executors.py）：input 键鼠输入（单线程、严格有序），
+                     cpu OCR/截图等重活，general 其它（默认）
+    :param propagate_context: 把调用方的 contextvars 带进线程；不依赖上下文的热路径可以关掉省一次拷贝
+
+    既可以直接用 `@sync_to_async`，也可以带参数 `@sync_to_async(executor="cpu")`
+    """
+    if fn is None:
+        return partial(sync_to_async, executor=executor, force_thread=force_thread, propagate_context=propagate_context)  # type: ignore[return-value]
     if asyncio.iscoroutinefunction(fn):
         raise TypeError("fn must be a synchronous callable")
-    if executor is None:
-        executor = _default_pool
 
     if not force_thread:                       # 快速路径
         @functools.wraps(fn)
@@ -28,14 +55,19 @@ def sync_to_async(
             return fn(*args, **kwargs)
         return wrapper
 
+    pool: Optional[Executor] = None if isinstance(executor, str) else executor
+
     @functools.wraps(fn)
     async def wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
+        nonlocal pool
+        if pool is None:                       # 具名线程池第一次调用时才创建
+            pool = get_executor(executor)      # type: ignore[arg-type]
         loop = asyncio.get_running_loop()
-        ctx = contextvars.copy_context()
-        func_invoke = partial(ctx.run, fn, *args, **kwargs)
-        return await loop.run_in_executor(
-            executor, func_invoke
-        )
+        if propagate_context:
+            func_invoke = partial(contextvars.copy_context().run, fn, *args, **kwargs)
+        else:
+            func_invoke = partial(fn, *args, **kwargs)
+        return await loop.run_in_executor(pool, func_invoke)
 
     # 补全 qualname
     wrapper.__qualname__ = getattr(fn, "__qualname__", fn.__name__)
@@ -0,0 +1,178 @@
+""" 轻量指标注册表 + Prometheus 文本端点 """
+
+# simmc/utils/metrics.py
+import asyncio
+from bisect import bisect_left
+from typing import Callable, Optional
+from .conf_injector import Inject
+from .logger import logger
+
+type LabelKey = tuple[tuple[str, str], ...]
+
+# 默认直方图分桶（秒），覆盖按键 ~ OCR 的耗时量级
+DEFAULT_BUCKETS: tuple[float, ...] = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Counter:
+    """ 单调计数器，热路径直接 `c.value += 1` """
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value: float = 0
+
+    def inc(self, n: float = 1) -> None:
+        self.value += n
+
+class Gauge:
+    """ 仪表：可以直接写 value，也可以给 fn 在采集时现算 """
+    __slots__ = ("value", "fn")
+
+    def __init__(self, fn: Optional[Callable[[], float]] = None) -> None:
+        self.value: float = 0
+        self.fn = fn
+
+    def set(self, v: float) -> None:
+        self.value = v
+
+    def read(self) -> float:
+        return self.fn() if self.fn is not None else self.value
+
+class Histogram:
+    """ 固定分桶直方图 """
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)     # 最后一格是 +Inf
+        self.sum: float = 0.0
+        self.count: int = 0
+
+    def observe(self, v: float) -> None:
+        self.counts[bisect_left(self.bounds, v)] += 1
+        self.sum += v
+        self.count += 1
+
+type Metric = Counter | Gauge | Histogram
+
+class _Family:
+    """ 同名指标族（不同标签的子指标共享 HELP/TYPE） """
+    __slots__ = ("name", "help", "kind", "children")
+
+    def __init__(self, name: str, help: str, kind: str) -> None:
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.children: dict[LabelKey, Metric] = {}
+
+class MetricsRegistry:
+    """ 指标注册表：同名同标签重复注册会拿到同一个对象 """
+
+    def __init__(self) -> None:
+        self._families: dict[str, _Family] = {}
+
+    def _get(self, name: str, help: str, kind: str, labels: dict[str, str] | None, factory: Callable[[], Metric]) -> Metric:
+        family = self._families.get(name)
+        if family is None:
+            family = self._families[name] = _Family(name, help, kind)
+        elif family.kind != kind:
+            raise ValueError(f"指标 {name} 已注册为 {family.kind}，不能再注册为 {kind}")
+        key: LabelKey = tuple(sorted((k, str(v)) for k, v in (labels or {}).items()))
+        metric = family.children.get(key)
+        if metric is None:
+            metric = family.children[key] = factory()
+        return metric
+
+    def counter(self, name: str, help: str, labels: dict[str, str] | None = None) -> Counter:
+        return self._get(name, help, "counter", labels, Counter)  # type: ignore[return-value]
+
+    def gauge(self, name: str, help: str, labels: dict[str, str] | None = None, fn: Optional[Callable[[], float]] = None) -> Gauge:
+        gauge = self._get(name, help, "gauge", labels, Gauge)
+        if fn is not None:
+            gauge.fn = fn  # type: ignore[union-attr]
+        return gauge  # type: ignore[return-value]
+
+    def histogram(self, name: str, help: str, labels: dict[str, str] | None = None, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get(name, help, "histogram", labels, lambda: Histogram(buckets))  # type: ignore[return-value]
+
+    # ---------------- 导出 ----------------
+    def render(self) -> str:
+        """ Prometheus text exposition format 0.0.4 """
+        lines: list[str] = []
+        for family in self._families.values():
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for key, metric in family.children.items():
+                if isinstance(metric, Histogram):
+                    cumulative = 0
+                    for bound, n in zip((*metric.bounds, float("inf")), metric.counts):
+                        cumulative += n
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{family.name}_bucket{_fmt_labels(key + (('le', le),))} {cumulative}")
+                    lines.append(f"{family.name}_sum{_fmt_labels(key)} {metric.sum}")
+                    lines.append(f"{family.name}_count{_fmt_labels(key)} {metric.count}")
+                elif isinstance(metric, Gauge):
+                    lines.append(f"{family.name}{_fmt_labels(key)} {_safe_read(metric)}")
+                else:
+                    lines.append(f"{family.name}{_fmt_labels(key)} {metric.value}")
+        lines.append("")
+        return "\n".join(lines)
+
+def _safe_read(gauge: Gauge) -> float:
+    try:
+        return gauge.read()
+    except Exception:
+        return float("nan")
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _fmt_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in key) + "}"
+
+REGISTRY = MetricsRegistry()
+""" 进程级默认注册表 """
+
+@Inject(at={"enabled", "host", "port"})
+class MetricsServer:
+    """ 本机 Prometheus 抓取端点：GET 任意路径都返回全部指标 """
+    # 下面配置会自动注入
+    enabled: bool = True
+    host: str = "127.0.0.1"
+    port: int = 9464
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY) -> None:
+        self._registry = registry
+        self._server: asyncio.Server | None = None
+
+    async def start(self) -> None:
+        """ 启动端点，作为调度器启动前置使用 """
+        if not self.enabled or self._server is not None:
+            return
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        logger.success(f"指标端点已启动: http://{self.host}:{self.port}/metrics")
+
+    def stop(self) -> None:
+        """ 关闭端点，作为退出回调使用 """
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            # 只需读完请求头，不关心路径和方法
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            body = self._registry.render().encode("utf-8")
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                + f"Content-Length: {len(body)}\r\n".encode()
+                + b"Connection: close\r\n\r\n"
+                + body
+            )
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
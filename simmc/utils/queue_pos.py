@@ -1,12 +1,14 @@
 
 import pyautogui, re
+from time import perf_counter
 import pytesseract
 import numpy as np
 import cv2
-from .find_window import get_foreground_title
 from .functools import sync_to_async
 from ..constants import TESSERACT_CMD, ROI
 from ..utils.logger import logger          # 引入日志
+from .metrics import REGISTRY
+from .window_focus import get_window_tracker
 
 QUEUE_RE = re.compile(r"(\d+)\s*/\s*(\d+)")
 pytesseract.pytesseract.tesseract_cmd = str(TESSERACT_CMD)
@@ -15,14 +17,15 @@ pytesseract.pytesseract.tesseract_cmd = str(TESSERACT_CMD)
 _MAX_POP = 3000
 _MIN_POP = 0
 
+_OCR_SEC = REGISTRY.histogram("simmc_ocr_seconds", "排队位置 OCR 耗时（截图+识别）")
+
 def ocr_available() -> bool:
     """ ocr是否可用 """
     return TESSERACT_CMD.exists()
 
-@sync_to_async
+@sync_to_async(executor="cpu")
 def _ocr_text() -> str:
-    title = get_foreground_title()
-    if title and "Minecraft" in title:
+    if get_window_tracker().is_mc_focused():
         # 1. 截图
         img_np = pyautogui.screenshot(region=ROI)
         # 2. 反二值化：白字黑底，抗锯齿→硬边缘
@@ -38,7 +41,9 @@ def _ocr_text() -> str:
 
 async def queue_pos() -> tuple[int, int]:
     """ 获取游戏排队位置 """
+    started = perf_counter()
     raw = await _ocr_text()
+    _OCR_SEC.observe(perf_counter() - started)
     m = QUEUE_RE.search(raw)
     if not m:
         logger.debug(f"OCR 无匹配: {raw!r}")
@@ -165,7 +165,12 @@ class SmartSerializer:
             if dataclasses.is_dataclass(value) and not isinstance(value, type):
                 return self._serialize_impl(dataclasses.asdict(value), dict, _seen)
             
-            # 5. 普通自定义类：转为 dict
+            # 5. 自带字段导出的类（如 __slots__ 事件）：as_dict()
+            as_dict = getattr(value, 'as_dict', None)
+            if callable(as_dict) and not isinstance(value, type):
+                return self._serialize_impl(as_dict(), dict, _seen)
+
+            # 6. 普通自定义类：转为 dict
             if hasattr(value, '__dict__') and not isinstance(value, type):
                 return self._serialize_impl(value.__dict__, dict, _seen)
             
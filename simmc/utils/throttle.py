@@ -0,0 +1,179 @@
+""" 限流：过期键表、冷却、令牌桶、去重、在途上限 """
+
+# simmc/utils/throttle.py
+from . import clock
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Generic, Hashable, Iterable, Optional, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+def plain_key(key: Any) -> bool:
+    """ 键能否原样写进 JSON 快照（元组会变成列表，读回时用 freeze_key 还原） """
+    if key is None or isinstance(key, (str, int, float, bool)):
+        return True
+    return isinstance(key, tuple) and all(plain_key(k) for k in key)
+
+def freeze_key(key: Any) -> Any:
+    """ JSON 读回的列表还原成元组，作为键使用 """
+    return tuple(freeze_key(k) for k in key) if isinstance(key, list) else key
+
+class TTLCache(Generic[K, V]):
+    """
+    带过期时间和容量上限的键表。所有条目 TTL 相同，写入即移到队尾，
+    所以队头永远是最早过期的，清理只看队头：均摊 O(1)，内存不超过 max_size 条。
+    """
+
+    def __init__(self, ttl: float, max_size: int = 1024) -> None:
+        if ttl <= 0 or max_size <= 0:
+            raise ValueError("ttl 和 max_size 必须为正")
+        self.ttl = ttl
+        self.max_size = max_size
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+    def _purge(self, now: float) -> None:
+        data = self._data
+        while data:
+            expires, _ = next(iter(data.values()))
+            if expires > now and len(data) <= self.max_size:
+                break
+            data.popitem(last=False)
+
+    def get(self, key: K, default: Optional[V] = None, now: Optional[float] = None) -> Optional[V]:
+        now = clock.now() if now is None else now
+        self._purge(now)
+        entry = self._data.get(key)
+        if entry is None or entry[0] <= now:
+            return default
+        return entry[1]
+
+    def put(self, key: K, value: V, now: Optional[float] = None) -> None:
+        now = clock.now() if now is None else now
+        self._data[key] = (now + self.ttl, value)
+        self._data.move_to_end(key)
+        self._purge(now)
+
+    def dump(self, now: Optional[float] = None) -> list[tuple[K, float, V]]:
+        """ 热重启快照：未过期条目的 (键, 剩余秒数, 值)，按过期先后排列；写不进 JSON 的键跳过 """
+        now = clock.now() if now is None else now
+        self._purge(now)
+        return [(key, expires - now, value) for key, (expires, value) in self._data.items() if plain_key(key)]
+
+    def load(self, entries: Iterable[tuple[Any, float, V]], now: Optional[float] = None) -> None:
+        """ 按 dump 的结果恢复；剩余时间已不为正的条目丢弃 """
+        now = clock.now() if now is None else now
+        for key, left, value in sorted(entries, key=lambda e: e[1]):
+            if left > 0:
+                key = freeze_key(key)
+                self._data[key] = (now + min(left, self.ttl), value)
+                self._data.move_to_end(key)
+        self._purge(now)
+
+    def live(self, now: Optional[float] = None) -> int:
+        """ 清理过期条目后的条目数 """
+        self._purge(clock.now() if now is None else now)
+        return len(self._data)
+
+    def __contains__(self, key: object) -> bool:
+        return self.get(key) is not None  # type: ignore[arg-type]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+@dataclass(slots=True)
+class RateLimit:
+    """
+    一组限流规则，按键（例如发送者）独立计数；没配置的项不生效。
+    键长时间不活跃会被过期清理，清理后的状态等价于“从未触发过”。
+    """
+    cooldown: float = 0.0
+    """ 同一键两次放行的最小间隔（秒） """
+    rate: float = 0.0
+    """ 令牌桶每秒补充的令牌数 """
+    burst: int = 1
+    """ 令牌桶容量 """
+    dedup: float = 0.0
+    """ 同一键、同一内容在这段时间内只放行一次（秒） """
+    max_queued: int = 0
+    """ 放行后尚未执行完的动作上限（整条规则共享） """
+    max_keys: int = 1024
+    """ 每种状态最多记住多少个键 """
+
+    inflight: int = 0
+    _cooling: Optional[TTLCache[Hashable, bool]] = field(default=None, repr=False)
+    _buckets: Optional[TTLCache[Hashable, tuple[float, float]]] = field(default=None, repr=False)
+    _seen: Optional[TTLCache[Hashable, bool]] = field(default=None, repr=False)
+
+    def __post_init__(self) -> None:
+        if self.cooldown > 0:
+            self._cooling = TTLCache(self.cooldown, self.max_keys)
+        if self.rate > 0:
+            # 桶回满所需时间之后，状态和新桶一样，直接过期即可
+            self._buckets = TTLCache(max(self.burst, 1) / self.rate, self.max_keys)
+        if self.dedup > 0:
+            self._seen = TTLCache(self.dedup, self.max_keys)
+
+    @classmethod
+    def from_config(cls, cfg: dict[str, Any]) -> "RateLimit":
+        known = {"cooldown", "rate", "burst", "dedup", "max_queued", "max_keys"}
+        unknown = set(cfg) - known - {"key"}
+        if unknown:
+            raise ValueError(f"未知限流项: {sorted(unknown)}")
+        return cls(**{k: v for k, v in cfg.items() if k in known})
+
+    def try_acquire(self, key: Hashable, content: Hashable = None) -> Optional[str]:
+        """ 放行返回 None（并记账）；拒绝返回原因，不改动任何状态 """
+        now = clock.now()
+        if self.max_queued and self.inflight >= self.max_queued:
+            return "max_queued"
+        if self._seen is not None and self._seen.get((key, content), now=now):
+            return "dedup"
+        if self._cooling is not None and self._cooling.get(key, now=now):
+            return "cooldown"
+        tokens = 0.0
+        if self._buckets is not None:
+            state = self._buckets.get(key, now=now)
+            if state is None:
+                tokens = float(self.burst)
+            else:
+                left, at = state
+                tokens = min(float(self.burst), left + (now - at) * self.rate)
+            if tokens < 1.0:
+                return "rate"
+
+        if self._seen is not None:
+            self._seen.put((key, content), True, now)
+        if self._cooling is not None:
+            self._cooling.put(key, True, now)
+        if self._buckets is not None:
+            self._buckets.put(key, (tokens - 1.0, now), now)
+        self.inflight += 1
+        return None
+
+    def dump(self, now: float) -> dict[str, Any]:
+        """ 热重启快照：冷却 / 令牌桶 / 去重（在途数不保存，那些动作已随旧进程结束） """
+        return {
+            "cooling": self._cooling.dump(now) if self._cooling is not None else [],
+            "buckets": [
+                (key, left, (tokens, now - at))
+                for key, left, (tokens, at) in (self._buckets.dump(now) if self._buckets is not None else [])
+            ],
+            "seen": self._seen.dump(now) if self._seen is not None else [],
+        }
+
+    def load(self, state: dict[str, Any], now: float, elapsed: float) -> None:
+        """ 按 dump 的结果恢复，elapsed 是停机时长（秒），照样算进过期和令牌补充 """
+        if self._cooling is not None:
+            self._cooling.load(((k, left - elapsed, v) for k, left, v in state.get("cooling", [])), now)
+        if self._buckets is not None:
+            self._buckets.load(
+                ((k, left - elapsed, (tokens, now - age - elapsed)) for k, left, (tokens, age) in state.get("buckets", [])),
+                now,
+            )
+        if self._seen is not None:
+            self._seen.load(((k, left - elapsed, v) for k, left, v in state.get("seen", [])), now)
+
+    def release(self) -> None:
+        """ 放行的动作执行完（或放弃）后调用 """
+        self.inflight -= 1
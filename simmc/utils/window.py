@@ -0,0 +1,131 @@
+""" 滑动窗口聚合 """
+
+# simmc/utils/window.py
+from . import clock
+from typing import Any, Hashable, Literal, Optional
+from .throttle import TTLCache
+
+type AggKind = Literal["count", "sum", "distinct"]
+
+class BucketRing:
+    """
+    分桶环形计数器：窗口切成 n 个桶，维护窗口内的总次数和总和。
+    每次写入只清理“跨过”的桶，均摊 O(1)；精度为一个桶宽（窗口实际覆盖 sec - 桶宽 ~ sec）。
+    """
+    __slots__ = ("_width", "_n", "_counts", "_sums", "_last", "count", "total")
+
+    def __init__(self, sec: float, buckets: int) -> None:
+        self._width = sec / buckets
+        self._n = buckets
+        self._counts = [0] * buckets
+        self._sums = [0.0] * buckets
+        self._last: Optional[int] = None
+        self.count = 0
+        self.total = 0.0
+
+    def _advance(self, epoch: int) -> None:
+        last = self._last
+        if last is not None and epoch <= last:
+            return
+        start = epoch - self._n + 1 if last is None else max(last + 1, epoch - self._n + 1)
+        for e in range(start, epoch + 1):
+            i = e % self._n
+            self.count -= self._counts[i]
+            self.total -= self._sums[i]
+            self._counts[i] = 0
+            self._sums[i] = 0.0
+        self._last = epoch
+
+    def add(self, value: float, now: float) -> None:
+        epoch = int(now // self._width)
+        self._advance(epoch)
+        i = epoch % self._n
+        self._counts[i] += 1
+        self._sums[i] += value
+        self.count += 1
+        self.total += value
+
+    def dump(self, now: float) -> list[tuple[float, int, float]]:
+        """ 热重启快照：非空桶的 (桶起点距 now 的秒数, 次数, 和) """
+        if self._last is None:
+            return []
+        out = []
+        for e in range(self._last - self._n + 1, self._last + 1):
+            i = e % self._n
+            if self._counts[i]:
+                out.append((now - e * self._width, self._counts[i], self._sums[i]))
+        return out
+
+    def load(self, items: list[Any], now: float, elapsed: float) -> None:
+        """ 按 dump 的结果恢复，停机 elapsed 秒期间滑出窗口的桶丢弃 """
+        for age, count, total in sorted(items, key=lambda it: -it[0]):
+            epoch = int((now - age - elapsed) // self._width)
+            self._advance(epoch)
+            i = epoch % self._n
+            self._counts[i] += count
+            self._sums[i] += total
+            self.count += count
+            self.total += total
+        self._advance(int(now // self._width))
+
+class SlidingAggregate:
+    """
+    按键分组的滑动窗口聚合：count（次数）/ sum（数值和）/ distinct（不同值个数）。
+    每个键的内存固定（桶数 / max_distinct），键本身也会在窗口内无活动后过期。
+    """
+
+    def __init__(
+        self,
+        agg: AggKind,
+        sec: float,
+        buckets: int = 60,
+        max_keys: int = 1024,
+        max_distinct: int = 256,
+    ) -> None:
+        if agg not in ("count", "sum", "distinct"):
+            raise ValueError(f"未知聚合: {agg}")
+        if sec <= 0 or buckets <= 0:
+            raise ValueError("sec 和 buckets 必须为正")
+        self.agg = agg
+        self.sec = sec
+        self._buckets = buckets
+        self._max_distinct = max_distinct
+        self._keys: TTLCache[Hashable, BucketRing | TTLCache[Hashable, bool]] = TTLCache(sec, max_keys)
+
+    def observe(self, key: Hashable, value: Hashable | float = 1.0, now: Optional[float] = None) -> float:
+        """ 记入一次观测，返回该键当前窗口内的聚合值（包含这一次） """
+        now = clock.now() if now is None else now
+        state = self._keys.get(key, now=now)
+        if self.agg == "distinct":
+            if state is None:
+                state = TTLCache(self.sec, self._max_distinct)
+            assert isinstance(state, TTLCache)
+            state.put(value, True, now)
+            self._keys.put(key, state, now)
+            return float(state.live(now))
+
+        if state is None:
+            state = BucketRing(self.sec, self._buckets)
+        assert isinstance(state, BucketRing)
+        state.add(float(value) if self.agg == "sum" else 1.0, now)  # type: ignore[arg-type]
+        self._keys.put(key, state, now)
+        return state.total if self.agg == "sum" else float(state.count)
+
+    def dump(self, now: Optional[float] = None) -> list[tuple[Any, float, Any]]:
+        """ 热重启快照：每个键的 (键, 剩余秒数, 窗口状态) """
+        now = clock.now() if now is None else now
+        return [(key, left, state.dump(now)) for key, left, state in self._keys.dump(now)]
+
+    def load(self, entries: list[Any], now: float, elapsed: float) -> None:
+        """ 按 dump 的结果恢复，elapsed 是停机时长（秒） """
+        restored: list[tuple[Any, float, BucketRing | TTLCache[Hashable, bool]]] = []
+        for key, left, inner in entries:
+            state: BucketRing | TTLCache[Hashable, bool]
+            if self.agg == "distinct":
+                state = TTLCache(self.sec, self._max_distinct)
+                state.load(((k, l - elapsed, v) for k, l, v in inner), now)
+            else:
+                state = BucketRing(self.sec, self._buckets)
+                state.load(inner, now, elapsed)
+            restored.append((key, left - elapsed, state))
+        self._keys.load(restored, now)
@@ -0,0 +1,386 @@
+""" 前台窗口跟踪：缓存 MC 窗口句柄和“前台是不是 MC”的结论，检查本身不起进程、不枚举窗口 """
+# simmc/utils/window_focus.py
+from __future__ import annotations
+import os
+import re
+import sys
+import atexit
+import threading
+import subprocess
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator, Optional, Protocol
+from . import clock
+from .conf_injector import Inject
+from .functools import sync_to_async
+from .logger import logger
+from .metrics import REGISTRY
+
+_LOOKUPS = REGISTRY.counter("simmc_window_lookups_total", "前台检查没命中缓存、真正去查窗口标题/句柄的次数")
+
+class WindowProbe(Protocol):
+    """
+    平台窗口接口。窗口 id 是平台自己的句柄（Windows 的 hwnd、X11 的窗口号、macOS 的进程号）。
+    active 会被频繁调用，必须便宜；其余方法只在缓存失效或切换焦点时调用。
+    """
+
+    def active(self) -> Optional[int]:
+        """ 当前前台窗口，没有为 None """
+        ...
+
+    def active_cached(self) -> tuple[bool, Optional[int]]:
+        """ 不起进程、不做慢调用能给出的前台窗口：(拿到了没有, 窗口 id)；要现查时返回 (False, None) """
+        ...
+
+    def title(self, wid: int) -> Optional[str]: ...
+
+    def find(self, title: str) -> Optional[int]:
+        """ 第一个标题包含 title（不区分大小写）的可见窗口 """
+        ...
+
+    def alive(self, wid: int) -> bool: ...
+
+    def activate(self, wid: int) -> bool:
+        """ 还原并提到前台，成功返回 True """
+        ...
+
+    def close(self) -> None: ...
+
+class FakeWindowProbe:
+    """
+    测试替身：窗口表和前台窗口由测试直接改，各方法的调用次数记在 calls 里。
+    无界面运行时默认也用它（没有窗口，永远不在前台）。
+    """
+
+    def __init__(self, windows: Optional[dict[int, str]] = None, active: Optional[int] = None) -> None:
+        self.windows: dict[int, str] = dict(windows or {})
+        self.active_id = active
+        self.calls: Counter[str] = Counter()
+
+    def active(self) -> Optional[int]:
+        self.calls["active"] += 1
+        return self.active_id
+
+    def active_cached(self) -> tuple[bool, Optional[int]]:
+        return True, self.active()
+
+    def title(self, wid: int) -> Optional[str]:
+        self.calls["title"] += 1
+        return self.windows.get(wid)
+
+    def find(self, title: str) -> Optional[int]:
+        self.calls["find"] += 1
+        return next((wid for wid, name in self.windows.items() if title.lower() in name.lower()), None)
+
+    def alive(self, wid: int) -> bool:
+        self.calls["alive"] += 1
+        return wid in self.windows
+
+    def activate(self, wid: int) -> bool:
+        self.calls["activate"] += 1
+        if wid not in self.windows:
+            return False
+        self.active_id = wid
+        return True
+
+    def close(self) -> None:
+        pass
+
+if sys.platform == "win32":
+    import win32gui
+    import win32con
+
+    class Win32Probe:
+        """ GetForegroundWindow 本身就是一次系统调用；只有找窗口才需要 EnumWindows """
+
+        def active(self) -> Optional[int]:
+            return win32gui.GetForegroundWindow() or None
+
+        def active_cached(self) -> tuple[bool, Optional[int]]:
+            return True, self.active()
+
+        def title(self, wid: int) -> Optional[str]:
+            return win32gui.GetWindowText(wid)
+
+        def find(self, title: str) -> Optional[int]:
+            buf: list[int] = []
+
+            def _enum_cb(hwnd: int, _) -> None:
+                if win32gui.IsWindowVisible(hwnd) and title.lower() in win32gui.GetWindowText(hwnd).lower():
+                    buf.append(hwnd)
+
+            win32gui.EnumWindows(_enum_cb, None)
+            return buf[0] if buf else None
+
+        def alive(self, wid: int) -> bool:
+            return bool(win32gui.IsWindow(wid))
+
+        def activate(self, wid: int) -> bool:
+            win32gui.ShowWindow(wid, win32con.SW_RESTORE)
+            win32gui.SetForegroundWindow(wid)
+            return True
+
+        def close(self) -> None:
+            pass
+
+elif sys.platform == "darwin":
+    from AppKit import NSRunningApplication, NSWorkspace
+
+    class AppKitProbe:
+        """ macOS 只能拿到前台应用，窗口 id 用进程号 """
+
+        def active(self) -> Optional[int]:
+            app = NSWorkspace.sharedWorkspace().frontmostApplication()
+            return app.processIdentifier() if app else None
+
+        def active_cached(self) -> tuple[bool, Optional[int]]:
+            return True, self.active()
+
+        def title(self, wid: int) -> Optional[str]:
+            app = NSRunningApplication.runningApplicationWithProcessIdentifier_(wid)
+            return app.localizedName() if app else None
+
+        def find(self, title: str) -> Optional[int]:
+            for app in NSWorkspace.sharedWorkspace().runningApplications():
+                if title.lower() in (app.localizedName() or "").lower():
+                    return app.processIdentifier()
+            return None
+
+        def alive(self, wid: int) -> bool:
+            return NSRunningApplication.runningApplicationWithProcessIdentifier_(wid) is not None
+
+        def activate(self, wid: int) -> bool:
+            app = NSRunningApplication.runningApplicationWithProcessIdentifier_(wid)
+            # 0 == NSApplicationActivateIgnoringOtherApps
+            return bool(app and app.activateWithOptions_(0))
+
+        def close(self) -> None:
+            pass
+
+else:  # Linux X11
+    _XPROP_WINDOW = re.compile(r"window id # (0x[0-9a-fA-F]+)")
+
+    def _run(*argv: str) -> Optional[str]:
+        """ 直接起进程（不经过 shell），失败返回 None """
+        try:
+            out = subprocess.run(argv, capture_output=True, text=True, timeout=2.0)
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+        return out.stdout.strip() if out.returncode == 0 else None
+
+    class X11Probe:
+        """
+        常驻一个 `xprop -spy -root _NET_ACTIVE_WINDOW` 子进程，前台一变它就推一行，
+        后台线程读进来更新 _active，active() 只是读一个字段。
+        没有 xprop 或它退出了，就退回每 poll_sec 秒最多调用一次 xdotool。
+        标题、查找、激活用 xdotool，只在缓存失效或切焦点时调用。
+        """
+        poll_sec = 0.5
+
+        def __init__(self) -> None:
+            self._active: Optional[int] = None
+            self._polled_at = float("-inf")
+            self._spy: Optional[subprocess.Popen[str]] = None
+            try:
+                self._spy = subprocess.Popen(
+                    ["xprop", "-spy", "-root", "_NET_ACTIVE_WINDOW"],
+                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+                )
+            except OSError as exc:
+                logger.debug(f"xprop 不可用，改为轮询 xdotool：{exc}")
+                return
+            threading.Thread(target=self._pump, args=(self._spy,), name="WindowSpyThread", daemon=True).start()
+
+        def _pump(self, spy: subprocess.Popen[str]) -> None:
+            assert spy.stdout is not None
+            for line in spy.stdout:
+                m = _XPROP_WINDOW.search(line)
+                self._active = (int(m.group(1), 16) or None) if m else None
+            if self._spy is spy:
+                logger.debug("xprop 监听退出，改为轮询 xdotool")
+                self._spy = None
+
+        def active(self) -> Optional[int]:
+            if self._spy is not None:
+                return self._active
+            now = clock.now()
+            if now - self._polled_at >= self.poll_sec:
+                self._polled_at = now
+                out = _run("xdotool", "getactivewindow")
+                self._active = int(out) if out and out.isdigit() else None
+            return self._active
+
+        def active_cached(self) -> tuple[bool, Optional[int]]:
+            if self._spy is not None or clock.now() - self._polled_at < self.poll_sec:
+                return True, self._active
+            return False, None                              # 轮询模式下该重新调用 xdotool 了
+
+        def title(self, wid: int) -> Optional[str]:
+            return _run("xdotool", "getwindowname", str(wid))
+
+        def find(self, title: str) -> Optional[int]:
+            out = _run("xdotool", "search", "--onlyvisible", "--name", re.escape(title))
+            first = out.split()[0] if out else ""
+            return int(first) if first.isdigit() else None
+
+        def alive(self, wid: int) -> bool:
+            return self.title(wid) is not None
+
+        def activate(self, wid: int) -> bool:
+            return _run("xdotool", "windowactivate", "--sync", str(wid)) is not None
+
+        def close(self) -> None:
+            spy, self._spy = self._spy, None
+            if spy is not None:
+                spy.terminate()
+
+def default_probe() -> WindowProbe:
+    """ 当前平台的窗口接口；Linux 没有 DISPLAY（无界面）时返回空的 FakeWindowProbe """
+    if sys.platform == "win32":
+        return Win32Probe()
+    if sys.platform == "darwin":
+        return AppKitProbe()
+    if not os.environ.get("DISPLAY"):
+        logger.debug("没有 DISPLAY，前台窗口检查一律视为不在前台")
+        return FakeWindowProbe()
+    return X11Probe()
+
+@Inject(at={"title", "ttl"})
+class WindowTracker:
+    """
+    “MC 在不在前台”的缓存：
+        前台窗口 id 由 probe 便宜地给出；同一个 id 在 ttl 内不再查标题，直接复用上次的结论，
+        所以前台不变时一次检查只是一次字段比较。前台换成别的窗口才查一次新窗口的标题。
+        前台窗口标题匹配时顺便记下 MC 窗口 id，focus 时先用它，失效了才重新查找。
+    """
+    # 下面配置会自动注入
+    title: str = "Minecraft"
+    """ 窗口标题里包含它就认为是 MC（不区分大小写） """
+    ttl: float = 5.0
+    """ 结论和 MC 窗口 id 的有效期（秒）；invalidate() 可以提前作废 """
+
+    def __init__(self, probe: Optional[WindowProbe] = None) -> None:
+        self.probe = probe if probe is not None else default_probe()
+        self._seen: tuple[Optional[int], Optional[str], float] = (None, None, float("-inf"))
+        """ (前台窗口 id, 它的标题, 查标题的时刻)，整体替换，跨线程读写不会读到一半 """
+        self._mc: tuple[Optional[int], float] = (None, float("-inf"))
+
+    def _title_of(self, wid: int) -> Optional[str]:
+        seen_id, seen_title, at = self._seen
+        now = clock.now()
+        if wid == seen_id and now - at < self.ttl:
+            return seen_title
+        _LOOKUPS.value += 1
+        name = self.probe.title(wid)
+        self._seen = (wid, name, now)
+        if name is not None and self.title.lower() in name.lower():
+            self._mc = (wid, now)
+        return name
+
+    def foreground_title(self) -> Optional[str]:
+        """ 前台窗口标题（缓存） """
+        wid = self.probe.active()
+        return None if wid is None else self._title_of(wid)
+
+    def is_mc_focused(self) -> bool:
+        """ MC 窗口是否在前台；缓存没命中时可能起进程，事件循环里请用 check_focus """
+        wid = self.probe.active()
+        if wid is None:
+            return False
+        mc_id, at = self._mc
+        if wid == mc_id and clock.now() - at < self.ttl:
+            return True
+        name = self._title_of(wid)
+        return name is not None and self.title.lower() in name.lower()
+
+    def _cached_focus(self) -> Optional[bool]:
+        """ 只凭缓存能得出的结论；前台窗口要现查、或者它的标题没缓存时返回 None """
+        known, wid = self.probe.active_cached()
+        if not known:
+            return None
+        if wid is None:
+            return False
+        now = clock.now()
+        mc_id, at = self._mc
+        if wid == mc_id and now - at < self.ttl:
+            return True
+        seen_id, seen_title, at = self._seen
+        if wid == seen_id and now - at < self.ttl:
+            return seen_title is not None and self.title.lower() in seen_title.lower()
+        return None
+
+    async def check_focus(self) -> bool:
+        """ 事件循环里用的 is_mc_focused：缓存能回答就当场返回，要问窗口系统（可能起进程）才进通用线程池 """
+        cached = self._cached_focus()
+        if cached is not None:
+            return cached
+        return await self._focused_in_thread()
+
+    _focused_in_thread = sync_to_async(is_mc_focused, executor="general")
+
+    def mc_window(self) -> Optional[int]:
+        """ MC 窗口 id；缓存过期或窗口已经没了才重新查找（可能较慢，别在事件循环里直接调用） """
+        mc_id, at = self._mc
+        now = clock.now()
+        if mc_id is not None and (now - at < self.ttl or self.probe.alive(mc_id)):
+            if now - at >= self.ttl:
+                self._mc = (mc_id, now)
+            return mc_id
+        _LOOKUPS.value += 1
+        mc_id = self.probe.find(self.title)
+        self._mc = (mc_id, now)
+        return mc_id
+
+    def invalidate(self) -> None:
+        """ 作废所有缓存，下一次检查重新查（例如游戏重启、窗口重建之后） """
+        self._seen = (None, None, float("-inf"))
+        self._mc = (None, float("-inf"))
+
+    async def focus(self, title: Optional[str] = None) -> bool:
+        """
+        把 MC（或标题包含 title 的窗口）还原并提到前台。
+        查找窗口在通用线程池里做，不占输入线程；只有切前台这一下进输入线程，和按键按提交顺序执行。
+        """
+        wid = await self._find_in_thread(title)
+        if wid is None:
+            return False
+        ok = await self._activate_in_thread(wid)
+        self._seen = (None, None, float("-inf"))       # 前台变了，下一次检查重新查
+        return ok
+
+    @sync_to_async(executor="general")
+    def _find_in_thread(self, title: Optional[str]) -> Optional[int]:
+        if title is None or title == self.title:
+            return self.mc_window()
+        _LOOKUPS.value += 1
+        return self.probe.find(title)
+
+    @sync_to_async(executor="input")
+    def _activate_in_thread(self, wid: int) -> bool:
+        return self.probe.activate(wid)
+
+    def close(self) -> None:
+        self.probe.close()
+
+_tracker: Optional[WindowTracker] = None
+_TRACKER_LOCK = threading.Lock()
+
+def get_window_tracker() -> WindowTracker:
+    """ 进程内共用的跟踪器，第一次使用时按当前平台创建 """
+    global _tracker
+    if _tracker is None:
+        with _TRACKER_LOCK:
+            if _tracker is None:
+                _tracker = WindowTracker()
+                atexit.register(_tracker.close)
+    return _tracker
+
+@contextmanager
+def use_window_tracker(tracker: WindowTracker) -> Iterator[WindowTracker]:
+    """ 临时替换共用的跟踪器，例如测试里换成 WindowTracker(FakeWindowProbe(...)) """
+    global _tracker
+    prev, _tracker = _tracker, tracker
+    try:
+        yield tracker
+    finally:
+        _tracker = prev
@@ -0,0 +1 @@
+""" 单元测试 """
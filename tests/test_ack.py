@@ -0,0 +1,64 @@
+""" 指令回执规则：只有服务器系统消息能完成等回执的指令，玩家聊天里的同样字眼不算 """
+# tests/test_ack.py
+import asyncio
+import pytest
+from simmc.listeners.evt_listener import MinecraftLogListener
+from simmc.operation.ack import AckSpec, AckTracker
+from simmc.operation.fluent.command import PAY_ACK
+from simmc.operation.fluent.land import LAND_BALANCE_ACK, LAND_DEPOSIT_ACK
+
+def _settle(spec: AckSpec, key: tuple[str, ...], lines: list[str]) -> bool | None:
+    """ 登记一条回执后依次喂 lines；返回 None 表示没有被完成，否则是成功与否 """
+    async def run() -> bool | None:
+        listener = MinecraftLogListener()
+        listener.acks = AckTracker()
+        ack = listener.acks.expect(spec, key)
+        for line in lines:
+            listener._parse(line)
+        if not ack.future.done():
+            ack.cancel()
+            return None
+        return ack.future.result().ok
+    return asyncio.run(run())
+
+@pytest.mark.parametrize("line", [
+    "[CHAT] [G] Steve: 我余额不足了谁借我点",
+    "[CHAT] [主服] [G] VIP Steve: 玩家不在线吗",
+    "[CHAT] [G] Steve: $100 has been sent to Alice",
+    "[CHAT] [交易] Steve 说 已向 Alice 转账",
+    "[CHAT] Steve 悄悄的对 我 说: 你不能给自己转账",
+    "[CHAT] Steve 悄悄的对 我 说: Error: Player not found",
+])
+def test_player_chat_does_not_settle_pay(line: str) -> None:
+    assert _settle(PAY_ACK, ("Alice",), [line]) is None
+
+@pytest.mark.parametrize("line", [
+    "[CHAT] [G] Steve: 领土>> 余额不足",
+    "[CHAT] Steve 悄悄的对 我 说: 领土>> 收件箱 - 领土 Home: 玩家 Bob 存入了 $1.00.当前余额: $2.00",
+])
+def test_player_chat_does_not_settle_land(line: str) -> None:
+    assert _settle(LAND_DEPOSIT_ACK, ("Home",), [line]) is None
+
+def test_named_failure_for_another_player_does_not_settle_pay() -> None:
+    # /m Bob 的“玩家不在线”点名了 Bob，不算到转给 Alice 的这笔
+    assert _settle(PAY_ACK, ("Alice",), ["[CHAT] 玩家 Bob 不在线"]) is None
+
+@pytest.mark.parametrize("spec, key, line, ok", [
+    (PAY_ACK, ("Alice",), "[CHAT] $100 has been sent to Alice.", True),
+    (PAY_ACK, ("Alice",), "[CHAT] [经济] 你已向 Alice 转账 $100", True),
+    (PAY_ACK, ("Alice",), "[CHAT] 您向 Alice 支付了 $100", True),
+    (PAY_ACK, ("Alice",), "[CHAT] Error: You do not have sufficient funds.", False),
+    (PAY_ACK, ("Alice",), "[CHAT] 余额不足", False),
+    (PAY_ACK, ("Alice",), "[CHAT] Error: Player not found.", False),
+    (PAY_ACK, ("Alice",), "[CHAT] 玩家 Alice 不在线", False),
+    (PAY_ACK, ("Alice",), "[CHAT] You cannot pay yourself", False),
+    (LAND_DEPOSIT_ACK, ("Home",), "[CHAT] 领土>> 收件箱 - 领土 Home: 玩家 Bob 存入了 $1,000.00.当前余额: $2,000.00", True),
+    (LAND_DEPOSIT_ACK, ("Home",), "[CHAT] 领土>> 你的余额不足", False),
+    (LAND_BALANCE_ACK, ("Home",), "[CHAT] 领土>> 领土 Home 的余额: $12.50", True),
+])
+def test_system_messages_settle(spec: AckSpec, key: tuple[str, ...], line: str, ok: bool) -> None:
+    assert _settle(spec, key, [line]) is ok
+
+def test_chat_then_reply_settles_on_reply() -> None:
+    lines = ["[CHAT] [G] Steve: 我余额不足了谁借我点", "[CHAT] $100 has been sent to Alice."]
+    assert _settle(PAY_ACK, ("Alice",), lines) is True
@@ -0,0 +1,83 @@
+""" 日志规则的字面量预筛：预筛放过的行必须包含所有 re.search 能命中的行 """
+# tests/test_prefilter.py
+import json
+import re
+from pathlib import Path
+import pytest
+from simmc.listeners.evt_listener import _prefilter
+
+_ROOT = Path(__file__).resolve().parent.parent
+
+def _patten_rules() -> list[str]:
+    with open(_ROOT / "patten.json", "r", encoding="utf-8") as f:
+        return [rule["regex"] for event in json.load(f) for rule in event["rules"]]
+
+_LINES = [
+    "[12:00:01] [Render thread/FATAL]: Unreported exception thrown!",
+    "[12:00:01] [Server thread/ERROR]: Exception in server tick loop",
+    "---- Minecraft Crash Report ----",
+    "[CHAT] Alice 邀请你加入 她的 春日 领土",
+    "[CHAT] 领土>> 收件箱 - 领土 Home: 玩家 Bob 存入了 $1,000.00.当前余额: $2,000.00",
+    "[CHAT] 领土>> 收件箱 - 领土 Home: 玩家 Bob 取出了 $12.50.当前余额: $1,987.50",
+    "[CHAT] Steve 悄悄的对 我 说: V我100",
+    "[CHAT] [主服] [G] VIP Steve: 大家好",
+    "[CHAT] [交易] Steve 说 收钻石",
+    "[CHAT] 你的视角已与 Admin 同步",
+    "[CHAT] Steve joined the game",
+    "[CHAT] Steve 加入了游戏",
+    "[CHAT] Steve LEFT THE GAME",
+    "[CHAT] Steve 退出了游戏",
+    "[CHAT] 您已被踢出",
+    "Disconnected from server",
+    "[CHAT] 连接断开",
+    "[CHAT] 你暂时离开了",
+    "[CHAT] 你回来了",
+    "[CHAT] [系统] 发言太快，请等待 2.5 秒",
+    "[CHAT] You must wait 3 seconds",
+    "[CHAT] please SLOW DOWN",
+    "[CHAT] 消息发送过于频繁",
+    "[CHAT] <Bob> 请等待 5 秒",
+]
+
+# 转义带参数、内联标志：这些写法以前会被当成错误的字面量，把能命中的行筛掉
+_EDGE_CASES = [
+    (r"\x41bc", "Abc"),
+    (r"x\x41bc", "xAbc"),
+    (r"\u4e00二三", "一二三"),
+    (r"\U0001F600ok", "😀ok"),
+    (r"\N{LATIN SMALL LETTER A}bc", "abc"),
+    (r"\101bc", "Abc"),
+    (r"\0bc", "\0bc"),
+    (r"(a)\1bc", "aabc"),
+    (r"(?x) a b c", "abc"),
+    (r"(?x)hello\ world  # 注释", "hello world"),
+    (r"(?s)ab.cd", "ab\ncd"),
+    (r"(?i:AB)cd", "abcd"),
+    (r"a\.?bc", "abc"),
+    (r"(?:foo|bar)baz", "barbaz"),
+]
+
+def _passes(regex: str, line: str) -> bool:
+    literals = _prefilter(regex)
+    lowered = line.lower()
+    return not literals or any(lit in lowered for lit in literals)
+
+@pytest.mark.parametrize("regex", _patten_rules())
+def test_patten_rules_never_drop_matching_lines(regex: str) -> None:
+    pattern = re.compile(regex, re.IGNORECASE)
+    for line in _LINES:
+        if pattern.search(line):
+            assert _passes(regex, line), f"{line!r} 匹配 {regex!r}，却被预筛 {_prefilter(regex)} 丢掉"
+
+@pytest.mark.parametrize(("regex", "line"), _EDGE_CASES)
+def test_edge_cases_never_drop_matching_lines(regex: str, line: str) -> None:
+    assert re.search(regex, line, re.IGNORECASE)
+    assert _passes(regex, line), f"预筛 {_prefilter(regex)} 丢掉了能命中的行"
+
+def test_inline_flags_disable_prefilter() -> None:
+    assert _prefilter(r"(?x) a b c") == ()
+    assert _prefilter(r"(?i:AB)cdef") == ()
+
+def test_plain_literals_still_prefilter() -> None:
+    assert _prefilter(r"(?P<player>\w+) joined the game") == (" joined the game",)
+    assert _prefilter(r"\x41bcdef") == ("bcdef",)